@@ -2,14 +2,24 @@
 LifeLogger - Daily Task & Achievement Tracker
 Flask application for logging daily achievements and tracking progress with stars.
 """
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for
+from flask import Flask, Response, g, render_template, jsonify, request, session, redirect, stream_with_context, url_for
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from config import Config
-import mysql.connector
-from mysql.connector import pooling
-from datetime import datetime, date, timedelta
+from storage import create_storage, StorageError, archive, migrations
+import metrics
+from datetime import datetime, date, timedelta, timezone
 from functools import wraps
+from collections import OrderedDict
+from contextlib import redirect_stdout
+import base64
+import click
+import hashlib
+import io
+import re
+import sys
+import threading
+import time
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -21,136 +31,502 @@ limiter = Limiter(
     default_limits=[]  # No global limit, apply per-route
 )
 
-# Database connection pool
-db_pool = None
+# Storage engine (MySQL pool or embedded SQLite), see storage/
+storage = None
+_storage_lock = threading.Lock()
 
+# Runs the calls of read_concurrently(); started by the ASGI entry point (asgi.py)
+query_executor = None
 
-def init_db_pool():
-    """Initialize the database connection pool."""
-    global db_pool
+# Per-route request and database metrics, served at /api/metrics
+request_metrics = metrics.Metrics(Config.SLOW_QUERY_MS)
+
+# Limits for the per-task recap windows
+MAX_RECAP_DAYS = 366
+MAX_RECAP_WINDOWS = 8
+
+# Years accepted by the heatmap
+MIN_HEATMAP_YEAR = 2000
+MAX_HEATMAP_YEAR = 2100
+
+# Daily chart series: bucket sizes, finest first, and the most points returned
+GRANULARITIES = ('day', 'week', 'month', 'year')
+MAX_SERIES_POINTS = 366
+
+# Completion history: rows per page
+MAX_HISTORY_PAGE = 200
+
+# Footnote search: words per query and results per page
+MAX_SEARCH_TERMS = 8
+MAX_SEARCH_RESULTS = 100
+
+# Delta sync: most change log rows listed before clients are told to reload
+MAX_SYNC_CHANGES = 500
+
+
+def init_storage(migrate=True):
+    """Initialize the storage engine, then check the schema unless migrate is False."""
+    global storage
     try:
-        db_config = Config.get_db_config()
-        
-        # Build pool configuration
-        pool_config = {
-            'pool_name': "lifelogger_pool",
-            'pool_size': db_config['pool_size'],
-            'host': db_config['host'],
-            'port': db_config['port'],
-            'user': db_config['user'],
-            'password': db_config['password'],
-            'database': db_config['database']
-        }
-        
-        # Add SSL configuration if available (for Aiven)
-        if db_config.get('ssl_ca'):
-            pool_config['ssl_ca'] = db_config['ssl_ca']
-            pool_config['ssl_verify_cert'] = db_config.get('ssl_verify_cert', True)
-            print(f"[OK] SSL configured for database connection")
-        
-        db_pool = pooling.MySQLConnectionPool(**pool_config)
-        print("[OK] Database connection pool initialized successfully")
+        storage = create_storage(Config)
+        storage.observer = request_metrics
+        print(f"[OK] {storage.engine} storage initialized successfully")
         
         # Check and migrate database
-        check_and_migrate_db()
+        if migrate:
+            check_and_migrate_db()
         
         return True
-    except mysql.connector.Error as err:
+    except StorageError as err:
         print(f"[FAIL] Database connection failed: {err}")
         return False
 
 
-def get_db_connection():
-    """Get a connection from the pool."""
-    if db_pool is None:
-        init_db_pool()
-    return db_pool.get_connection()
+def get_storage():
+    """Return the storage engine, initializing it on first use."""
+    if storage is None:
+        with _storage_lock:
+            if storage is None:
+                init_storage()
+    if storage is None:
+        raise StorageError("Database is not available")
+    return storage
+
+
+def db_session():
+    """Check out a connection and yield a Repository, rolling back on database errors."""
+    return get_storage().session()
+
+
+def enable_concurrent_reads(workers):
+    """Let read_concurrently() run its calls on up to workers threads, each with its own connection."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    global query_executor
+    query_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lifelogger-query')
+    return query_executor
+
+
+def read_concurrently(*calls):
+    """Run independent read-only calls, each call(repo), and return their results in order.
+
+    With a query executor every call checks out its own connection and they
+    run at the same time; without one they run in turn in a single session.
+    The caller must not hold a connection itself, or a full pool could
+    leave it waiting on its own calls.
+    """
+    if query_executor is None or len(calls) < 2:
+        with db_session() as repo:
+            return [call(repo) for call in calls]
+    from concurrent.futures import wait
+
+    def run(call, stats):
+        with request_metrics.attached(stats):
+            with db_session() as repo:
+                return call(repo)
+
+    branches = [request_metrics.branch() for _ in calls]
+    futures = [query_executor.submit(run, call, stats) for call, stats in zip(calls, branches)]
+    # Let every call finish before reporting, even when one has failed
+    wait(futures)
+    for stats in branches:
+        request_metrics.merge(stats)
+    return [future.result() for future in futures]
 
 
 def db_operation(f):
     """Decorator to handle database connections and error handling."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        conn = None
-        cursor = None
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            result = f(cursor, conn, *args, **kwargs)
-            return result
-        except mysql.connector.Error as err:
-            if conn:
-                conn.rollback()
+            with db_session() as repo:
+                return f(repo, *args, **kwargs)
+        except StorageError as err:
             return jsonify({'error': str(err)}), 500
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
     return decorated_function
 
 
+# ============== Stats Cache ==============
+
+class StatsCache:
+    """Bounded LRU cache for read-only API payloads.
+
+    Each entry is stored with the data version of the dates (and task list)
+    its payload was computed from, read from the database's change log
+    (see Repository.data_version()). A write made by any process changes
+    the version of the dates it touched, so entries are only served while
+    their version is current; stale ones miss and are replaced, or age out.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, key, version):
+        """Return the payload cached for key at version, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != version:
+                self.misses += 1
+                if entry is not None:
+                    self.stale += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, version):
+        """Store value for key, computed at version, unless a newer one is cached."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > version:
+                return
+            self._entries[key] = (value, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'stale': self.stale,
+                'evictions': self.evictions
+            }
+
+
+stats_cache = StatsCache(Config.STATS_CACHE_SIZE)
+
+
+# ============== Conditional GET ==============
+
+def payload_etag(key, version):
+    """Strong ETag of the payload cached under key, at a data version (see Repository.data_version())."""
+    # The key covers the query parameters, including windows ending today
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+    return f"{digest}-{version}"
+
+
+def read_payload(key, ranges, compute, uses_tasks=False, session=True, validate=False):
+    """Return (payload, version, changed_at): compute(repo) through the stats cache.
+
+    ranges lists the (start, end) dates the payload is computed from; set
+    uses_tasks when it also depends on the task list. Their data version is
+    read from the database first, so a payload cached before a write by any
+    process is never served; a hit costs that one query. With validate the
+    version is read even when the cache is off, and payload is None, with
+    nothing computed, when the request's If-None-Match holds its ETag.
+    With session=False compute() takes no repo and checks out its own
+    connections (see read_concurrently), after the version's connection
+    is released.
+    """
+    value = version = changed_at = None
+    if stats_cache.enabled or validate or session:
+        with db_session() as repo:
+            if stats_cache.enabled or validate:
+                version, changed_at = repo.data_version(ranges, uses_tasks)
+                if validate and request.if_none_match.contains(payload_etag(key, version)):
+                    return None, version, changed_at
+                value = stats_cache.get(key, version)
+            if value is None and session:
+                value = compute(repo)
+                stats_cache.put(key, value, version)
+    if value is None and not session:
+        value = compute()
+        stats_cache.put(key, value, version)
+    return value, version, changed_at
+
+
+def cached_query(key, ranges, compute, uses_tasks=False, session=True):
+    """Return compute(repo) through the stats cache (see read_payload)."""
+    return read_payload(key, ranges, compute, uses_tasks=uses_tasks, session=session)[0]
+
+
+def cached_response(key, ranges, compute, uses_tasks=False, session=True):
+    """Answer a read-only GET through the stats cache, with ETag and Last-Modified validators.
+
+    Both come from the data version of ranges, which every process reads
+    from the database, so a client revalidating against any instance gets
+    a 304 only if nothing its payload depends on changed. A 304 costs the
+    version query alone.
+    """
+    value, version, changed_at = read_payload(key, ranges, compute, uses_tasks=uses_tasks,
+                                              session=session, validate=True)
+    response = app.response_class(status=304) if value is None else jsonify(value)
+    response.set_etag(payload_etag(key, version))
+    if changed_at:
+        response.last_modified = changed_at.astimezone(timezone.utc)
+    # Let browsers store the payload but always revalidate it
+    response.cache_control.no_cache = True
+    return response
+
+
+# ============== Request Metrics ==============
+
+@app.before_request
+def start_request_metrics():
+    # Label by URL rule rather than path, so task ids don't multiply the series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.request_started = time.perf_counter()
+    request_metrics.start_request(request.method, route)
+
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    # Runs after a streamed body is fully sent when it uses stream_with_context
+    started = g.get('request_started')
+    if started is not None:
+        request_metrics.finish_request(g.get('response_status', 500), time.perf_counter() - started)
+
+
 def check_and_migrate_db():
-    """Check database schema and apply migrations if needed."""
-    conn = None
+    """Bring the database schema up to date (or just report it when DB_AUTO_MIGRATE is off)."""
     try:
-        conn = db_pool.get_connection()
-        cursor = conn.cursor()
-        
-        # Check if 'position' column exists in 'tasks' table
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'tasks' 
-            AND column_name = 'position'
-        """)
-        exists = cursor.fetchone()[0]
-        
-        if not exists:
-            print("[INFO] Applying migration: Adding 'position' column to 'tasks' table...")
-            cursor.execute("ALTER TABLE tasks ADD COLUMN position INT DEFAULT 0")
-            cursor.execute("CREATE INDEX idx_position ON tasks(position)")
-            conn.commit()
-            print("[OK] Migration successful: 'position' column added")
-
-        # Check if 'footnote' column exists in 'daily_task_completions' table
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'daily_task_completions' 
-            AND column_name = 'footnote'
-        """)
-        exists = cursor.fetchone()[0]
-        
-        if not exists:
-            print("[INFO] Applying migration: Adding 'footnote' column to 'daily_task_completions' table...")
-            cursor.execute("ALTER TABLE daily_task_completions ADD COLUMN footnote TEXT DEFAULT NULL")
-            conn.commit()
-            print("[OK] Migration successful: 'footnote' column added")
-            
-        # Check if 'is_completed' column exists in 'daily_task_completions' table
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'daily_task_completions' 
-            AND column_name = 'is_completed'
-        """)
-        exists = cursor.fetchone()[0]
-        
-        if not exists:
-            print("[INFO] Applying migration: Adding 'is_completed' column to 'daily_task_completions' table...")
-            cursor.execute("ALTER TABLE daily_task_completions ADD COLUMN is_completed BOOLEAN DEFAULT TRUE")
-            conn.commit()
-            print("[OK] Migration successful: 'is_completed' column added")
-        
-    except mysql.connector.Error as err:
+        get_storage().migrate(apply=Config.DB_AUTO_MIGRATE)
+    except StorageError as err:
         print(f"[WARN] Database migration failed: {err}")
-    finally:
-        if conn:
-            conn.close()
+
+
+@app.cli.group()
+def db():
+    """Manage the database schema."""
+
+
+@db.command('status')
+def db_status():
+    """Show the current and latest schema versions."""
+    if storage is None:
+        init_storage(migrate=False)
+    engine = get_storage().engine
+    current = get_storage().schema_version()
+    print(f"[INFO] Schema version ({engine}): {current if current is not None else 'untracked'} "
+          f"(latest: {migrations.latest_version(engine)})")
+    for version, description in migrations.pending(engine, current):
+        print(f"  pending {version}: {description}")
+
+
+@db.command('upgrade')
+def db_upgrade():
+    """Apply all pending migrations."""
+    if storage is None:
+        init_storage(migrate=False)
+    get_storage().migrate(apply=True)
+
+
+# ============== Rollup Commands ==============
+
+@app.cli.group()
+def rollup():
+    """Maintain the daily_star_summary rollup table."""
+
+
+@rollup.command('rebuild')
+def rollup_rebuild():
+    """Rebuild daily_star_summary from daily_task_completions."""
+    with db_session() as repo:
+        days = repo.rebuild_daily_summary()
+        repo.record_changes(everything=True)
+        repo.commit()
+    print(f"[OK] Rollup rebuilt: {days} days")
+
+
+@rollup.command('verify')
+def rollup_verify():
+    """Check daily_star_summary against daily_task_completions (exit code 1 on drift)."""
+    with db_session() as repo:
+        mismatches = repo.verify_daily_summary()
+
+    for day, expected, actual in mismatches:
+        print(f"[FAIL] {day}: expected stars/footnotes {expected}, found {actual}")
+    if mismatches:
+        print(f"[FAIL] {len(mismatches)} days out of sync. Run: flask --app app rollup rebuild")
+        raise SystemExit(1)
+    print("[OK] Rollup matches daily_task_completions")
+
+
+# ============== Streak Commands ==============
+
+@app.cli.group()
+def streaks():
+    """Maintain the task_streaks table."""
+
+
+@streaks.command('rebuild')
+def streaks_rebuild():
+    """Rebuild task_streaks from daily_task_completions."""
+    with db_session() as repo:
+        tasks = repo.rebuild_streaks()
+        repo.record_changes(everything=True)
+        repo.commit()
+    print(f"[OK] Streaks rebuilt: {tasks} tasks")
+
+
+# ============== Archive Commands ==============
+
+@app.cli.group('archive')
+def archive_group():
+    """Move old completion history to daily_task_completions_archive."""
+
+
+@archive_group.command('status')
+def archive_status():
+    """Show completions per year in the hot table and the archive."""
+    with db_session() as repo:
+        counts = repo.archive_year_counts()
+    if not counts:
+        print("[INFO] No completions yet")
+        return
+    for year, hot, archived in counts:
+        print(f"  {year}: {hot} hot, {archived} archived")
+    print(f"[INFO] Archiving keeps {Config.ARCHIVE_KEEP_YEARS} years before the current one "
+          f"(ARCHIVE_KEEP_YEARS)")
+
+
+@archive_group.command('run')
+@click.option('--keep-years', type=click.IntRange(min=1), default=None,
+              help='Years to keep before the current one (default: ARCHIVE_KEEP_YEARS).')
+def archive_run(keep_years):
+    """Archive every whole year older than the kept ones, one transaction per year."""
+    keep_years = keep_years or Config.ARCHIVE_KEEP_YEARS
+    try:
+        cutoff = archive.cutoff(keep_years)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+
+    with db_session() as repo:
+        first = repo.first_hot_date()
+    if first is None or first >= cutoff:
+        print(f"[OK] Nothing to archive before {cutoff.isoformat()}")
+        return
+
+    total = 0
+    for year in range(first.year, cutoff.year):
+        with db_session() as repo:
+            moved = repo.archive_year(year)
+            repo.commit()
+        total += moved
+        print(f"[OK] {year}: {moved} completions archived")
+    print(f"[OK] Archived {total} completions dated before {cutoff.isoformat()}")
+
+
+# ============== Change Log Commands ==============
+
+@app.cli.group('changes')
+def changes_group():
+    """Maintain the change_log table behind /api/changes."""
+
+
+@changes_group.command('prune')
+@click.option('--keep-days', type=click.IntRange(min=1), default=None,
+              help='Days of changes to keep (default: CHANGE_LOG_KEEP_DAYS).')
+def changes_prune(keep_days):
+    """Delete logged changes older than the kept days; clients that synced before reload everything."""
+    keep_days = keep_days or Config.CHANGE_LOG_KEEP_DAYS
+    with db_session() as repo:
+        deleted = repo.prune_changes(datetime.now() - timedelta(days=keep_days))
+        repo.commit()
+    print(f"[OK] Pruned {deleted} changes older than {keep_days} days")
+
+
+# ============== Export ==============
+
+def export_history(fmt, start=None, end=None):
+    """Yield the completion history as fmt text chunks from a single streaming query."""
+    import export
+
+    write = export.FORMATS[fmt][2]
+    with db_session() as repo:
+        yield from write(repo.iter_completions(start, end))
+
+
+@app.cli.command('export')
+@click.option('--format', 'fmt', default='ndjson', show_default=True, help='ndjson or csv.')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='First completed date (YYYY-MM-DD).')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Last completed date (YYYY-MM-DD).')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='Output file (default stdout).')
+def export_command(fmt, start, end, output):
+    """Export the completion history as NDJSON or CSV."""
+    import export
+
+    if fmt not in export.FORMATS:
+        raise click.BadParameter(f"must be one of: {', '.join(sorted(export.FORMATS))}", param_hint='--format')
+    # Keep startup messages out of the exported data
+    with redirect_stdout(sys.stderr):
+        get_storage()
+    for chunk in export_history(fmt, start and start.date().isoformat(), end and end.date().isoformat()):
+        output.write(chunk)
+    print(f"[OK] Export complete ({fmt})", file=sys.stderr)
+
+
+# ============== Import ==============
+
+def run_import(binary, fmt):
+    """Import a seekable binary stream in one transaction. Returns importer statistics.
+
+    Raises ValueError for malformed input (nothing is written).
+    """
+    import importer
+
+    records = importer.READERS[fmt](importer.open_text(binary))
+    with db_session() as repo:
+        try:
+            result = importer.import_records(repo, records)
+        except ValueError:
+            repo.rollback()
+            raise
+        repo.commit()
+    return result
+
+
+@app.cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', help='csv, ndjson or sql (default: from the file extension).')
+def import_command(path, fmt):
+    """Bulk-load history from an export (CSV/NDJSON) or a mysqldump backup (.sql)."""
+    import importer
+
+    if fmt and fmt not in importer.FORMATS:
+        raise click.BadParameter(f"must be one of: {', '.join(importer.FORMATS)}", param_hint='--format')
+    fmt = fmt or importer.detect_format(path)
+    if not fmt:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format')
+    with open(path, 'rb') as binary:
+        try:
+            result = run_import(binary, fmt)
+        except ValueError as err:
+            print(f"[FAIL] Import aborted, nothing was written: {err}")
+            raise SystemExit(1)
+    print(f"[OK] Imported {result['completions']} completions, created {result['tasks_created']} tasks "
+          f"({result['skipped']} empty rows skipped)")
+    print(f"[INFO] {result['rows']} rows in {result['load_seconds']}s ({result['rows_per_second']} rows/s); "
+          f"rollup rebuilt for {result['rollup_days']} days, {result['seconds']}s total")
 
 
 def login_required(f):
@@ -216,53 +592,88 @@ def index():
     return render_template('index.html')
 
 
+# ============== Mutation Stats ==============
+
+# Rolling average window of the aggregates returned by writes
+MUTATION_AVERAGE_DAYS = 7
+
+
+def stats_requested():
+    """Return True when a write was called with ?include=stats."""
+    return 'stats' in request.args.get('include', '').split(',')
+
+
+def mutation_stats(repo, ref_date, day=None, change=0):
+    """Read the aggregates the main page shows after a write, in the write's transaction.
+
+    Returns today's stats, the average and the weekly recap for ref_date,
+    as /api/dashboard would, with three queries. When the write touched a
+    day's completions, "day" holds that day's new star count and the
+    change (+1, -1 or 0), so a chart bucketed by week or month can be
+    patched too.
+    """
+    today = date.today()
+    ranges = [(today, today), average_window(ref_date, MUTATION_AVERAGE_DAYS)]
+    if day is not None:
+        ranges.append((day, day))
+    counts = repo.daily_counts(ranges)
+
+    stats = {
+        'date': ref_date.isoformat(),
+        'today': build_today_stats(today.isoformat(), repo.count_active_tasks(), counts.get(today.isoformat(), 0)),
+        'average': build_average_stats(counts, ref_date, MUTATION_AVERAGE_DAYS),
+        'weekly': repo.task_recap(ref_date, [7])[0]
+    }
+    if day is not None:
+        stats['day'] = {'date': day.isoformat(), 'star_count': counts.get(day.isoformat(), 0), 'change': change}
+    return stats
+
+
+def view_date():
+    """Return the ?date= of a write that has no date of its own (default today), or None if invalid."""
+    date_str = request.args.get('date')
+    if not date_str:
+        return date.today()
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
 # ============== Task API Routes ==============
 
 @app.route('/api/tasks', methods=['GET'])
 @login_required
-@db_operation
-def get_tasks(cursor, conn):
+def get_tasks():
     """Get all active tasks with completion status for a specific date."""
     # Get date from query param, default to today
     date_str = request.args.get('date')
     if date_str:
         try:
-            target_date = datetime.strptime(date_str, '%Y-%m-%d').date().isoformat()
+            target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     else:
-        target_date = date.today().isoformat()
-    
-    query = """
-        SELECT 
-            t.id,
-            t.name,
-            t.created_at,
-            CASE WHEN dtc.id IS NOT NULL AND dtc.is_completed = TRUE THEN TRUE ELSE FALSE END as completed_today,
-            dtc.footnote
-        FROM tasks t
-        LEFT JOIN daily_task_completions dtc 
-            ON t.id = dtc.task_id AND dtc.completed_date = %s
-        WHERE t.is_active = TRUE
-        ORDER BY t.position ASC, t.created_at ASC
-    """
-    cursor.execute(query, (target_date,))
-    tasks = cursor.fetchall()
-    
-    # Convert datetime objects to strings for JSON serialization
-    for task in tasks:
-        if task['created_at']:
-            task['created_at'] = task['created_at'].isoformat()
-        task['completed_today'] = bool(task['completed_today'])
+        target_date = date.today()
     
-    return jsonify(tasks)
+    return cached_response(
+        ('tasks', target_date),
+        [(target_date, target_date)],
+        lambda repo: repo.tasks_for_date(target_date.isoformat()),
+        uses_tasks=True
+    )
 
 
 @app.route('/api/tasks', methods=['POST'])
 @login_required
 @db_operation
-def add_task(cursor, conn):
-    """Add a new task."""
+def add_task(repo):
+    """Add a new task.
+
+    With ?include=stats the response also carries the refreshed aggregates
+    for ?date= (see mutation_stats); the same goes for the other task and
+    completion writes.
+    """
     data = request.get_json()
     
     if not data or not data.get('name'):
@@ -275,22 +686,31 @@ def add_task(cursor, conn):
     if len(name) > 255:
         return jsonify({'error': 'Task name too long (max 255 characters)'}), 400
     
-    query = "INSERT INTO tasks (name) VALUES (%s)"
-    cursor.execute(query, (name,))
-    conn.commit()
+    ref_date = view_date()
+    if ref_date is None:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     
-    return jsonify({
-        'id': cursor.lastrowid,
+    # New tasks go to the end of the list
+    task_id = repo.add_task(name)
+    stats = mutation_stats(repo, ref_date) if stats_requested() else None
+    repo.record_changes(task_ids=[task_id])
+    repo.commit()
+    
+    payload = {
+        'id': task_id,
         'name': name,
         'created_at': datetime.now().isoformat(),
         'completed_today': False
-    }), 201
+    }
+    if stats:
+        payload['stats'] = stats
+    return jsonify(payload), 201
 
 
 @app.route('/api/tasks/<int:task_id>', methods=['PUT'])
 @login_required
 @db_operation
-def edit_task(cursor, conn, task_id):
+def edit_task(repo, task_id):
     """Edit a task name."""
     data = request.get_json()
     
@@ -304,14 +724,12 @@ def edit_task(cursor, conn, task_id):
     if len(name) > 255:
         return jsonify({'error': 'Task name too long (max 255 characters)'}), 400
     
-    # Check if task exists and is active
-    cursor.execute("SELECT id FROM tasks WHERE id = %s AND is_active = TRUE", (task_id,))
-    if not cursor.fetchone():
+    # Only active tasks can be renamed
+    if not repo.rename_task(task_id, name):
         return jsonify({'error': 'Task not found'}), 404
 
-    query = "UPDATE tasks SET name = %s WHERE id = %s"
-    cursor.execute(query, (name, task_id))
-    conn.commit()
+    repo.record_changes(task_ids=[task_id])
+    repo.commit()
     
     return jsonify({
         'id': task_id,
@@ -322,48 +740,81 @@ def edit_task(cursor, conn, task_id):
 @app.route('/api/tasks/reorder', methods=['POST'])
 @login_required
 @db_operation
-def reorder_tasks(cursor, conn):
+def reorder_tasks(repo):
     """Update task positions based on a list of IDs."""
     data = request.get_json()
     
     if not data or 'taskIds' not in data:
         return jsonify({'error': 'taskIds list is required'}), 400
     
-    task_ids = data['taskIds']
+    try:
+        task_ids = [int(task_id) for task_id in data['taskIds']]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'taskIds must be a list of task IDs'}), 400
+    
+    # Update positions in bulk with a single CASE statement
+    repo.set_task_order(task_ids)
+    repo.record_changes(task_ids=task_ids)
+    repo.commit()
+    return jsonify({'message': 'Tasks reordered successfully'})
+
+
+@app.route('/api/tasks/<int:task_id>/move', methods=['POST'])
+@login_required
+@db_operation
+def move_task(repo, task_id):
+    """Move one task next to another: {"after_id": X} or {"before_id": Y}.
+
+    Usually rewrites only the moved task's position.
+    """
+    data = request.get_json()
+    
+    if not data or (data.get('after_id') is None and data.get('before_id') is None):
+        return jsonify({'error': 'after_id or before_id is required'}), 400
     
-    # Update positions in bulk
-    # Using a case statement or executemany might be cleaner, but simple loop is fine for small lists
     try:
-        for index, task_id in enumerate(task_ids):
-            cursor.execute("UPDATE tasks SET position = %s WHERE id = %s", (index, task_id))
-        conn.commit()
-        return jsonify({'message': 'Tasks reordered successfully'})
-    except mysql.connector.Error as err:
-        conn.rollback()
-        return jsonify({'error': f"Database error: {err}"}), 500
+        after_id = int(data['after_id']) if data.get('after_id') is not None else None
+        before_id = int(data['before_id']) if data.get('before_id') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'after_id and before_id must be task IDs'}), 400
+    
+    try:
+        updated = repo.move_task(task_id, after_id=after_id, before_id=before_id)
+    except KeyError:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    repo.record_changes(task_ids=updated)
+    repo.commit()
+    
+    return jsonify({'message': 'Task moved successfully', 'updated': len(updated)})
 
 
 @app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
 @login_required
 @db_operation
-def delete_task(cursor, conn, task_id):
+def delete_task(repo, task_id):
     """Soft-delete a task (sets is_active=FALSE)."""
-    # Check if task exists
-    cursor.execute("SELECT id FROM tasks WHERE id = %s AND is_active = TRUE", (task_id,))
-    if not cursor.fetchone():
+    ref_date = view_date()
+    if ref_date is None:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+    if not repo.deactivate_task(task_id):
         return jsonify({'error': 'Task not found'}), 404
     
-    # Soft delete
-    cursor.execute("UPDATE tasks SET is_active = FALSE WHERE id = %s", (task_id,))
-    conn.commit()
+    stats = mutation_stats(repo, ref_date) if stats_requested() else None
+    repo.record_changes(task_ids=[task_id])
+    repo.commit()
     
-    return jsonify({'message': 'Task deleted successfully'})
+    payload = {'message': 'Task deleted successfully'}
+    if stats:
+        payload['stats'] = stats
+    return jsonify(payload)
 
 
 @app.route('/api/tasks/<int:task_id>/footnote', methods=['POST'])
 @login_required
 @db_operation
-def save_footnote(cursor, conn, task_id):
+def save_footnote(repo, task_id):
     """Save a footnote for a task on a specific date."""
     data = request.get_json()
     
@@ -381,49 +832,101 @@ def save_footnote(cursor, conn, task_id):
     else:
         target_date = date.today().isoformat()
     
-    # Get task info
-    cursor.execute("SELECT id, name FROM tasks WHERE id = %s AND is_active = TRUE", (task_id,))
-    task = cursor.fetchone()
-    
-    if not task:
+    # A new record is uncoupled from completion (is_completed starts FALSE)
+    result = repo.apply_completion_ops([
+        {'task_id': task_id, 'date': target_date, 'completed': None, 'footnote': footnote}
+    ])
+    if result['missing_task_ids']:
         return jsonify({'error': 'Task not found'}), 404
         
-    # Check if a completion record exists
-    cursor.execute(
-        "SELECT id FROM daily_task_completions WHERE task_id = %s AND completed_date = %s",
-        (task_id, target_date)
-    )
-    existing_record = cursor.fetchone()
-    
-    if existing_record:
-        # Update existing record
-        cursor.execute(
-            "UPDATE daily_task_completions SET footnote = %s WHERE id = %s",
-            (footnote, existing_record['id'])
-        )
-    else:
-        # Create new record (this uncouples it, setting is_completed to false initially)
-        cursor.execute("""
-            INSERT INTO daily_task_completions (task_id, task_name, completed_date, footnote, is_completed)
-            VALUES (%s, %s, %s, %s, FALSE)
-        """, (task_id, task['name'], target_date, footnote))
-        
-    conn.commit()
+    day = date.fromisoformat(target_date)
+    stats = mutation_stats(repo, day, day) if stats_requested() else None
+    repo.record_changes(completions=result['changed'])
+    repo.commit()
     
-    return jsonify({
+    payload = {
         'message': 'Footnote saved successfully',
         'task_id': task_id,
         'date': target_date,
         'footnote': footnote
-    })
+    }
+    if stats:
+        payload['stats'] = stats
+    return jsonify(payload)
 
 
 # ============== Task Completion API Routes ==============
 
+MAX_BATCH_OPERATIONS = 1000
+
+
+@app.route('/api/completions/batch', methods=['POST'])
+@login_required
+@db_operation
+def batch_completions(repo):
+    """Apply many completion/footnote operations in one transaction.
+
+    Body: {"operations": [{"task_id": 1, "date": "YYYY-MM-DD", "completed": true, "footnote": "..."}]}
+    "date" defaults to today; each operation sets "completed", "footnote" or both.
+    """
+    data = request.get_json()
+    if not data or not isinstance(data.get('operations'), list) or not data['operations']:
+        return jsonify({'error': 'operations list is required'}), 400
+
+    operations = data['operations']
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPERATIONS} operations per batch'}), 400
+
+    ops = []
+    for index, item in enumerate(operations):
+        if not isinstance(item, dict) or not isinstance(item.get('task_id'), int):
+            return jsonify({'error': f'Operation {index}: task_id must be an integer'}), 400
+
+        date_str = item.get('date')
+        if date_str:
+            try:
+                target_date = datetime.strptime(date_str, '%Y-%m-%d').date().isoformat()
+            except (TypeError, ValueError):
+                return jsonify({'error': f'Operation {index}: Invalid date format. Use YYYY-MM-DD'}), 400
+        else:
+            target_date = date.today().isoformat()
+
+        completed = item.get('completed')
+        footnote = item.get('footnote')
+        if completed is not None and not isinstance(completed, bool):
+            return jsonify({'error': f'Operation {index}: completed must be true or false'}), 400
+        if footnote is not None:
+            if not isinstance(footnote, str):
+                return jsonify({'error': f'Operation {index}: footnote must be a string'}), 400
+            footnote = footnote.strip()
+        if completed is None and footnote is None:
+            return jsonify({'error': f'Operation {index}: set completed and/or footnote'}), 400
+
+        ops.append({'task_id': item['task_id'], 'date': target_date, 'completed': completed, 'footnote': footnote})
+
+    result = repo.apply_completion_ops(ops)
+    if result['missing_task_ids']:
+        repo.rollback()
+        return jsonify({'error': 'Task not found', 'task_ids': result['missing_task_ids']}), 404
+
+    # A replayed batch changes no rows and leaves the change log untouched
+    if result['changed']:
+        repo.record_changes(completions=result['changed'])
+        repo.commit()
+    else:
+        repo.rollback()
+
+    return jsonify({
+        'message': 'Batch applied',
+        'operations': len(ops),
+        'dates': result['dates']
+    })
+
+
 @app.route('/api/tasks/<int:task_id>/complete', methods=['POST'])
 @login_required
 @db_operation
-def complete_task(cursor, conn, task_id):
+def complete_task(repo, task_id):
     """Mark a task as complete for a specific date (earn a star)."""
     # Get date from request body, default to today
     data = request.get_json() or {}
@@ -437,46 +940,40 @@ def complete_task(cursor, conn, task_id):
     else:
         target_date = date.today().isoformat()
     
-    # Get task info
-    cursor.execute("SELECT id, name FROM tasks WHERE id = %s AND is_active = TRUE", (task_id,))
-    task = cursor.fetchone()
-    
-    if not task:
+    result = repo.apply_completion_ops([
+        {'task_id': task_id, 'date': target_date, 'completed': True, 'footnote': None}
+    ])
+    if result['missing_task_ids']:
         return jsonify({'error': 'Task not found'}), 404
     
-    # Check if already completed on that date
-    cursor.execute(
-        "SELECT id, is_completed FROM daily_task_completions WHERE task_id = %s AND completed_date = %s",
-        (task_id, target_date)
-    )
-    record = cursor.fetchone()
-    if record:
-        if record['is_completed']:
-            return jsonify({'message': 'Task already completed on this date'}), 200
-        else:
-            cursor.execute("UPDATE daily_task_completions SET is_completed = TRUE WHERE id = %s", (record['id'],))
-            conn.commit()
-            return jsonify({'message': 'Star earned!', 'task_id': task_id, 'completed_date': target_date}), 201
-            
-    # Insert completion record
-    query = """
-        INSERT INTO daily_task_completions (task_id, task_name, completed_date, is_completed)
-        VALUES (%s, %s, %s, TRUE)
-    """
-    cursor.execute(query, (task_id, task['name'], target_date))
-    conn.commit()
+    day = date.fromisoformat(target_date)
+    # Rows changed by the upsert: 0 when the task was already completed
+    if not result['upserted']:
+        stats = mutation_stats(repo, day, day) if stats_requested() else None
+        repo.rollback()
+        payload = {'message': 'Task already completed on this date'}
+        if stats:
+            payload['stats'] = stats
+        return jsonify(payload), 200
     
-    return jsonify({
+    stats = mutation_stats(repo, day, day, change=1) if stats_requested() else None
+    repo.record_changes(completions=result['changed'])
+    repo.commit()
+    
+    payload = {
         'message': 'Star earned!',
         'task_id': task_id,
         'completed_date': target_date
-    }), 201
+    }
+    if stats:
+        payload['stats'] = stats
+    return jsonify(payload), 201
 
 
 @app.route('/api/tasks/<int:task_id>/complete', methods=['DELETE'])
 @login_required
 @db_operation
-def uncomplete_task(cursor, conn, task_id):
+def uncomplete_task(repo, task_id):
     """Remove task completion for a specific date (remove star)."""
     # Get date from query param, default to today
     date_str = request.args.get('date')
@@ -488,51 +985,29 @@ def uncomplete_task(cursor, conn, task_id):
     else:
         target_date = date.today().isoformat()
     
-    cursor.execute(
-        "SELECT id, footnote FROM daily_task_completions WHERE task_id = %s AND completed_date = %s",
-        (task_id, target_date)
-    )
-    record = cursor.fetchone()
-    if not record:
+    # Records with a footnote are kept (uncompleted); others are deleted
+    result = repo.apply_completion_ops([
+        {'task_id': task_id, 'date': target_date, 'completed': False, 'footnote': None}
+    ])
+    # A record with only a footnote has no star to clear, but is still found
+    if not result['uncompleted'] and not result['deleted'] and not repo.completion_exists(task_id, target_date):
+        repo.rollback()
         return jsonify({'message': 'No completion found for this date'}), 404
         
-    if record['footnote']:
-        cursor.execute("UPDATE daily_task_completions SET is_completed = FALSE WHERE id = %s", (record['id'],))
-    else:
-        cursor.execute("DELETE FROM daily_task_completions WHERE id = %s", (record['id'],))
-        
-    conn.commit()
-    return jsonify({'message': 'Completion removed'})
+    day = date.fromisoformat(target_date)
+    stats = mutation_stats(repo, day, day, change=-result['uncompleted']) if stats_requested() else None
+    repo.record_changes(completions=result['changed'])
+    repo.commit()
+    payload = {'message': 'Completion removed'}
+    if stats:
+        payload['stats'] = stats
+    return jsonify(payload)
 
 
 # ============== Statistics API Routes ==============
 
-@app.route('/api/stats/daily', methods=['GET'])
-@login_required
-@db_operation
-def get_daily_stats(cursor, conn):
-    """Get daily star counts for the last 30 days."""
-    days = request.args.get('days', 30, type=int)
-    days = min(max(days, 7), 90)  # Limit between 7 and 90 days
-    
-    end_date = date.today()
-    start_date = end_date - timedelta(days=days - 1)
-    
-    query = """
-        SELECT 
-            completed_date,
-            COUNT(*) as star_count
-        FROM daily_task_completions
-        WHERE completed_date BETWEEN %s AND %s AND is_completed = TRUE
-        GROUP BY completed_date
-        ORDER BY completed_date ASC
-    """
-    cursor.execute(query, (start_date.isoformat(), end_date.isoformat()))
-    results = cursor.fetchall()
-    
-    # Create a dict for quick lookup
-    stats_dict = {row['completed_date'].isoformat(): row['star_count'] for row in results}
-    
+def build_daily_series(stats_dict, start_date, end_date):
+    """Expand {iso_date: star_count} into one entry per day between start_date and end_date."""
     # Fill in all days (including those with 0 stars)
     daily_stats = []
     current_date = start_date
@@ -544,15 +1019,193 @@ def get_daily_stats(cursor, conn):
             'star_count': stats_dict.get(date_str, 0)
         })
         current_date += timedelta(days=1)
+    return daily_stats
+
+
+def bucket_start(day, granularity):
+    """Return the first day of the bucket (week starting Monday, month or year) containing day."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def next_bucket(start, granularity):
+    """Return the first day of the bucket following the one starting on start."""
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    if granularity == 'year':
+        return start.replace(year=start.year + 1)
+    return start + timedelta(days=1)
+
+
+def count_buckets(start_date, end_date, granularity):
+    """Return the number of points a series from start_date to end_date has at granularity."""
+    if granularity == 'week':
+        return (bucket_start(end_date, 'week') - bucket_start(start_date, 'week')).days // 7 + 1
+    if granularity == 'month':
+        return (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+    if granularity == 'year':
+        return end_date.year - start_date.year + 1
+    return (end_date - start_date).days + 1
+
+
+def series_granularity(start_date, end_date, granularity, max_points):
+    """Resolve 'auto' to the finest granularity that fits in max_points (None if none does)."""
+    candidates = GRANULARITIES if granularity == 'auto' else (granularity,)
+    for candidate in candidates:
+        if count_buckets(start_date, end_date, candidate) <= max_points:
+            return candidate
+    return None
+
+
+def build_bucketed_series(counts, start_date, end_date, granularity):
+    """Expand {iso_bucket_start: star_count} into one point per bucket between start_date and end_date.
+
+    Points are clipped to the range: the first and last buckets may cover
+    fewer days than a full week, month or year.
+    """
+    series = []
+    current = bucket_start(start_date, granularity)
+    while current <= end_date:
+        following = next_bucket(current, granularity)
+        series.append({
+            'date': max(current, start_date).isoformat(),
+            'end_date': min(following - timedelta(days=1), end_date).isoformat(),
+            'star_count': counts.get(current.isoformat(), 0)
+        })
+        current = following
+    return series
+
+
+def parse_series_args(args, today):
+    """Read the chart range and bucketing from query args shared by /api/stats/daily and /api/dashboard.
+
+    The range is start..end, or the last days days up to end ('all' for the
+    whole history); end defaults to today. Returns ((start, end, granularity,
+    max_points), None) with start None for the whole history, or (None, error).
+    """
+    try:
+        end_date = datetime.strptime(args['end'], '%Y-%m-%d').date() if args.get('end') else today
+        start_date = datetime.strptime(args['start'], '%Y-%m-%d').date() if args.get('start') else None
+    except ValueError:
+        return None, 'Invalid date format. Use YYYY-MM-DD'
+
+    if start_date is None and args.get('days') != 'all':
+        days = args.get('days', 30, type=int)
+        days = max(days, 7)  # At least a week
+        start_date = end_date - timedelta(days=min(days, (end_date - date.min).days + 1) - 1)
+    if start_date is not None and start_date > end_date:
+        return None, 'start must not be after end'
+
+    granularity = args.get('granularity', 'auto')
+    if granularity != 'auto' and granularity not in GRANULARITIES:
+        return None, f"granularity must be auto or one of: {', '.join(GRANULARITIES)}"
+
+    max_points = args.get('max_points', MAX_SERIES_POINTS, type=int)
+    if max_points < 1 or max_points > MAX_SERIES_POINTS:
+        return None, f'max_points must be between 1 and {MAX_SERIES_POINTS}'
+    return (start_date, end_date, granularity, max_points), None
+
+
+def resolve_series(start_date, end_date, granularity, max_points):
+    """Fill in the start of a whole-history range and pick the granularity.
+
+    Returns ((start, end, granularity), None) or (None, error).
+    """
+    if start_date is None:
+        first = cached_query(
+            ('first_star_date',), [(date.min, date.max)],
+            lambda repo: {'date': repo.first_star_date()}
+        )['date']
+        start_date = min(date.fromisoformat(first), end_date) if first else end_date
+
+    resolved = series_granularity(start_date, end_date, granularity, max_points)
+    if resolved is None:
+        return None, (
+            f"{start_date.isoformat()} to {end_date.isoformat()} needs more than {max_points} points "
+            f"at granularity {granularity}; use a coarser granularity or a shorter range"
+        )
+    return (start_date, end_date, resolved), None
+
+
+def fetch_series(repo, start_date, end_date, granularity):
+    """Return the daily chart points: one per day, or bucketed in SQL for coarser granularities."""
+    if granularity == 'day':
+        return build_daily_series(repo.daily_counts([(start_date, end_date)]), start_date, end_date)
+    return build_bucketed_series(
+        repo.bucketed_counts(start_date, end_date, granularity), start_date, end_date, granularity
+    )
+
+
+def average_window(ref_date, days):
+    """Return the (start, end) range averaged for ref_date: [ref_date - days, ref_date - 1]."""
+    # Example: If ref_date is Jan 12, days=7
+    # End date = Jan 11 (ref_date - 1 day)
+    # Start date = Jan 5 (end_date - 6 days = ref_date - 1 - (days - 1) = ref_date - days)
+    return ref_date - timedelta(days=days), ref_date - timedelta(days=1)
+
+
+def build_average_stats(stats_dict, ref_date, days):
+    """Summarize the average stars per day over the window preceding ref_date."""
+    start_date, end_date = average_window(ref_date, days)
+    total_stars = sum(
+        count for day, count in stats_dict.items()
+        if start_date.isoformat() <= day <= end_date.isoformat()
+    )
+    
+    average = round(total_stars / days, 1)
     
-    return jsonify(daily_stats)
+    return {
+        'average': average,
+        'total_stars': total_stars,
+        'days': days,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'reference_date': ref_date.isoformat()
+    }
+
+
+@app.route('/api/stats/daily', methods=['GET'])
+@login_required
+def get_daily_stats():
+    """Get star counts for a range of days (default: the last 30 days).
+
+    Query args: days (at least 7, or 'all' for the whole history) or
+    start/end (YYYY-MM-DD, end defaults to today); granularity (auto, day,
+    week, month or year) and max_points (at most MAX_SERIES_POINTS, the
+    default). auto picks the finest granularity that fits in max_points.
+    Coarser buckets are summed in SQL; their points carry the first and last
+    day they cover.
+    """
+    args, error = parse_series_args(request.args, date.today())
+    if error:
+        return jsonify({'error': error}), 400
+    series, error = resolve_series(*args)
+    if error:
+        return jsonify({'error': error}), 400
+
+    start_date, end_date, granularity = series
+    return cached_response(
+        ('daily', start_date, end_date, granularity),
+        [(start_date, end_date)],
+        lambda repo: fetch_series(repo, start_date, end_date, granularity)
+    )
 
 
 @app.route('/api/stats/weekly', methods=['GET'])
 @login_required
-@db_operation
-def get_weekly_stats(cursor, conn):
-    """Get weekly recap - stars per task for this week."""
+def get_weekly_stats():
+    """Get the per-task recap - stars per task over rolling windows (default 7 days).
+
+    Pass several windows as ``days=7,30`` (or repeated ``days`` params) to get
+    all of them from one query.
+    """
     today = date.today()
     
     # Check if date param provided
@@ -565,74 +1218,72 @@ def get_weekly_stats(cursor, conn):
     else:
         ref_date = today
 
-    # Rolling 7 days: [ref_date - 7, ref_date - 1]
+    # Rolling windows: [ref_date - days, ref_date - 1]
     # This matches the "7-Day Avg" logic requested by user
-    end_date = ref_date - timedelta(days=1)
-    start_date = ref_date - timedelta(days=7)
-    
-    
-    # Get all active tasks, ordered by position
-    cursor.execute("SELECT id, name FROM tasks WHERE is_active = TRUE ORDER BY position ASC")
-    tasks = cursor.fetchall()
-    
-    task_stats = []
-    
-    # For each task, count stars in the window
-    for task in tasks:
-        cursor.execute("""
-            SELECT COUNT(*) as star_count
-            FROM daily_task_completions
-            WHERE task_id = %s AND completed_date BETWEEN %s AND %s AND is_completed = TRUE
-        """, (task['id'], start_date.isoformat(), end_date.isoformat()))
-        
-        count = cursor.fetchone()['star_count']
-        
-        task_stats.append({
-            'task_id': task['id'],
-            'task_name': task['name'],
-            'star_count': count,
-            'max_possible': 7,
-            'percentage': round((count / 7) * 100, 1)
-        })
-    
-    return jsonify({
-        'week_start': start_date.isoformat(),
-        'week_end': end_date.isoformat(),
-        'days_in_period': 7,
-        'tasks': task_stats
-    })
+    windows = []
+    for value in request.args.getlist('days') or ['7']:
+        for part in value.split(','):
+            try:
+                days = int(part)
+            except ValueError:
+                return jsonify({'error': 'Days must be a comma-separated list of integers'}), 400
+            if days < 1 or days > MAX_RECAP_DAYS:
+                return jsonify({'error': f'Days must be between 1 and {MAX_RECAP_DAYS}'}), 400
+            windows.append(days)
+
+    if len(windows) > MAX_RECAP_WINDOWS:
+        return jsonify({'error': f'At most {MAX_RECAP_WINDOWS} windows per request'}), 400
+
+    return cached_response(
+        ('weekly', ref_date, tuple(windows)),
+        [(ref_date - timedelta(days=max(windows)), ref_date - timedelta(days=1))],
+        lambda repo: build_weekly_stats(ref_date, repo.task_recap(ref_date, windows)),
+        uses_tasks=True
+    )
+
+
+def build_weekly_stats(ref_date, recaps):
+    """Shape the /api/stats/weekly payload: a single recap keeps the original response format."""
+    if len(recaps) == 1:
+        return recaps[0]
+
+    return {
+        'reference_date': ref_date.isoformat(),
+        'windows': recaps
+    }
 
 
 @app.route('/api/stats/today', methods=['GET'])
 @login_required
-@db_operation
-def get_today_stats(cursor, conn):
+def get_today_stats():
     """Get today's statistics."""
-    today = date.today().isoformat()
-    
-    # Get total active tasks
-    cursor.execute("SELECT COUNT(*) as total FROM tasks WHERE is_active = TRUE")
-    total_tasks = cursor.fetchone()['total']
-    
-    # Get completed tasks today
-    cursor.execute(
-        "SELECT COUNT(*) as completed FROM daily_task_completions WHERE completed_date = %s AND is_completed = TRUE",
-        (today,)
+    today = date.today()
+    return cached_response(
+        ('today', today),
+        [(today, today)],
+        lambda repo: fetch_today_stats(repo, today.isoformat()),
+        uses_tasks=True
     )
-    completed_today = cursor.fetchone()['completed']
-    
-    return jsonify({
+
+
+def fetch_today_stats(repo, today):
+    """Count active tasks and stars earned on today (an ISO date)."""
+    return build_today_stats(today, repo.count_active_tasks(), repo.star_count_on(today))
+
+
+def build_today_stats(today, total_tasks, completed_today):
+    """Shape the payload returned by /api/stats/today."""
+    return {
         'date': today,
         'total_tasks': total_tasks,
         'completed_tasks': completed_today,
         'stars_today': completed_today
-    })
+    }
 
 
 @app.route('/api/stats/average', methods=['GET'])
 @login_required
-@db_operation
-def get_average_stats(cursor, conn):
+def get_average_stats():
     """Get the average number of stars earned in the past X days (default 7)."""
     # Reference date (the 'today' from which we look back)
     date_str = request.args.get('date')
@@ -648,34 +1299,481 @@ def get_average_stats(cursor, conn):
     if days < 1:
         return jsonify({'error': 'Days must be at least 1'}), 400
 
-    # Calculate range: [ref_date - days, ref_date - 1]
-    # Example: If ref_date is Jan 12, days=7
-    # End date = Jan 11 (ref_date - 1 day)
-    # Start date = Jan 5 (end_date - 6 days = ref_date - 1 - (days - 1) = ref_date - days)
-    end_date = ref_date - timedelta(days=1)
-    start_date = ref_date - timedelta(days=days)
-    
-    query = """
-        SELECT COUNT(*) as total_stars
-        FROM daily_task_completions
-        WHERE completed_date BETWEEN %s AND %s AND is_completed = TRUE
+    window = average_window(ref_date, days)
+    return cached_response(
+        ('average', ref_date, days),
+        [window],
+        lambda repo: build_average_stats(repo.daily_counts([window]), ref_date, days)
+    )
+
+
+@app.route('/api/stats/heatmap', methods=['GET'])
+@login_required
+def get_heatmap():
+    """Get a year of stars per task as bitsets (default: the current year).
+
+    Each task's "days" is a base64 bitset with one bit per day of the year:
+    bit i (byte i // 8, bit i % 8, least significant first) is set when a
+    star was earned on start_date + i days. "totals" holds the number of
+    stars per day. Active tasks are listed in display order, followed by
+    deleted tasks that earned stars that year.
     """
-    cursor.execute(query, (start_date.isoformat(), end_date.isoformat()))
-    result = cursor.fetchone()
-    total_stars = result['total_stars'] if result else 0
-    
-    average = round(total_stars / days, 1)
-    
-    return jsonify({
-        'average': average,
-        'total_stars': total_stars,
-        'days': days,
+    year = request.args.get('year', date.today().year, type=int)
+    if year < MIN_HEATMAP_YEAR or year > MAX_HEATMAP_YEAR:
+        return jsonify({'error': f'Year must be between {MIN_HEATMAP_YEAR} and {MAX_HEATMAP_YEAR}'}), 400
+
+    start_date, end_date = date(year, 1, 1), date(year, 12, 31)
+    return cached_response(
+        ('heatmap', year),
+        [(start_date, end_date)],
+        lambda repo: build_heatmap(
+            start_date, end_date, repo.active_tasks(),
+            repo.completed_days(start_date.isoformat(), end_date.isoformat())
+        ),
+        uses_tasks=True
+    )
+
+
+def build_heatmap(start_date, end_date, active_tasks, completions):
+    """Pack completion rows into per-task bitsets and per-day totals."""
+    days = (end_date - start_date).days + 1
+    grids = OrderedDict((task['id'], [task['name'], bytearray((days + 7) // 8), 0]) for task in active_tasks)
+    totals = [0] * days
+
+    for row in completions:
+        index = (row['completed_date'] - start_date).days
+        grid = grids.get(row['task_id'])
+        if grid is None:
+            grid = grids[row['task_id']] = [row['task_name'], bytearray((days + 7) // 8), 0]
+        grid[1][index // 8] |= 1 << (index % 8)
+        grid[2] += 1
+        totals[index] += 1
+
+    return {
+        'year': start_date.year,
         'start_date': start_date.isoformat(),
-        'end_date': end_date.isoformat(),
-        'reference_date': ref_date.isoformat()
+        'days': days,
+        'tasks': [
+            {
+                'task_id': task_id,
+                'task_name': name,
+                'star_count': count,
+                'days': base64.b64encode(bits).decode('ascii')
+            }
+            for task_id, (name, bits, count) in grids.items()
+        ],
+        'totals': totals
+    }
+
+
+@app.route('/api/stats/streaks', methods=['GET'])
+@login_required
+def get_streaks():
+    """Get the current and longest streak of consecutive starred days for every active task.
+
+    A streak is current while its last day is today or yesterday, so it
+    is not lost before today's star is earned.
+    """
+    today = date.today()
+    return cached_response(
+        ('streaks', today),
+        # Any starred day can extend or break a streak
+        [(date.min, date.max)],
+        lambda repo: build_streaks(today, repo.task_streaks()),
+        uses_tasks=True
+    )
+
+
+def build_streaks(today, rows):
+    """Shape task_streaks rows into the payload returned by /api/stats/streaks."""
+    tasks = []
+    for row in rows:
+        current = longest = 0
+        if row['last_end'] is not None:
+            if row['last_end'] >= today - timedelta(days=1) and row['last_start'] <= today:
+                current = (min(row['last_end'], today) - row['last_start']).days + 1
+            longest = (row['longest_end'] - row['longest_start']).days + 1
+        tasks.append({
+            'task_id': row['id'],
+            'task_name': row['name'],
+            'current_streak': current,
+            'longest_streak': longest,
+            'longest_start': row['longest_start'].isoformat() if row['longest_start'] else None,
+            'longest_end': row['longest_end'].isoformat() if row['longest_end'] else None,
+            'last_completed': row['last_end'].isoformat() if row['last_end'] else None
+        })
+    return {'date': today.isoformat(), 'tasks': tasks}
+
+
+# ============== Dashboard API Route ==============
+
+@app.route('/api/dashboard', methods=['GET'])
+@login_required
+def get_dashboard():
+    """Get everything the main page renders for a date in one request.
+
+    Returns the payloads of /api/tasks, /api/stats/today, /api/stats/average,
+    /api/stats/daily and /api/stats/weekly from three or four independent
+    queries, run concurrently when served through asgi.py. The chart takes
+    the same range and granularity args as /api/stats/daily. When it is
+    daily, one query for the daily counts feeds the chart, the average and
+    today's total.
+    """
+    date_str = request.args.get('date')
+    if date_str:
+        try:
+            ref_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    else:
+        ref_date = date.today()
+
+    today = date.today()
+    args, error = parse_series_args(request.args, today)
+    if error:
+        return jsonify({'error': error}), 400
+    series, error = resolve_series(*args)
+    if error:
+        return jsonify({'error': error}), 400
+    chart_start, chart_end, granularity = series
+
+    avg_days = request.args.get('avg_days', 7, type=int)
+    if avg_days < 1:
+        return jsonify({'error': 'Days must be at least 1'}), 400
+
+    ranges = [
+        (chart_start, chart_end),
+        (today, today),
+        average_window(ref_date, avg_days),
+        (ref_date - timedelta(days=7), ref_date)
+    ]
+    return cached_response(
+        ('dashboard', ref_date, today, chart_start, chart_end, granularity, avg_days),
+        ranges,
+        lambda: fetch_dashboard(ref_date, today, (chart_start, chart_end, granularity), avg_days),
+        uses_tasks=True,
+        session=False
+    )
+
+
+def fetch_dashboard(ref_date, today, chart, avg_days):
+    """Build the /api/dashboard payload from three or four independent queries."""
+    chart_start, chart_end, granularity = chart
+    ranges = [(today, today), average_window(ref_date, avg_days)]
+    if granularity == 'day':
+        ranges.append((chart_start, chart_end))
+    calls = [
+        lambda repo: repo.tasks_for_date(ref_date.isoformat()),
+        lambda repo: repo.daily_counts(ranges),
+        lambda repo: repo.task_recap(ref_date, [7])[0],
+    ]
+    if granularity != 'day':
+        calls.append(lambda repo: fetch_series(repo, chart_start, chart_end, granularity))
+    tasks, stats_dict, weekly, *series = read_concurrently(*calls)
+
+    if series:
+        daily = series[0]
+    else:
+        daily = build_daily_series(stats_dict, chart_start, chart_end)
+
+    return {
+        'date': ref_date.isoformat(),
+        'tasks': tasks,
+        'today': build_today_stats(today.isoformat(), len(tasks), stats_dict.get(today.isoformat(), 0)),
+        'average': build_average_stats(stats_dict, ref_date, avg_days),
+        'daily': daily,
+        'weekly': weekly
+    }
+
+
+# ============== History API Route ==============
+
+@app.route('/api/history', methods=['GET'])
+@login_required
+def get_history():
+    """List completion records (stars and footnotes), newest first, a page at a time.
+
+    Query args: task_id, limit (at most MAX_HISTORY_PAGE, default 50) and
+    cursor, the next_cursor of the previous page. next_cursor is null on
+    the last page. Pages are keyed on (date, id) rather than an offset, so
+    every page costs the same however far back it is.
+    """
+    task_id = request.args.get('task_id', type=int)
+    limit = request.args.get('limit', 50, type=int)
+    if limit < 1 or limit > MAX_HISTORY_PAGE:
+        return jsonify({'error': f'Limit must be between 1 and {MAX_HISTORY_PAGE}'}), 400
+
+    before = None
+    token = request.args.get('cursor')
+    if token:
+        before = decode_history_cursor(token)
+        if before is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    with db_session() as repo:
+        # One extra row tells whether there is another page
+        rows = repo.completion_page(before, task_id, limit=limit + 1)
+
+    page = rows[:limit]
+    return jsonify({
+        'completions': [
+            {
+                'id': row['id'],
+                'task_id': row['task_id'],
+                'task_name': row['task_name'],
+                'date': row['completed_date'].isoformat(),
+                'is_completed': bool(row['is_completed']),
+                'footnote': row['footnote'],
+                'earned_at': row['earned_at'].isoformat() if row['earned_at'] else None
+            }
+            for row in page
+        ],
+        'next_cursor': encode_history_cursor(page[-1]) if len(rows) > limit else None
     })
 
 
+def encode_history_cursor(row):
+    """Opaque cursor for the page after row: its date and id, base64url-encoded."""
+    key = f"{row['completed_date'].isoformat()}.{row['id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode('ascii').rstrip('=')
+
+
+def decode_history_cursor(token):
+    """Return the (date, id) encoded by encode_history_cursor(), or None if token is not one."""
+    try:
+        key = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('ascii')
+        day, row_id = key.split('.')
+        return date.fromisoformat(day), int(row_id)
+    except ValueError:
+        return None
+
+
+# ============== Sync API Route ==============
+
+@app.route('/api/changes', methods=['GET'])
+@login_required
+def get_changes():
+    """List the tasks and completions changed since a version of the change log.
+
+    Query arg: since, the version of the previous response. Clients keeping
+    a local copy of tasks and stats patch it from the answer instead of
+    refetching them: changed tasks (deleted ones with is_active false), the
+    current state of every changed completion and the star count of every
+    changed day. Every write is listed once committed, whatever device made
+    it. When reset is true nothing is listed and the client reloads from
+    the other routes: since is missing, older than the pruned log or from
+    another database, or an import or more than MAX_SYNC_CHANGES changes
+    came after it.
+    """
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'error': 'since must be a version number'}), 400
+
+    with db_session() as repo:
+        changes = repo.changes_since(since, MAX_SYNC_CHANGES)
+
+    return jsonify({
+        'version': changes['version'],
+        'reset': changes['reset'],
+        'tasks': [
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+                'is_active': bool(row['is_active']),
+                'position': row['position']
+            }
+            for row in changes['tasks']
+        ],
+        'completions': [
+            {
+                'task_id': task_id,
+                'date': day.isoformat(),
+                'is_completed': bool(is_completed),
+                'footnote': footnote
+            }
+            for task_id, day, is_completed, footnote in changes['completions']
+        ],
+        'days': [
+            {'date': day.isoformat(), 'star_count': star_count}
+            for day, star_count in changes['days'].items()
+        ]
+    })
+
+
+# ============== Search API Route ==============
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search_footnotes():
+    """Search footnotes through the full-text index, best match first.
+
+    Query args: q (words; a footnote must contain every word, or a word it
+    starts), start/end (YYYY-MM-DD), task_id, limit (at most
+    MAX_SEARCH_RESULTS, default 20) and offset. has_more tells whether
+    another page follows.
+    """
+    terms = re.findall(r'\w+', request.args.get('q', '').lower())
+    if not terms:
+        return jsonify({'error': 'Query must contain at least one word'}), 400
+    if len(terms) > MAX_SEARCH_TERMS:
+        return jsonify({'error': f'At most {MAX_SEARCH_TERMS} words per query'}), 400
+
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        if value:
+            try:
+                bounds[name] = datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+            except ValueError:
+                return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+    task_id = request.args.get('task_id', type=int)
+    limit = request.args.get('limit', 20, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if limit < 1 or limit > MAX_SEARCH_RESULTS:
+        return jsonify({'error': f'Limit must be between 1 and {MAX_SEARCH_RESULTS}'}), 400
+    if offset < 0:
+        return jsonify({'error': 'Offset must not be negative'}), 400
+
+    with db_session() as repo:
+        # One extra row tells whether there is another page
+        rows = repo.search_footnotes(
+            terms, bounds.get('start'), bounds.get('end'), task_id, limit=limit + 1, offset=offset
+        )
+
+    return jsonify({
+        'query': ' '.join(terms),
+        'offset': offset,
+        'limit': limit,
+        'has_more': len(rows) > limit,
+        'results': [
+            {
+                'task_id': row['task_id'],
+                'task_name': row['task_name'],
+                'date': row['completed_date'].isoformat(),
+                'is_completed': bool(row['is_completed']),
+                'footnote': row['footnote'],
+                'score': round(float(row['score']), 4)
+            }
+            for row in rows[:limit]
+        ]
+    })
+
+
+# ============== Import/Export API Routes ==============
+
+@app.route('/api/import', methods=['POST'])
+@login_required
+def import_data():
+    """Bulk-load history from an uploaded file (multipart field "file") or the raw request body.
+
+    ?format=csv|ndjson|sql, defaulting to the uploaded file's extension.
+    Everything is written in one transaction, or nothing on error.
+    """
+    import importer
+
+    upload = request.files.get('file')
+    fmt = request.args.get('format') or (upload and importer.detect_format(upload.filename))
+    if fmt not in importer.FORMATS:
+        return jsonify({'error': f"Format must be one of: {', '.join(importer.FORMATS)}"}), 400
+
+    binary = upload.stream if upload else io.BytesIO(request.get_data())
+    try:
+        result = run_import(binary, fmt)
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+
+    return jsonify({'message': 'Import complete', **result})
+
+
+@app.route('/api/export', methods=['GET'])
+@login_required
+def export_data():
+    """Download the full completion history (or ?start=/&end= dates) as ?format=ndjson|csv.
+
+    The response is streamed from one unbuffered query, so any amount of
+    history is exported in constant memory.
+    """
+    import export
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f"Format must be one of: {', '.join(sorted(export.FORMATS))}"}), 400
+
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        if value:
+            try:
+                bounds[name] = datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+            except ValueError:
+                return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+    # Fail with a JSON error now rather than in the middle of the stream
+    get_storage()
+
+    mimetype, extension, _ = export.FORMATS[fmt]
+    # stream_with_context keeps the request open, so its metrics cover the stream
+    response = Response(
+        stream_with_context(export_history(fmt, bounds.get('start'), bounds.get('end'))), mimetype=mimetype
+    )
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="lifelogger_export_{date.today():%Y%m%d}.{extension}"'
+    )
+    return response
+
+
+@app.route('/api/stats/cache', methods=['GET'])
+@login_required
+def get_cache_stats():
+    """Get hit/miss counters of the in-process stats cache."""
+    return jsonify(stats_cache.stats())
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Expose request and database metrics in Prometheus text format.
+
+    Readable with the site password session or, for scrapers, with
+    "Authorization: Bearer <METRICS_TOKEN>".
+    """
+    import hmac
+
+    token = Config.METRICS_TOKEN
+    authorized = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and Config.SITE_PASSWORD and not session.get('authenticated'):
+        return jsonify({'error': 'Authentication required'}), 401
+
+    cache = stats_cache.stats()
+    extra = [
+        ('lifelogger_stats_cache_hits_total', 'counter', 'Stats cache hits.', cache['hits']),
+        ('lifelogger_stats_cache_misses_total', 'counter', 'Stats cache misses.', cache['misses']),
+        ('lifelogger_stats_cache_entries', 'gauge', 'Payloads held in the stats cache.', cache['size']),
+    ]
+    # Pool figures only once storage exists; scraping must not open connections
+    pool = storage.pool_stats() if storage is not None else {}
+    if pool:
+        extra += [
+            ('lifelogger_db_pool_connections', 'gauge', 'Open database connections.', pool['size']),
+            ('lifelogger_db_pool_in_use', 'gauge', 'Connections checked out.', pool['in_use']),
+            ('lifelogger_db_pool_idle', 'gauge', 'Connections waiting in the pool.', pool['idle']),
+            ('lifelogger_db_pool_waiting', 'gauge', 'Requests waiting for a connection.', pool['waiting']),
+            ('lifelogger_db_pool_max_size', 'gauge', 'Most connections the pool opens.', pool['max_size']),
+            ('lifelogger_db_pool_opened_total', 'counter', 'Connections opened.', pool['opened']),
+            ('lifelogger_db_pool_recycled_total', 'counter', 'Connections replaced for age.', pool['recycled']),
+            ('lifelogger_db_pool_ping_failures_total', 'counter', 'Stale connections found by a ping.',
+             pool['ping_failures']),
+            ('lifelogger_db_pool_waits_total', 'counter', 'Checkouts that had to wait.', pool['waits']),
+            ('lifelogger_db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting.', pool['timeouts']),
+        ]
+    body = request_metrics.render(extra)
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
 # ============== Error Handlers ==============
 
 @app.errorhandler(404)
@@ -688,6 +1786,12 @@ def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
 
+@app.errorhandler(StorageError)
+def database_error(error):
+    """Report database errors raised outside db_operation (e.g. in cached_query)."""
+    return jsonify({'error': str(error)}), 500
+
+
 @app.errorhandler(429)
 def ratelimit_handler(e):
     """Handle rate limit exceeded errors."""
@@ -704,9 +1808,10 @@ if __name__ == '__main__':
     print("  LifeLogger - Daily Task & Achievement Tracker")
     print("="*50 + "\n")
     
-    if init_db_pool():
+    if init_storage():
         print(f"[*] Starting server on http://localhost:5004\n")
         app.run(host='0.0.0.0', port=5004, debug=Config.DEBUG)
     else:
         print("\n[WARN] Please ensure MySQL is running and the database is initialized.")
-        print("   Run: mysql -u root -p < init_db.sql\n")
+        print("   Run: mysql -u root -p < init_db.sql")
+        print("   Or set DB_ENGINE=sqlite to use an embedded database file.\n")
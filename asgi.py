@@ -0,0 +1,173 @@
+"""
+ASGI entry point for LifeLogger.
+
+Serves the same Flask routes from an event loop:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+The event loop accepts connections and reads request bodies, so idle
+keep-alive clients and slow uploads cost no thread. Each request is then
+handled on a bounded pool of ASGI_WORKERS threads (the route code and its
+database calls are synchronous), and its response is streamed back from
+that thread. Independent queries of one request, such as the stats
+queries behind /api/dashboard, run concurrently on ASGI_QUERY_WORKERS
+threads with a connection each (see app.read_concurrently).
+
+Both thread counts default to DB_POOL_SIZE, so requests queue in the
+event loop rather than for a pool connection.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import app as lifelogger
+from config import Config
+
+# Request bodies larger than this are spooled to a temp file
+MAX_MEMORY_BODY = 1024 * 1024
+
+request_executor = ThreadPoolExecutor(max_workers=Config.ASGI_WORKERS, thread_name_prefix='lifelogger-request')
+query_executor = lifelogger.enable_concurrent_reads(Config.ASGI_QUERY_WORKERS)
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the response was sent."""
+
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope and its buffered body (see read_body) into a WSGI environ (PEP 3333)."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        # Repeated headers are joined, as a WSGI server would
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+
+    # The body is read whole, so its size is the length even for a chunked
+    # upload without Content-Length, and the stream ends where the body does
+    body.seek(0, os.SEEK_END)
+    environ['CONTENT_LENGTH'] = str(body.tell())
+    body.seek(0)
+    environ['wsgi.input_terminated'] = True
+    return environ
+
+
+def run_wsgi(environ, send_message):
+    """Call the Flask app and pass its response to send_message() (runs on a request thread).
+
+    send_message blocks until the event loop has sent each message, so a
+    slow client slows down the producer instead of buffering the response.
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and response.get('started'):
+            raise exc_info[1].with_traceback(exc_info[2])
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    def start():
+        if not response.get('started'):
+            response['started'] = True
+            send_message({'type': 'http.response.start', 'status': response['status'],
+                          'headers': response['headers']})
+
+    body = lifelogger.app.wsgi_app(environ, start_response)
+    try:
+        for chunk in body:
+            if chunk:
+                start()
+                send_message({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        start()
+        send_message({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        # Ends the request context of streamed responses (and their metrics)
+        if hasattr(body, 'close'):
+            body.close()
+
+
+async def read_body(receive):
+    """Read the whole request body into a spooled temp file."""
+    body = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORY_BODY)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            raise ClientDisconnected()
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    body.seek(0)
+    return body
+
+
+async def handle_http(scope, receive, send):
+    try:
+        body = await read_body(receive)
+    except ClientDisconnected:
+        return
+    loop = asyncio.get_running_loop()
+
+    def send_message(message):
+        try:
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+        except Exception as err:
+            raise ClientDisconnected() from err
+
+    try:
+        await loop.run_in_executor(request_executor, run_wsgi, build_environ(scope, body), send_message)
+    except ClientDisconnected:
+        pass
+    finally:
+        body.close()
+
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.get_running_loop().run_in_executor(None, shutdown)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def shutdown():
+    request_executor.shutdown(wait=True)
+    query_executor.shutdown(wait=True)
+    if lifelogger.storage is not None:
+        lifelogger.storage.close()
+
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'http':
+        await handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
+    else:
+        raise NotImplementedError(f"Unsupported ASGI scope type: {scope['type']}")
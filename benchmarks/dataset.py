@@ -0,0 +1,139 @@
+"""
+Seeded synthetic dataset for LifeLogger benchmarks.
+
+Generates N tasks with M years of daily completions and footnotes, ending
+on --end (default today), and loads them through the bulk importer into
+the database configured in .env (or an SQLite file with --sqlite). The
+same seed, size and end date always produce the same rows.
+
+Each task has its own completion rate; a star is more likely the day
+after a star, so histories have realistic streaks. About one task in ten
+is deleted halfway through the range and keeps its history.
+
+Usage:
+    python benchmarks/dataset.py --tasks 20 --years 3
+    python benchmarks/dataset.py --tasks 50 --years 10 --seed 7 --sqlite /tmp/lifelogger-bench.db
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import importer  # noqa: E402
+
+TASK_NAMES = (
+    'Exercise', 'Read', 'Journal', 'Practice coding', 'Meditate', 'Walk', 'Stretch', 'Learn a language',
+    'Drink water', 'Sleep by 11', 'Cook', 'Practice guitar', 'Call family', 'Tidy up', 'No sugar', 'Plan the day',
+)
+FOOTNOTE_WORDS = (
+    'felt', 'great', 'tired', 'late', 'morning', 'evening', 'skipped', 'half', 'extra', 'long', 'short',
+    'session', 'with', 'friends', 'outside', 'at', 'home', 'gym', 'park', 'rain', 'busy', 'day', 'good', 'focus',
+)
+
+# Probability of a footnote on a day with a star, and on a day without one
+FOOTNOTE_RATE = 0.05
+FOOTNOTE_ONLY_RATE = 0.01
+
+
+def generate_records(tasks, years, seed=42, end=None, footnote_rate=FOOTNOTE_RATE):
+    """Yield ('task'|'completion', record) pairs in the shape importer.import_records() expects."""
+    rng = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=round(365.25 * years) - 1)
+    created_at = datetime.combine(start, datetime.min.time())
+
+    profiles = []
+    for task_id in range(1, tasks + 1):
+        name = TASK_NAMES[(task_id - 1) % len(TASK_NAMES)]
+        if task_id > len(TASK_NAMES):
+            name = f"{name} {(task_id - 1) // len(TASK_NAMES) + 1}"
+        deleted = rng.random() < 0.1
+        profiles.append({
+            'id': task_id,
+            'name': name,
+            'rate': rng.uniform(0.35, 0.9),
+            # Deleted tasks stop halfway through the range
+            'last_day': start + timedelta(days=(end - start).days // 2) if deleted else end,
+        })
+        yield 'task', {
+            'id': task_id,
+            'name': name,
+            'created_at': created_at,
+            'is_active': not deleted,
+            'position': task_id * 1000,
+        }
+
+    for task in profiles:
+        starred = False
+        day = start
+        while day <= task['last_day']:
+            # Stars come in runs: more likely right after a star
+            chance = min(task['rate'] + 0.1, 0.97) if starred else max(task['rate'] - 0.15, 0.05)
+            starred = rng.random() < chance
+            footnote = None
+            if rng.random() < (footnote_rate if starred else FOOTNOTE_ONLY_RATE):
+                footnote = ' '.join(rng.choice(FOOTNOTE_WORDS) for _ in range(rng.randint(2, 8)))
+            if starred or footnote:
+                yield 'completion', {
+                    'task_id': task['id'],
+                    'task_name': task['name'],
+                    'completed_date': day,
+                    'is_completed': starred,
+                    'footnote': footnote,
+                    'earned_at': datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randint(360, 1380)),
+                }
+            day += timedelta(days=1)
+
+
+def populate(storage, tasks, years, seed=42, end=None, force=False):
+    """Migrate storage's schema and load a generated dataset into it. Returns importer statistics.
+
+    Refuses (ValueError) to write into a database that already has tasks
+    unless force is set.
+    """
+    storage.migrate(apply=True)
+    with storage.session() as repo:
+        if repo.count_active_tasks() and not force:
+            raise ValueError("The database already has tasks; use an empty database or --force")
+        result = importer.import_records(repo, generate_records(tasks, years, seed, end))
+        repo.commit()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=20, help='number of tasks (default 20)')
+    parser.add_argument('--years', type=float, default=3, help='years of history (default 3)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (default 42)')
+    parser.add_argument('--end', type=date.fromisoformat, help='last day of history, YYYY-MM-DD (default today)')
+    parser.add_argument('--sqlite', metavar='PATH', help='load into this SQLite file instead of the .env database')
+    parser.add_argument('--force', action='store_true', help='write even if the database already has tasks')
+    args = parser.parse_args()
+
+    if args.sqlite:
+        os.environ['DB_ENGINE'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = args.sqlite
+    # Config reads the environment on import
+    from config import Config
+    from storage import StorageError, create_storage
+
+    try:
+        storage = create_storage(Config)
+        result = populate(storage, args.tasks, args.years, args.seed, args.end, args.force)
+    except (StorageError, ValueError) as err:
+        print(f"[FAIL] {err}")
+        return 1
+    storage.close()
+
+    print(f"[OK] Generated {args.tasks} tasks x {args.years:g} years (seed {args.seed}) into {storage.engine}")
+    print(f"[INFO] {result['completions']} completions in {result['seconds']}s; "
+          f"rollup {result['rollup_days']} days, streaks for {result['streak_tasks']} tasks")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+Query-plan checks for the LifeLogger API.
+
+Runs every route scenario of routes.py a few times against a seeded
+database, records the SQL each one executes and EXPLAINs every distinct
+statement. By default this uses an embedded SQLite database in a
+temporary directory, with the years before the last one archived so that
+UNION reads over the archive are covered too. --engine mysql uses the
+database configured in .env (its writes are real: point it at a scratch
+database).
+
+The run fails (exit code 1) when a statement scans a history table from
+end to end (any table except tasks and task_streaks, which hold one row
+per task) or sorts its rows in a filesort / temporary B-tree, unless
+ALLOWED lists it with the reason.
+
+Usage:
+    python benchmarks/plans.py
+    python benchmarks/plans.py --verbose --only dashboard
+    python benchmarks/plans.py --engine mysql
+"""
+import argparse
+import os
+import re
+import sys
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import routes  # noqa: E402
+
+# One row per task: scanning or sorting them is never a problem
+SMALL_TABLES = {'tasks', 't', 'task_streaks', 's', 'schema_version'}
+
+# Statements that may scan or sort: (route name regex, SQL regex, problem, reason)
+ALLOWED = [
+    (r'GET /api/export', r'ORDER BY dtc\.completed_date ASC', 'scan',
+     'the export reads the whole history by design'),
+    (r'GET /api/export', r'ORDER BY dtc\.completed_date ASC', 'sort',
+     'the export merges the hot and archived history by date'),
+    (r'.', r'AS bucket', 'sort',
+     'grouping days into weeks, months or years sorts at most one row per day'),
+    (r'.', r'FROM daily_star_summary WHERE star_count > 0 ORDER BY summary_date ASC LIMIT 1', 'scan',
+     'the scan in date order stops at the first day with a star'),
+    (r'GET /api/history', r'\) page_0 UNION ALL', 'sort',
+     'merges the pages read from each table, at most twice the page size'),
+    (r'GET /api/search', r'AS score', 'sort',
+     'matches are ranked by relevance; each branch sorts only its matches'),
+    (r'POST /api/import', r'.', 'scan',
+     'an import rebuilds the rollup and streaks from the whole history'),
+    (r'POST /api/import', r'.', 'sort',
+     'an import rebuilds the rollup and streaks from the whole history'),
+]
+
+# Requests only worth a plan check: (name, endpoint, read-only, request builder, setup)
+EXTRA_SCENARIOS = [
+    ('GET /api/history?cursor=', 'get_history', True,
+     lambda ctx: ('GET', f"/api/history?limit=50&cursor={ctx.history_cursor}", None),
+     lambda ctx, iterations: setattr(ctx, 'history_cursor', ctx.client.app.encode_history_cursor(
+         {'completed_date': date.fromisoformat(ctx.day()), 'id': 10 ** 9}))),
+]
+
+# Statements that are not worth explaining
+SKIPPED = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA|SELECT GET_LOCK|SELECT RELEASE_LOCK|'
+                     r'CREATE|ALTER|DROP)', re.IGNORECASE)
+
+
+# ============== Recording ==============
+
+class Recorder:
+    """Wraps the storage's connections and keeps every statement run during a route."""
+
+    def __init__(self, storage):
+        self.statements = {}
+        connect = storage.connect
+        storage.connect = lambda: RecordingConnection(connect(), self)
+
+    def record(self, query, params):
+        if not SKIPPED.match(query):
+            self.statements.setdefault(' '.join(query.split()), (query, params))
+
+    def take(self):
+        statements, self.statements = self.statements, {}
+        return list(statements.values())
+
+
+class RecordingConnection:
+    def __init__(self, conn, recorder):
+        self._conn = conn
+        self._recorder = recorder
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._conn.cursor(*args, **kwargs), self._recorder)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class RecordingCursor:
+    def __init__(self, cursor, recorder):
+        self._cursor = cursor
+        self._recorder = recorder
+
+    def execute(self, query, params=()):
+        self._recorder.record(query, params)
+        return self._cursor.execute(query, params)
+
+    def executemany(self, query, seq_params):
+        seq_params = list(seq_params)
+        if seq_params:
+            self._recorder.record(query, seq_params[0])
+        return self._cursor.executemany(query, seq_params)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# ============== Plans ==============
+
+def explain_sqlite(path, query, params):
+    """Return (plan lines, problems) for a statement against the SQLite file at path."""
+    import sqlite3
+    from storage.sqlite import translate
+
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute('EXPLAIN QUERY PLAN ' + translate(query), params).fetchall()
+    finally:
+        conn.close()
+
+    depth = {0: -1}
+    lines = []
+    problems = []
+    derived = set()
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+        match = re.match(r'(?:CO-ROUTINE|MATERIALIZE) (\S+)', detail)
+        if match:
+            derived.add(match.group(1))
+        match = re.match(r'SCAN (\S+)', detail)
+        if (match and match.group(1) not in SMALL_TABLES | derived and 'VIRTUAL TABLE' not in detail
+                and 'CONSTANT ROW' not in detail):
+            problems.append(('scan', detail))
+        if detail.startswith('USE TEMP B-TREE'):
+            problems.append(('sort', detail))
+    return lines, problems
+
+
+def explain_mysql(storage, query, params):
+    """Return (plan lines, problems) for a statement against the MySQL database."""
+    with storage.session() as repo:
+        repo.cursor.execute('EXPLAIN ' + query, params)
+        rows = repo.cursor.fetchall()
+        repo.rollback()
+
+    lines = []
+    problems = []
+    for row in rows:
+        table = row.get('table') or ''
+        extra = row.get('Extra') or ''
+        detail = f"{table}: type={row.get('type')} key={row.get('key')} rows={row.get('rows')} {extra}".strip()
+        lines.append(detail)
+        if table.startswith('<') or table in SMALL_TABLES:
+            continue
+        if row.get('type') in ('ALL', 'index'):
+            problems.append(('scan', detail))
+        if 'Using filesort' in extra or 'Using temporary' in extra:
+            problems.append(('sort', detail))
+    return lines, problems
+
+
+def allowed(route, query, problem):
+    """Return the ALLOWED reason covering problem, or None."""
+    query = ' '.join(query.split())
+    for route_pattern, query_pattern, kind, reason in ALLOWED:
+        if kind == problem and re.search(route_pattern, route) and re.search(query_pattern, query):
+            return reason
+    return None
+
+
+# ============== Main ==============
+
+def archive_old_years(module):
+    """Archive every year before the last one, as `flask --app app archive run --keep-years 1` does."""
+    from storage import archive
+
+    cutoff = archive.cutoff(1)
+    with module.db_session() as repo:
+        first = repo.first_hot_date()
+    moved = 0
+    for year in range(first.year, cutoff.year) if first else ():
+        with module.db_session() as repo:
+            moved += repo.archive_year(year)
+            repo.commit()
+    print(f"[OK] Archived {moved} completions dated before {cutoff.isoformat()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engine', choices=('sqlite', 'mysql'), default='sqlite',
+                        help='embedded SQLite in a temp dir (default) or the MySQL database in .env')
+    parser.add_argument('--tasks', type=int, default=20, help='tasks in the generated dataset (default 20)')
+    parser.add_argument('--years', type=float, default=3, help='years in the generated dataset (default 3)')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the dataset and requests (default 42)')
+    parser.add_argument('--iterations', type=int, default=3, help='requests per route (default 3)')
+    parser.add_argument('--only', action='append', metavar='TEXT', help='check the routes whose name contains TEXT')
+    parser.add_argument('--verbose', action='store_true', help='print the plan of every statement')
+    args = parser.parse_args()
+
+    client = routes.setup_app(args)
+    if args.engine == 'sqlite':
+        archive_old_years(client.app)
+    storage = client.app.get_storage()
+    recorder = Recorder(storage)
+    if args.engine == 'sqlite':
+        path = os.environ['SQLITE_PATH']
+        explain = lambda query, params: explain_sqlite(path, query, params)  # noqa: E731
+    else:
+        explain = lambda query, params: explain_mysql(storage, query, params)  # noqa: E731
+
+    ctx = routes.Context(client, args.seed)
+    recorder.take()
+    scenarios = [s for s in routes.SCENARIOS + EXTRA_SCENARIOS
+                 if not args.only or any(text in s[0] for text in args.only)]
+    print(f"[*] Checking the query plans of {len(scenarios)} routes ({args.engine}, {date.today().isoformat()})")
+
+    failures = 0
+    checked = 0
+    for scenario in scenarios:
+        name = scenario[0]
+        _, _, _, errors = routes.run_scenario(client, ctx, scenario, args.seed, args.iterations, 1)
+        for error in errors[:3]:
+            print(f"[WARN] {error}")
+        statements = recorder.take()
+        route_failures = []
+        for query, params in statements:
+            lines, problems = explain(query, params)
+            checked += 1
+            if args.verbose:
+                print(f"    {name}: {' '.join(query.split())[:160]}")
+                for line in lines:
+                    print(f"        {line}")
+            for problem, detail in problems:
+                reason = allowed(name, query, problem)
+                if reason:
+                    if args.verbose:
+                        print(f"        [INFO] {problem} allowed: {reason}")
+                    continue
+                route_failures.append(f"{problem}: {detail}\n        in: {' '.join(query.split())[:300]}")
+        status = 'FAIL' if route_failures else 'OK'
+        print(f"[{status}] {name}: {len(statements)} statements")
+        for failure in route_failures:
+            print(f"    {failure}")
+        failures += len(route_failures)
+
+    if failures:
+        print(f"[FAIL] {failures} statements scan or sort a history table ({checked} checked)")
+        return 1
+    print(f"[OK] {checked} statements use index seeks ({len(scenarios)} routes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
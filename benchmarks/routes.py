@@ -0,0 +1,554 @@
+"""
+Per-route benchmark for the LifeLogger API.
+
+Drives every route in app.py and reports p50/p95/p99 latency, throughput
+and SQL statements per request. By default it seeds an embedded SQLite
+database in a temporary directory (see dataset.py) and calls the app
+through Flask's test client, clearing the stats cache before each read
+so the database path is measured (--warm keeps the cache). Writes put
+the rows they change back before each request (not timed), so a route's
+SQL statements per request do not depend on --iterations.
+
+--engine mysql uses the database configured in .env. It is seeded
+first when it has no tasks, and its writes are real: point it at a
+scratch database. --url benchmarks a running server over HTTP with
+--workers concurrent clients instead; SQL statements are then not
+counted.
+
+--save-baseline writes the results to a JSON file. --baseline compares
+against one and exits with code 1 when a route's --metric latency (p50 by
+default, the least noisy) grows by more than --tolerance plus --slack-ms,
+or when it runs more SQL statements per request than before.
+
+benchmarks/baseline.json is recorded once, so later runs keep being
+compared with the same reference. --update-baseline adds the routes it
+is missing and refreshes the SQL statement counts of the others (they do
+not depend on the machine), but keeps their recorded latencies. Re-record
+a route's latencies only for a change meant to alter them, and say why.
+
+Usage:
+    python benchmarks/routes.py
+    python benchmarks/routes.py --tasks 50 --years 10 --iterations 200
+    python benchmarks/routes.py --baseline benchmarks/baseline.json
+    python benchmarks/routes.py --update-baseline benchmarks/baseline.json
+    python benchmarks/routes.py --engine mysql
+    python benchmarks/routes.py --url http://127.0.0.1:5000 --workers 8 --password secret
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dataset  # noqa: E402
+
+PERCENTILES = (50, 95, 99)
+
+
+# ============== Clients ==============
+
+class TestClient:
+    """Calls the app in-process through Flask's test client, counting SQL statements."""
+
+    def __init__(self, module):
+        self.app = module
+        self.client = module.app.test_client()
+        with self.client.session_transaction() as flask_session:
+            flask_session['authenticated'] = True
+        self.queries = 0
+        storage = module.get_storage()
+        connect = storage.connect
+        storage.connect = lambda: CountingConnection(connect(), self)
+
+    def request(self, method, path, json_body=None, data=None, headers=None):
+        response = self.client.open(path, method=method, json=json_body, data=data, headers=headers)
+        body = response.get_data()  # Drains streamed responses
+        response.close()
+        return response.status_code, body
+
+
+class CountingConnection:
+    """Wraps a connection so every cursor's execute/executemany call is counted."""
+
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter.queries += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._counter.queries += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as responses, like the test client does."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HTTPClient:
+    """Calls a running server; safe to share between worker threads."""
+
+    queries = None
+
+    def __init__(self, base_url, password=None):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+        if password:
+            status, body = self.request('POST', '/api/verify-password', json_body={'password': password})
+            if status != 200:
+                raise SystemExit(f"[FAIL] Login failed ({status}): {body[:200]!r}")
+
+    def request(self, method, path, json_body=None, data=None, headers=None):
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with self.opener.open(req) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as err:
+            return err.code, err.read()
+
+
+# ============== Scenarios ==============
+
+class Context:
+    """Task ids and dates the scenarios build their requests from."""
+
+    def __init__(self, client, seed):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.today = date.today()
+        status, body = client.request('GET', '/api/tasks')
+        if status != 200:
+            raise SystemExit(f"[FAIL] GET /api/tasks returned {status}: {body[:200]!r}")
+        self.task_ids = [task['id'] for task in json.loads(body)]
+        if len(self.task_ids) < 2:
+            raise SystemExit("[FAIL] The benchmark needs at least 2 tasks; seed the database first")
+        self.scratch_ids = []
+        self.pairs = []
+        self.stars = []
+        self.moved = None
+        # Called before each timed request of a scenario (not timed)
+        self.before_each = None
+
+    def task_id(self):
+        return self.rng.choice(self.task_ids)
+
+    def day(self, within=365):
+        return (self.today - timedelta(days=self.rng.randrange(within))).isoformat()
+
+    def send(self, method, path, json_body=None):
+        """Send an untimed request, failing the run when it is rejected."""
+        status, body = self.client.request(method, path, json_body=json_body)
+        if status >= 400:
+            raise SystemExit(f"[FAIL] {method} {path} returned {status}: {body[:200]!r}")
+        return body
+
+    def pick_pairs(self, count, within=30):
+        """Pick count distinct recent (task, day) pairs into self.pairs."""
+        pairs = set()
+        while len(pairs) < count:
+            pairs.add((self.task_id(), self.day(within)))
+        self.pairs = sorted(pairs)
+        return self.pairs
+
+    def star_days(self, count):
+        """Star count distinct recent (task, day) pairs (not timed)."""
+        for task_id, day in self.pick_pairs(count, 90):
+            self.send('POST', f'/api/tasks/{task_id}/complete', {'date': day})
+
+    def toggle_stars(self, completed):
+        """Pick a (task, day) pair for each value of completed, the star the timed request sets on it.
+
+        Before each request the stars are set the other way (not timed), so
+        every request changes the same rows and runs the same statements.
+        """
+        self.stars = list(zip(self.pick_pairs(len(completed)), completed))
+        undo = [{'task_id': task_id, 'date': day, 'completed': not value} for (task_id, day), value in self.stars]
+        self.before_each = lambda: self.send('POST', '/api/completions/batch', {'operations': undo})
+
+    def toggle_move(self):
+        """Pick the (task, neighbour) of the move scenario; before each request the task is put back."""
+        task_id, anchor = self.moved = self.rng.sample(self.task_ids, 2)
+        self.before_each = lambda: self.send('POST', f'/api/tasks/{task_id}/move', {'before_id': anchor})
+
+    def log_changes(self, count):
+        """Star count (task, day) pairs, keeping the change log version from before them (not timed)."""
+        status, body = self.client.request('GET', '/api/changes')
+        if status != 200:
+            raise SystemExit(f"[FAIL] GET /api/changes returned {status}: {body[:200]!r}")
+        self.changes_since = json.loads(body)['version']
+        self.star_days(count)
+
+    def create_scratch_tasks(self, count):
+        """Create tasks for the delete scenario (not timed)."""
+        for i in range(count):
+            status, body = self.client.request('POST', '/api/tasks', json_body={'name': f'Benchmark scratch {i}'})
+            if status != 201:
+                raise SystemExit(f"[FAIL] Could not create scratch tasks ({status}): {body[:200]!r}")
+            self.scratch_ids.append(json.loads(body)['id'])
+
+
+def _import_body(ctx):
+    lines = [
+        json.dumps({'completed_date': ctx.day(), 'task_id': ctx.task_id(), 'task_name': 'Imported',
+                    'is_completed': True, 'footnote': None})
+        for _ in range(10)
+    ]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def _complete_request(ctx, query=''):
+    (task_id, day), _ = ctx.stars[0]
+    return 'POST', f'/api/tasks/{task_id}/complete{query}', {'date': day}
+
+
+def _batch_request(ctx):
+    operations = [{'task_id': task_id, 'date': day, 'completed': value} for (task_id, day), value in ctx.stars]
+    return 'POST', '/api/completions/batch', {'operations': operations}
+
+
+def _move_request(ctx):
+    task_id, after_id = ctx.moved
+    return 'POST', f'/api/tasks/{task_id}/move', {'after_id': after_id}
+
+
+# (name, endpoint, read-only, request builder, setup)
+SCENARIOS = [
+    ('GET /', 'index', True, lambda ctx: ('GET', '/', None), None),
+    ('GET /login', 'login', True, lambda ctx: ('GET', '/login', None), None),
+    ('GET /api/tasks', 'get_tasks', True, lambda ctx: ('GET', f'/api/tasks?date={ctx.day()}', None), None),
+    ('GET /api/dashboard', 'get_dashboard', True,
+     lambda ctx: ('GET', f'/api/dashboard?date={ctx.day()}', None), None),
+    ('GET /api/dashboard?days=all', 'get_dashboard', True,
+     lambda ctx: ('GET', f'/api/dashboard?date={ctx.day()}&days=all', None), None),
+    ('GET /api/stats/daily', 'get_daily_stats', True, lambda ctx: ('GET', '/api/stats/daily?days=30', None), None),
+    ('GET /api/stats/daily?days=all', 'get_daily_stats', True,
+     lambda ctx: ('GET', '/api/stats/daily?days=all', None), None),
+    ('GET /api/stats/weekly', 'get_weekly_stats', True,
+     lambda ctx: ('GET', f'/api/stats/weekly?date={ctx.day()}&days=7&days=30&days=90', None), None),
+    ('GET /api/stats/today', 'get_today_stats', True, lambda ctx: ('GET', '/api/stats/today', None), None),
+    ('GET /api/stats/average', 'get_average_stats', True,
+     lambda ctx: ('GET', f'/api/stats/average?date={ctx.day()}&days=30', None), None),
+    ('GET /api/stats/heatmap', 'get_heatmap', True,
+     lambda ctx: ('GET', f'/api/stats/heatmap?year={ctx.today.year - ctx.rng.randrange(3)}', None), None),
+    ('GET /api/stats/streaks', 'get_streaks', True, lambda ctx: ('GET', '/api/stats/streaks', None), None),
+    ('GET /api/stats/cache', 'get_cache_stats', True, lambda ctx: ('GET', '/api/stats/cache', None), None),
+    ('GET /api/metrics', 'get_metrics', True, lambda ctx: ('GET', '/api/metrics', None), None),
+    ('GET /api/history', 'get_history', True,
+     lambda ctx: ('GET', f'/api/history?task_id={ctx.task_id()}&limit=100', None), None),
+    ('GET /api/search', 'search_footnotes', True,
+     lambda ctx: ('GET', f'/api/search?q={"+".join(ctx.rng.sample(dataset.FOOTNOTE_WORDS, 2))}', None), None),
+    ('GET /api/changes', 'get_changes', True,
+     lambda ctx: ('GET', f'/api/changes?since={ctx.changes_since}', None),
+     lambda ctx, iterations: ctx.log_changes(20)),
+    ('GET /api/export', 'export_data', True, lambda ctx: ('GET', '/api/export?format=ndjson', None), None),
+    # Writes change the same rows on every request (see Context.toggle_stars()),
+    # so their SQL statement counts do not depend on the seed or --iterations
+    ('POST /api/tasks/<id>/complete', 'complete_task', False,
+     lambda ctx: _complete_request(ctx), lambda ctx, iterations: ctx.toggle_stars([True])),
+    ('POST /api/tasks/<id>/complete?include=stats', 'complete_task', False,
+     lambda ctx: _complete_request(ctx, '?include=stats'), lambda ctx, iterations: ctx.toggle_stars([True])),
+    ('DELETE /api/tasks/<id>/complete', 'uncomplete_task', False,
+     lambda ctx: ('DELETE', '/api/tasks/{}/complete?date={}'.format(*ctx.stars[0][0]), None),
+     lambda ctx, iterations: ctx.toggle_stars([False])),
+    ('POST /api/completions/batch', 'batch_completions', False,
+     lambda ctx: _batch_request(ctx), lambda ctx, iterations: ctx.toggle_stars([True, False] * 10)),
+    ('POST /api/tasks/<id>/footnote', 'save_footnote', False,
+     lambda ctx: ('POST', f'/api/tasks/{ctx.pairs[0][0]}/footnote',
+                  {'date': ctx.pairs[0][1], 'footnote': f'benchmark note {ctx.rng.random():.6f}'}),
+     lambda ctx, iterations: ctx.pick_pairs(1)),
+    ('PUT /api/tasks/<id>', 'edit_task', False,
+     lambda ctx: ('PUT', f'/api/tasks/{ctx.task_ids[0]}', {'name': f'Renamed {ctx.rng.randrange(1000)}'}), None),
+    ('POST /api/tasks/<id>/move', 'move_task', False,
+     lambda ctx: _move_request(ctx), lambda ctx, iterations: ctx.toggle_move()),
+    ('POST /api/tasks/reorder', 'reorder_tasks', False,
+     lambda ctx: ('POST', '/api/tasks/reorder', {'taskIds': ctx.rng.sample(ctx.task_ids, len(ctx.task_ids))}), None),
+    ('POST /api/import', 'import_data', False,
+     lambda ctx: ('POST', '/api/import?format=ndjson', _import_body(ctx)), None),
+    ('POST /api/tasks', 'add_task', False,
+     lambda ctx: ('POST', '/api/tasks', {'name': f'Benchmark task {ctx.rng.randrange(10 ** 6)}'}), None),
+    ('DELETE /api/tasks/<id>', 'delete_task', False,
+     lambda ctx: ('DELETE', f'/api/tasks/{ctx.scratch_ids.pop()}', None),
+     lambda ctx, iterations: ctx.create_scratch_tasks(iterations)),
+    ('POST /api/verify-password', 'verify_password', False,
+     lambda ctx: ('POST', '/api/verify-password', {'password': ''}), None),
+    ('GET /logout', 'logout', True, lambda ctx: ('GET', '/logout', None), None),
+]
+
+# Statuses that count as success for scenarios expected to be rejected
+EXPECTED_STATUS = {
+    'POST /api/verify-password': 400,
+    'GET /logout': 302,
+    # Signed-in clients (and servers without a password) are sent to /
+    'GET /login': 302,
+}
+
+
+def run_scenario(client, ctx, scenario, seed, iterations, workers, before_request=None):
+    """Run one scenario and return its latencies (ms), statement counts, wall time and error count."""
+    name, _, _, build, setup = scenario
+    # One generator per route, so --only does not change the requests a route gets
+    ctx.rng = random.Random(f'{seed}:{name}')
+    ctx.before_each = None
+    if setup:
+        setup(ctx, iterations)
+    requests = [build(ctx) for _ in range(iterations)]
+    expected = EXPECTED_STATUS.get(name, 'ok')
+    errors = []
+    lock = threading.Lock()
+
+    def send(req):
+        method, path, payload = req
+        kwargs = {'data': payload} if isinstance(payload, bytes) else {'json_body': payload}
+        return client.request(method, path, **kwargs)
+
+    if ctx.before_each:
+        # One untimed round, so the first timed request starts from the same state as the others
+        ctx.before_each()
+        send(requests[0])
+
+    def call(req):
+        method, path, _ = req
+        if ctx.before_each:
+            ctx.before_each()
+        if before_request:
+            before_request()
+        queries_before = client.queries
+        started = time.perf_counter()
+        status, body = send(req)
+        elapsed = (time.perf_counter() - started) * 1000
+        queries = client.queries - queries_before if client.queries is not None else None
+        ok = status < 400 if expected == 'ok' else status == expected
+        if not ok:
+            with lock:
+                errors.append(f"{method} {path} -> {status} {body[:120]!r}")
+        return elapsed, queries
+
+    started = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(call, requests))
+    else:
+        results = [call(req) for req in requests]
+    wall = time.perf_counter() - started
+    return [r[0] for r in results], [r[1] for r in results if r[1] is not None], wall, errors
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    index = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def summarize(latencies, queries, wall):
+    latencies = sorted(latencies)
+    summary = {f'p{p}_ms': round(percentile(latencies, p), 3) for p in PERCENTILES}
+    summary['mean_ms'] = round(statistics.mean(latencies), 3)
+    summary['rps'] = round(len(latencies) / wall, 1) if wall else None
+    summary['queries'] = round(statistics.mean(queries), 2) if queries else None
+    return summary
+
+
+# ============== Baseline ==============
+
+def update_baseline(path, results):
+    """Add the routes missing from the baseline file at path and refresh its statement counts."""
+    with open(path) as f:
+        baseline = json.load(f)
+    for name, current in results.items():
+        base = baseline['routes'].get(name)
+        if base is None:
+            baseline['routes'][name] = current
+            print(f"[INFO] {name} added to the baseline")
+        elif current['queries'] is not None and current['queries'] != base['queries']:
+            print(f"[INFO] {name}: {base['queries']:g} -> {current['queries']:g} SQL statements/request")
+            base['queries'] = current['queries']
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f"[OK] Baseline updated in {path}")
+
+
+def compare(results, baseline, metric, tolerance, slack_ms):
+    """Return the regressions of results against a baseline file's routes."""
+    failures = []
+    key = f'{metric}_ms'
+    for name, current in results.items():
+        base = baseline['routes'].get(name)
+        if base is None:
+            print(f"[WARN] {name} is not in the baseline")
+            continue
+        limit = base[key] * (1 + tolerance) + slack_ms
+        if current[key] > limit:
+            failures.append(f"{name}: {metric} {current[key]:.2f} ms > {limit:.2f} ms "
+                            f"(baseline {base[key]:.2f} ms)")
+        if base.get('queries') is not None and current['queries'] is not None \
+                and current['queries'] > base['queries'] + 0.01:
+            failures.append(f"{name}: {current['queries']:g} SQL statements/request (baseline {base['queries']:g})")
+    return failures
+
+
+# ============== Main ==============
+
+def setup_app(args):
+    """Prepare the database, import the app and return a TestClient."""
+    if args.engine == 'sqlite':
+        directory = tempfile.mkdtemp(prefix='lifelogger-bench-')
+        os.environ['DB_ENGINE'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = os.path.join(directory, 'bench.db')
+    else:
+        os.environ['DB_ENGINE'] = 'mysql'
+
+    from config import Config
+    from storage import create_storage
+
+    storage = create_storage(Config)
+    try:
+        result = dataset.populate(storage, args.tasks, args.years, args.seed)
+        print(f"[OK] Seeded {args.tasks} tasks x {args.years:g} years: {result['completions']} completions")
+    except ValueError:
+        print("[INFO] Database already has tasks; benchmarking its current data")
+    storage.close()
+
+    import app as module
+    module.limiter.enabled = False
+    return TestClient(module)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engine', choices=('sqlite', 'mysql'), default='sqlite',
+                        help='embedded SQLite in a temp dir (default) or the MySQL database in .env')
+    parser.add_argument('--url', help='benchmark a running server over HTTP instead of the test client')
+    parser.add_argument('--password', help='SITE_PASSWORD of the server behind --url')
+    parser.add_argument('--workers', type=int, default=1, help='concurrent HTTP clients with --url (default 1)')
+    parser.add_argument('--tasks', type=int, default=20, help='tasks in the generated dataset (default 20)')
+    parser.add_argument('--years', type=float, default=3, help='years in the generated dataset (default 3)')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the dataset and requests (default 42)')
+    parser.add_argument('--iterations', type=int, default=50, help='requests per route (default 50)')
+    parser.add_argument('--warm', action='store_true', help='keep the stats cache between reads')
+    parser.add_argument('--only', action='append', metavar='TEXT', help='run the routes whose name contains TEXT')
+    parser.add_argument('--baseline', help='fail on regressions against this JSON file')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results to this JSON file')
+    parser.add_argument('--update-baseline', metavar='PATH',
+                        help='add new routes to this JSON file and refresh its SQL statement counts, '
+                             'keeping recorded latencies')
+    parser.add_argument('--metric', choices=[f'p{p}' for p in PERCENTILES], default='p50',
+                        help='latency compared with the baseline (default p50)')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed relative latency growth over the baseline (default 0.5 = 50%%)')
+    parser.add_argument('--slack-ms', type=float, default=2.0,
+                        help='absolute latency growth always allowed, for very fast routes (default 2 ms)')
+    args = parser.parse_args()
+
+    if args.url:
+        client = HTTPClient(args.url, args.password)
+        clear_cache = None
+        endpoints = None
+    else:
+        if args.workers > 1:
+            parser.error('--workers needs --url: the test client runs requests one at a time')
+        client = setup_app(args)
+        clear_cache = None if args.warm else client.app.stats_cache.clear
+        endpoints = {rule.endpoint for rule in client.app.app.url_map.iter_rules()} - {'static'}
+
+    ctx = Context(client, args.seed)
+    scenarios = [s for s in SCENARIOS if not args.only or any(text in s[0] for text in args.only)]
+    if endpoints is not None and not args.only:
+        for endpoint in sorted(endpoints - {s[1] for s in SCENARIOS}):
+            print(f"[WARN] No benchmark scenario for route {endpoint}")
+
+    mode = f"{args.url} with {args.workers} workers" if args.url else f"test client, {args.engine}"
+    print(f"[*] {len(scenarios)} routes x {args.iterations} requests ({mode}, "
+          f"{'warm' if args.warm or args.url else 'cold'} stats cache)")
+    print(f"    {'route':<46} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'SQL/req':>8}")
+
+    results = {}
+    errors = []
+    for scenario in scenarios:
+        latencies, queries, wall, scenario_errors = run_scenario(
+            client, ctx, scenario, args.seed, args.iterations, args.workers,
+            before_request=clear_cache if scenario[2] else None
+        )
+        results[scenario[0]] = summary = summarize(latencies, queries, wall)
+        errors += scenario_errors
+        statements = f"{summary['queries']:8.2f}" if summary['queries'] is not None else f"{'-':>8}"
+        print(f"    {scenario[0]:<46} {summary['p50_ms']:8.2f} {summary['p95_ms']:8.2f} {summary['p99_ms']:8.2f} "
+              f"{summary['rps']:8.1f} {statements}")
+
+    failed = False
+    for error in errors[:20]:
+        print(f"[FAIL] {error}")
+    if errors:
+        print(f"[FAIL] {len(errors)} requests failed")
+        failed = True
+
+    config = {'engine': 'http' if args.url else args.engine, 'tasks': args.tasks, 'years': args.years,
+              'seed': args.seed, 'iterations': args.iterations, 'warm': bool(args.warm or args.url)}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print(f"[WARN] Baseline was recorded with {baseline.get('config')}, this run is {config}")
+        regressions = compare(results, baseline, args.metric, args.tolerance, args.slack_ms)
+        for regression in regressions:
+            print(f"[FAIL] {regression}")
+        if regressions:
+            failed = True
+        else:
+            print(f"[OK] No regressions against {args.baseline}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'config': config, 'routes': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"[OK] Baseline written to {args.save_baseline}")
+
+    if args.update_baseline:
+        update_baseline(args.update_baseline, results)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
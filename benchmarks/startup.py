@@ -0,0 +1,77 @@
+"""
+Cold-start benchmark for the serverless entry point (api/index.py).
+
+Each run starts a fresh Python process, imports the app the way Vercel
+does and serves one request through Flask's test client, reporting the
+import time and first-request latency. Use --max-import-ms and
+--max-first-request-ms to fail (exit code 1) when the median regresses.
+
+Usage:
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --path /api/tasks --max-first-request-ms 800
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child process; prints one JSON line with the timings
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+from api.index import app
+t1 = time.perf_counter()
+response = app.test_client().get({path!r})
+t2 = time.perf_counter()
+print(json.dumps({{'import_ms': (t1 - t0) * 1000, 'first_request_ms': (t2 - t1) * 1000, 'status': response.status_code}}))
+"""
+
+
+def run_once(path, env):
+    """Start a fresh interpreter and return its timings."""
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD.format(root=ROOT, path=path)],
+        capture_output=True, text=True, env=env, cwd=ROOT, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='number of cold starts (default 5)')
+    parser.add_argument('--path', default='/', help='path of the first request (default /)')
+    parser.add_argument('--max-import-ms', type=float, help='fail if median import time exceeds this')
+    parser.add_argument('--max-first-request-ms', type=float, help='fail if median first-request latency exceeds this')
+    parser.add_argument('--no-serverless', action='store_true', help='benchmark the regular (non-serverless) mode')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['SERVERLESS'] = 'False' if args.no_serverless else 'True'
+
+    runs = [run_once(args.path, env) for _ in range(args.runs)]
+    import_ms = statistics.median(r['import_ms'] for r in runs)
+    request_ms = statistics.median(r['first_request_ms'] for r in runs)
+    statuses = sorted({r['status'] for r in runs})
+
+    print(f"[*] {args.runs} cold starts, first request GET {args.path} (status {', '.join(map(str, statuses))})")
+    print(f"    import:        median {import_ms:8.1f} ms  (min {min(r['import_ms'] for r in runs):.1f}, max {max(r['import_ms'] for r in runs):.1f})")
+    print(f"    first request: median {request_ms:8.1f} ms  (min {min(r['first_request_ms'] for r in runs):.1f}, max {max(r['first_request_ms'] for r in runs):.1f})")
+    print(f"    total:         median {import_ms + request_ms:8.1f} ms")
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"[FAIL] Import time {import_ms:.1f} ms exceeds {args.max_import_ms:.1f} ms")
+        failed = True
+    if args.max_first_request_ms is not None and request_ms > args.max_first_request_ms:
+        print(f"[FAIL] First request {request_ms:.1f} ms exceeds {args.max_first_request_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
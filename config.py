@@ -4,11 +4,22 @@ Loads settings from environment variables.
 """
 import os
 import base64
+import hashlib
 import tempfile
-from dotenv import load_dotenv
+
+
+def _env_flag(name, default='False'):
+    return os.getenv(name, default).lower() in ('true', '1', 'yes')
+
+
+# Serverless mode (auto-detected on Vercel): lazy, small connection pool and
+# no .env lookup, since the platform injects the environment directly
+SERVERLESS = _env_flag('SERVERLESS', 'True' if os.getenv('VERCEL') else 'False')
 
 # Load environment variables from .env file
-load_dotenv()
+if not SERVERLESS:
+    from dotenv import load_dotenv
+    load_dotenv()
 
 
 class Config:
@@ -16,20 +27,65 @@ class Config:
     
     # Flask settings
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-    DEBUG = os.getenv('DEBUG', 'False').lower() in ('true', '1', 'yes')
+    DEBUG = _env_flag('DEBUG')
+    SERVERLESS = SERVERLESS
     
+    # Storage engine: 'mysql' (database server) or 'sqlite' (embedded file)
+    DB_ENGINE = os.getenv('DB_ENGINE', 'mysql').lower()
+    SQLITE_PATH = os.getenv('SQLITE_PATH', 'lifelogger.db')
+
     # Database settings
     DB_HOST = os.getenv('DB_HOST', 'localhost')
     DB_PORT = int(os.getenv('DB_PORT', 3306))
     DB_USER = os.getenv('DB_USER', 'root')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
     DB_NAME = os.getenv('DB_NAME', 'lifelogger_db')
+    # Most connections the pool opens; requests beyond that wait for one
     DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    # Connections kept open even when idle; more are opened on demand up to
+    # DB_POOL_SIZE and closed again after DB_POOL_IDLE_TIMEOUT seconds idle.
+    # Defaults to 1 in serverless mode (DB_POOL_INITIAL_SIZE is the old name).
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', os.getenv('DB_POOL_INITIAL_SIZE',
+                                                                 1 if SERVERLESS else DB_POOL_SIZE)))
+    DB_POOL_IDLE_TIMEOUT = int(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+    # Seconds a request waits for a free connection before failing
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+    # Connections older than this many seconds are replaced (0 disables)
     DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
+    # Connections idle for this many seconds are pinged before reuse
+    DB_POOL_PING_INTERVAL = int(os.getenv('DB_POOL_PING_INTERVAL', 30))
+    
+    # Apply pending schema migrations when the pool is created. When off,
+    # run them out-of-band with: flask --app app db upgrade
+    DB_AUTO_MIGRATE = _env_flag('DB_AUTO_MIGRATE', 'True')
+
+    # `flask --app app archive run` keeps the current year and this many
+    # previous ones in daily_task_completions (at least 1)
+    ARCHIVE_KEEP_YEARS = int(os.getenv('ARCHIVE_KEEP_YEARS', 2))
+
+    # `flask --app app changes prune` keeps this many days of the change
+    # log behind /api/changes; clients that last synced earlier reload everything
+    CHANGE_LOG_KEEP_DAYS = int(os.getenv('CHANGE_LOG_KEEP_DAYS', 30))
     
+    # ASGI mode (asgi.py): threads running request handlers, and threads
+    # running the concurrent reads of one request. Both default to the pool size.
+    ASGI_WORKERS = int(os.getenv('ASGI_WORKERS', DB_POOL_SIZE))
+    ASGI_QUERY_WORKERS = int(os.getenv('ASGI_QUERY_WORKERS', DB_POOL_SIZE))
+
     # SSL Certificate for Aiven (can be base64-encoded content or file path)
     DB_SSL_CA = os.getenv('DB_SSL_CA', '')
     
+    # Max entries in the in-process stats cache (0 disables caching).
+    # Entries are checked against the database's data versions, so every
+    # process sees every write; off by default in serverless mode, where
+    # short-lived instances rarely hit.
+    STATS_CACHE_SIZE = int(os.getenv('STATS_CACHE_SIZE', 0 if SERVERLESS else 256))
+
+    # Statements slower than this are logged with their SQL (0 disables)
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+    # Bearer token that lets a Prometheus scraper read /api/metrics without the site password
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    
     # Site password for cloud access protection (leave empty to disable)
     SITE_PASSWORD = os.getenv('SITE_PASSWORD', '')
     
@@ -43,6 +99,10 @@ class Config:
         If DB_SSL_CA is base64-encoded content, write it to a temp file.
         If it's a file path, return it directly.
         Returns None if no SSL CA is configured.
+        
+        The temp file name is derived from the certificate content, so warm
+        serverless invocations (and other processes on the same host) reuse
+        the file instead of decoding and writing it again.
         """
         if not cls.DB_SSL_CA:
             return None
@@ -53,12 +113,19 @@ class Config:
         
         # Assume it's base64-encoded content, decode and write to temp file
         if cls._ssl_ca_file is None:
+            digest = hashlib.sha256(cls.DB_SSL_CA.encode()).hexdigest()[:16]
+            path = os.path.join(tempfile.gettempdir(), f'aiven_ca_{digest}.pem')
+            if os.path.isfile(path):
+                cls._ssl_ca_file = path
+                return path
             try:
                 cert_content = base64.b64decode(cls.DB_SSL_CA)
-                # Create a persistent temp file (won't be deleted automatically)
-                fd, cls._ssl_ca_file = tempfile.mkstemp(suffix='.pem', prefix='aiven_ca_')
+                # Write to a unique file, then rename, so concurrent invocations never see a partial file
+                fd, tmp_path = tempfile.mkstemp(suffix='.pem', prefix='aiven_ca_')
                 with os.fdopen(fd, 'wb') as f:
                     f.write(cert_content)
+                os.replace(tmp_path, path)
+                cls._ssl_ca_file = path
                 print(f"[OK] SSL CA certificate written to temp file")
             except Exception as e:
                 print(f"[WARN] Failed to decode SSL CA certificate: {e}")
@@ -76,7 +143,11 @@ class Config:
             'password': cls.DB_PASSWORD,
             'database': cls.DB_NAME,
             'pool_size': cls.DB_POOL_SIZE,
+            'pool_min_size': cls.DB_POOL_MIN_SIZE,
+            'pool_idle_timeout': cls.DB_POOL_IDLE_TIMEOUT,
+            'pool_timeout': cls.DB_POOL_TIMEOUT,
             'pool_recycle': cls.DB_POOL_RECYCLE,
+            'pool_ping_interval': cls.DB_POOL_PING_INTERVAL,
         }
         
         # Add SSL configuration if CA certificate is available
@@ -0,0 +1,71 @@
+"""
+History export for LifeLogger.
+
+Turns the rows of Repository.iter_completions() into NDJSON or CSV text
+chunks. Both writers are generators that hold one batch of rows at a
+time, so /api/export and `flask --app app export` stream any amount of
+history in constant memory.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from storage.base import Repository
+
+COLUMNS = Repository.EXPORT_COLUMNS
+BOOLEAN_COLUMNS = ('is_completed', 'task_active')
+
+# Rows per chunk yielded to the response
+CHUNK_ROWS = 500
+
+
+def _normalize(row):
+    """Convert a row tuple into a dict of JSON/CSV friendly values."""
+    record = {}
+    for column, value in zip(COLUMNS, row):
+        if isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        elif column in BOOLEAN_COLUMNS and value is not None:
+            value = bool(value)
+        record[column] = value
+    return record
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(_normalize(row))
+        if len(chunk) >= CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_ndjson(rows):
+    """Yield NDJSON text: one JSON object per completion."""
+    for chunk in _chunks(rows):
+        yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in chunk)
+
+
+def write_csv(rows):
+    """Yield CSV text with a header row."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for chunk in _chunks(rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty history
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# format name -> (mimetype, file extension, writer)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson', write_ndjson),
+    'csv': ('text/csv', 'csv', write_csv),
+}
@@ -0,0 +1,303 @@
+"""
+Bulk import for LifeLogger.
+
+Loads completion history from the NDJSON/CSV files written by /api/export
+or from mysqldump backups (backup/dailylog_db_backup_*.sql). Readers
+stream the input and yield records. import_records() sends them to the
+database in multi-row upserts of BATCH_SIZE rows inside the caller's
+transaction. Completions are keyed on unique_task_day, so re-importing
+a file updates rows instead of duplicating them. Tasks are only created
+when their id does not exist yet. Task positions, the daily rollup and
+task streaks are rebuilt once, after the last batch.
+"""
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import time
+from datetime import date, datetime
+
+FORMATS = ('csv', 'ndjson', 'sql')
+
+# Rows per executemany() call
+BATCH_SIZE = 1000
+
+# Tables read from SQL dumps; anything else in the dump is skipped
+DUMP_TABLES = ('tasks', 'daily_task_completions')
+
+
+def detect_format(filename):
+    """Guess the import format from a file name (None if unknown)."""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson'):
+        return 'ndjson'
+    return extension if extension in FORMATS else None
+
+
+def open_text(binary):
+    """Wrap a seekable binary stream as text, honouring UTF-16/UTF-8 byte order marks.
+
+    mysqldump output redirected by Windows PowerShell is UTF-16.
+    """
+    head = binary.read(4)
+    binary.seek(0)
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = 'utf-16'
+    else:
+        encoding = 'utf-8-sig'
+    return io.TextIOWrapper(binary, encoding=encoding, newline='')
+
+
+# ============== Value Parsing ==============
+
+def _parse_bool(value, default):
+    if value is None or value == '':
+        return default
+    if isinstance(value, (bool, int)):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes'):
+        return True
+    if text in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"invalid boolean {value!r}")
+
+
+def _parse_datetime(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def completion_record(values):
+    """Build a completion record from a dict of column values (export or dump columns)."""
+    try:
+        task_id = int(values['task_id'])
+        completed_date = date.fromisoformat(str(values['completed_date']))
+    except (KeyError, TypeError, ValueError) as err:
+        raise ValueError(f"task_id and completed_date (YYYY-MM-DD) are required: {err}") from err
+    task_name = values.get('task_name') or values.get('current_task_name')
+    if not task_name:
+        raise ValueError("task_name is required")
+    return {
+        'task_id': task_id,
+        'task_name': str(task_name)[:255],
+        'completed_date': completed_date,
+        # Backups from before is_completed existed only hold earned stars
+        'is_completed': _parse_bool(values.get('is_completed'), True),
+        'footnote': values.get('footnote') or None,
+        'earned_at': _parse_datetime(values.get('earned_at')),
+    }
+
+
+def task_record(values):
+    """Build a task record from a dict of tasks columns."""
+    return {
+        'id': int(values['id']),
+        'name': str(values['name'])[:255],
+        'created_at': _parse_datetime(values.get('created_at')),
+        'is_active': _parse_bool(values.get('is_active'), True),
+        'position': int(values['position']) if values.get('position') not in (None, '') else None,
+    }
+
+
+def _export_records(rows):
+    """Yield ('task'|'completion', record) for rows shaped like export.COLUMNS.
+
+    Each task still present at export time (current_task_name set) is
+    yielded once, before its first completion.
+    """
+    seen_tasks = set()
+    for line, values in rows:
+        try:
+            completion = completion_record(values)
+            if values.get('current_task_name') and completion['task_id'] not in seen_tasks:
+                seen_tasks.add(completion['task_id'])
+                yield 'task', {
+                    'id': completion['task_id'],
+                    'name': str(values['current_task_name'])[:255],
+                    'created_at': None,
+                    'is_active': _parse_bool(values.get('task_active'), True),
+                    'position': None,
+                }
+        except ValueError as err:
+            raise ValueError(f"Line {line}: {err}") from err
+        yield 'completion', completion
+
+
+# ============== Readers ==============
+
+def read_ndjson(text):
+    """Yield records from NDJSON written by /api/export."""
+    def rows():
+        for line, raw in enumerate(text, start=1):
+            if not raw.strip():
+                continue
+            try:
+                values = json.loads(raw)
+            except ValueError as err:
+                raise ValueError(f"Line {line}: invalid JSON: {err}") from err
+            if not isinstance(values, dict):
+                raise ValueError(f"Line {line}: expected a JSON object")
+            yield line, values
+    return _export_records(rows())
+
+
+def read_csv(text):
+    """Yield records from CSV with a header row, as written by /api/export."""
+    reader = csv.DictReader(text)
+    return _export_records((reader.line_num, values) for values in reader)
+
+
+_CREATE_TABLE = re.compile(r"CREATE TABLE `(\w+)`")
+_COLUMN = re.compile(r"\s+`(\w+)`")
+_INSERT = re.compile(r"INSERT INTO `(\w+)`\s*(?:\(([^)]*)\))?\s*VALUES\s*", re.I)
+_TOKEN = re.compile(r"""\s*(?:(\()|(\))|(,)|(;)|'((?:[^'\\]|\\.|'')*)'|(NULL)|([-+]?[\d.]+(?:[eE][-+]?\d+)?))""", re.S)
+_ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+_ESCAPE = re.compile(r"\\(.)|''", re.S)
+
+
+def _unescape(literal):
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)) if m.group(1) else "'", literal)
+
+
+def _dump_tuples(statement, position, line):
+    """Parse the (...),(...); value tuples of an extended INSERT starting at position."""
+    row = None
+    while True:
+        match = _TOKEN.match(statement, position)
+        if not match:
+            raise ValueError(f"Line {line}: cannot parse INSERT values near {statement[position:position + 40]!r}")
+        position = match.end()
+        open_paren, close_paren, comma, end, string, null, number = match.groups()
+        if open_paren:
+            row = []
+        elif close_paren:
+            yield row
+            row = None
+        elif end:
+            return
+        elif comma:
+            continue
+        elif row is None:
+            raise ValueError(f"Line {line}: unexpected value outside a row")
+        elif string is not None:
+            row.append(_unescape(string))
+        elif null:
+            row.append(None)
+        else:
+            row.append(float(number) if '.' in number or 'e' in number.lower() else int(number))
+
+
+def read_sql_dump(text):
+    """Yield records from a mysqldump file of the LifeLogger database.
+
+    Column names come from the dump's CREATE TABLE statements (or the
+    INSERT column list), so dumps taken before later schema changes load too.
+    """
+    columns = {}
+    creating = None
+    for line, raw in enumerate(text, start=1):
+        if creating:
+            column = _COLUMN.match(raw)
+            if column:
+                columns[creating].append(column.group(1))
+            else:
+                creating = None
+            continue
+
+        create = _CREATE_TABLE.match(raw)
+        if create:
+            creating = create.group(1)
+            columns[creating] = []
+            continue
+
+        insert = _INSERT.match(raw)
+        if not insert or insert.group(1) not in DUMP_TABLES:
+            continue
+        table = insert.group(1)
+        if insert.group(2):
+            names = [name.strip(' `') for name in insert.group(2).split(',')]
+        elif columns.get(table):
+            names = columns[table]
+        else:
+            raise ValueError(f"Line {line}: INSERT into {table} without a column list or CREATE TABLE")
+
+        kind, build = ('task', task_record) if table == 'tasks' else ('completion', completion_record)
+        for values in _dump_tuples(raw, insert.end(), line):
+            try:
+                yield kind, build(dict(zip(names, values)))
+            except (KeyError, ValueError) as err:
+                raise ValueError(f"Line {line}: {err}") from err
+
+
+READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+    'sql': read_sql_dump,
+}
+
+
+# ============== Loading ==============
+
+def import_records(repo, records, batch_size=BATCH_SIZE):
+    """Load (kind, record) pairs through repo in batches, then rebuild derived data.
+
+    Runs in repo's transaction; the caller commits. Completions with
+    neither a star nor a footnote are skipped, as the app never keeps
+    them. Returns counts and timings.
+    """
+    started = time.perf_counter()
+    now = datetime.now().replace(microsecond=0)
+    result = {'rows': 0, 'tasks_created': 0, 'completions': 0, 'skipped': 0}
+    tasks = []
+    completions = []
+    next_position = None
+
+    def flush():
+        if tasks:
+            result['tasks_created'] += repo.import_tasks(tasks)
+            tasks.clear()
+        if completions:
+            repo.import_completions(completions)
+            result['completions'] += len(completions)
+            completions.clear()
+
+    for kind, record in records:
+        result['rows'] += 1
+        if kind == 'task':
+            if record['position'] is None:
+                # Tasks without a position go after the existing ones, in file order
+                if next_position is None:
+                    next_position = repo.next_task_position()
+                record['position'] = next_position
+                next_position += 1
+            tasks.append((record['id'], record['name'], record['created_at'] or now,
+                          record['is_active'], record['position']))
+        elif not record['is_completed'] and not record['footnote']:
+            result['skipped'] += 1
+            continue
+        else:
+            completions.append((record['task_id'], record['task_name'], record['completed_date'],
+                                record['is_completed'], record['footnote'], record['earned_at'] or now))
+        if len(tasks) + len(completions) >= batch_size:
+            flush()
+    flush()
+    loaded = time.perf_counter()
+
+    if result['tasks_created']:
+        repo.respace_tasks()
+    result['rollup_days'] = repo.rebuild_daily_summary()
+    result['streak_tasks'] = repo.rebuild_streaks()
+    # Too many rows to list: clients syncing from before the import reload everything
+    repo.record_changes(everything=True)
+
+    finished = time.perf_counter()
+    result['load_seconds'] = round(loaded - started, 3)
+    result['seconds'] = round(finished - started, 3)
+    result['rows_per_second'] = round(result['rows'] / (loaded - started)) if loaded > started else result['rows']
+    return result
@@ -2,6 +2,11 @@
 -- Run this script in MySQL Workbench connected to Aiven
 
 -- Drop existing tables if they exist (for clean setup)
+DROP TABLE IF EXISTS change_version;
+DROP TABLE IF EXISTS change_log;
+DROP TABLE IF EXISTS task_streaks;
+DROP TABLE IF EXISTS daily_star_summary;
+DROP TABLE IF EXISTS daily_task_completions_archive;
 DROP TABLE IF EXISTS daily_task_completions;
 DROP TABLE IF EXISTS tasks;
 
@@ -13,13 +18,15 @@ CREATE TABLE tasks (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     is_active BOOLEAN DEFAULT TRUE,
     position INT DEFAULT 0,
-    INDEX idx_is_active (is_active),
+    INDEX idx_active_position (is_active, position, created_at),  -- Task list in display order
     INDEX idx_position (position)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Create daily_task_completions table
 -- Records each time a task is completed (star earned)
 -- This table is NEVER deleted when tasks are removed to preserve star history
+-- Old years move to daily_task_completions_archive (same columns and indexes, created
+-- by the app's schema migrations) with: flask --app app archive run
 CREATE TABLE daily_task_completions (
     id INT AUTO_INCREMENT PRIMARY KEY,
     task_id INT NOT NULL,
@@ -27,11 +34,60 @@ CREATE TABLE daily_task_completions (
     completed_date DATE NOT NULL,
     earned_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     footnote TEXT DEFAULT NULL,
+    is_completed BOOLEAN DEFAULT TRUE,
     UNIQUE KEY unique_task_day (task_id, completed_date),  -- Max 1 star per task per day
     INDEX idx_completed_date (completed_date),
-    INDEX idx_task_id (task_id)
+    INDEX idx_task_id (task_id),
+    -- Covering indexes: per-task star windows (recap, streaks) and per-day stars (heatmap)
+    INDEX idx_task_day_completed (task_id, completed_date, is_completed),
+    INDEX idx_day_completed_task (completed_date, is_completed, task_id, task_name),
+    FULLTEXT INDEX ft_footnote (footnote)  -- Footnote search (/api/search)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Create daily_star_summary table
+-- Rollup of daily_task_completions: one row per day, kept in sync by the app
+-- Rebuild with: flask --app app rollup rebuild
+CREATE TABLE daily_star_summary (
+    summary_date DATE PRIMARY KEY,
+    star_count INT NOT NULL DEFAULT 0,
+    footnote_count INT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Create task_streaks table
+-- Latest and longest run of consecutive starred days per task, kept in sync by the app
+-- Rebuild with: flask --app app streaks rebuild
+CREATE TABLE task_streaks (
+    task_id INT PRIMARY KEY,
+    last_start DATE NOT NULL,
+    last_end DATE NOT NULL,
+    longest_start DATE NOT NULL,
+    longest_end DATE NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Create change_log and change_version tables
+-- Tasks and (task, date) completions touched by each write, under increasing
+-- versions, for delta sync (/api/changes). Prune with: flask --app app changes prune
+CREATE TABLE change_log (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    version BIGINT NOT NULL,
+    task_id INT DEFAULT NULL,          -- NULL with change_date: a bulk change (import)
+    change_date DATE DEFAULT NULL,     -- NULL: the task itself changed
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_version (version),
+    INDEX idx_change_date (change_date, task_id, version, changed_at)  -- Data versions of date ranges
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Single row: the last version taken and the last one pruned
+CREATE TABLE change_version (
+    id INT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    pruned_version BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT INTO change_version (id, version, pruned_version) VALUES (1, 0, 0);
+
 -- Insert some sample tasks (optional - can be removed)
 INSERT INTO tasks (name) VALUES 
     ('Exercise for 30 minutes'),
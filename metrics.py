@@ -0,0 +1,271 @@
+"""
+Request and database metrics for LifeLogger.
+
+Metrics is the storage observer (see storage/instrument.py) and collects,
+per route: request latency and status, time spent waiting for a pool
+connection, SQL statements run, time spent in them and rows fetched.
+Figures accumulate for the current request in a thread-local and are
+folded into the totals when the request ends. Statements slower than
+slow_query_ms are logged with their SQL and the shape of their
+parameters (types, never values).
+
+render() returns the totals in the Prometheus text exposition format.
+Like the stats cache, metrics are per process.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the duration histograms
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the statements-per-request histogram
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Longest SQL text written to the slow-query log
+MAX_LOGGED_SQL = 1000
+
+# Parameters listed one by one in the slow-query log before being summarized
+MAX_LOGGED_PARAMS = 8
+
+# Route label of statements run outside a request (CLI commands, startup)
+NO_ROUTE = ('-', '-')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_labels(labels, le=bound)} {cumulative}'
+        yield f'{name}_sum{_labels(labels)} {self.sum:.6f}'
+        yield f'{name}_count{_labels(labels)} {self.count}'
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.pool_wait = Histogram(DURATION_BUCKETS)
+        self.query_duration = Histogram(DURATION_BUCKETS)
+        self.queries_per_request = Histogram(QUERY_COUNT_BUCKETS)
+        self.fetch_seconds = 0.0
+        self.rows = 0
+        self.slow_queries = 0
+
+
+class RequestStats:
+    """What one request did with the database so far."""
+
+    __slots__ = ('pool_waits', 'query_times', 'fetch_seconds', 'rows', 'slow_queries', 'route')
+
+    def __init__(self, route):
+        self.route = route
+        self.pool_waits = []
+        self.query_times = []
+        self.fetch_seconds = 0.0
+        self.rows = 0
+        self.slow_queries = 0
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def params_shape(params, many=False):
+    """Describe statement parameters by type only, e.g. "(int, str, date) x 20 rows"."""
+    if many:
+        rows = list(params) if not isinstance(params, (list, tuple)) else params
+        if not rows:
+            return 'no rows'
+        return f"{params_shape(rows[0])} x {len(rows)} rows"
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in params.items()) + '}'
+    types = [type(value).__name__ for value in params]
+    if len(types) > MAX_LOGGED_PARAMS:
+        counts = defaultdict(int)
+        for name in types:
+            counts[name] += 1
+        return f"({len(types)} values: " + ', '.join(f'{count} {name}' for name, count in counts.items()) + ')'
+    return '(' + ', '.join(types) + ')'
+
+
+class Metrics:
+    """Per-route request and database metrics; thread-safe."""
+
+    def __init__(self, slow_query_ms=0):
+        # 0 disables the slow-query log
+        self.slow_query_seconds = slow_query_ms / 1000
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._routes = defaultdict(RouteMetrics)
+        self._statuses = defaultdict(int)
+
+    # ============== Request Lifecycle ==============
+
+    def start_request(self, method, route):
+        self._local.request = RequestStats((method, route))
+
+    def finish_request(self, status, seconds):
+        """Fold the current request into the totals of its route."""
+        stats = getattr(self._local, 'request', None)
+        if stats is None:
+            return
+        self._local.request = None
+        method, route = stats.route
+        with self._lock:
+            totals = self._routes[stats.route]
+            totals.duration.observe(seconds)
+            for wait in stats.pool_waits:
+                totals.pool_wait.observe(wait)
+            for query_seconds in stats.query_times:
+                totals.query_duration.observe(query_seconds)
+            totals.queries_per_request.observe(len(stats.query_times))
+            totals.fetch_seconds += stats.fetch_seconds
+            totals.rows += stats.rows
+            totals.slow_queries += stats.slow_queries
+            self._statuses[(method, route, status)] += 1
+
+    # ============== Branches ==============
+
+    # Statements a request runs on other threads (app.read_concurrently)
+    # are collected in a branch and merged back by the request's thread.
+
+    def branch(self):
+        """Return empty stats for work done for the current request on another thread, or None."""
+        stats = self._current()
+        return None if stats is None else RequestStats(stats.route)
+
+    @contextmanager
+    def attached(self, stats):
+        """Report this thread's statements to stats (from branch()) while the block runs."""
+        previous = self._current()
+        self._local.request = stats
+        try:
+            yield
+        finally:
+            self._local.request = previous
+
+    def merge(self, branch):
+        """Add a finished branch to the current request."""
+        stats = self._current()
+        if stats is None or branch is None:
+            return
+        stats.pool_waits += branch.pool_waits
+        stats.query_times += branch.query_times
+        stats.fetch_seconds += branch.fetch_seconds
+        stats.rows += branch.rows
+        stats.slow_queries += branch.slow_queries
+
+    # ============== Storage Observer ==============
+
+    def _current(self):
+        return getattr(self._local, 'request', None)
+
+    def connection_acquired(self, seconds):
+        stats = self._current()
+        if stats is not None:
+            stats.pool_waits.append(seconds)
+        else:
+            with self._lock:
+                self._routes[NO_ROUTE].pool_wait.observe(seconds)
+
+    def query_executed(self, query, params, seconds, many):
+        stats = self._current()
+        slow = self.slow_query_seconds and seconds >= self.slow_query_seconds
+        if stats is not None:
+            stats.query_times.append(seconds)
+            stats.slow_queries += bool(slow)
+        else:
+            with self._lock:
+                totals = self._routes[NO_ROUTE]
+                totals.query_duration.observe(seconds)
+                totals.slow_queries += bool(slow)
+        if slow:
+            method, route = stats.route if stats is not None else NO_ROUTE
+            sql = _WHITESPACE.sub(' ', query).strip()
+            if len(sql) > MAX_LOGGED_SQL:
+                sql = sql[:MAX_LOGGED_SQL] + '...'
+            print(f"[WARN] Slow query ({seconds * 1000:.1f} ms) in {method} {route}: {sql} "
+                  f"-- params {params_shape(params, many)}")
+
+    def rows_fetched(self, count, seconds):
+        stats = self._current()
+        if stats is not None:
+            stats.rows += count
+            stats.fetch_seconds += seconds
+        else:
+            with self._lock:
+                totals = self._routes[NO_ROUTE]
+                totals.rows += count
+                totals.fetch_seconds += seconds
+
+    # ============== Exposition ==============
+
+    def render(self, extra=()):
+        """Return all metrics in Prometheus text format, plus extra (name, type, help, value) samples."""
+        with self._lock:
+            return self._render(sorted(self._routes.items()), sorted(self._statuses.items()), extra)
+
+    def _render(self, routes, statuses, extra):
+        lines = [
+            '# HELP lifelogger_http_requests_total Requests handled, by route and status.',
+            '# TYPE lifelogger_http_requests_total counter',
+        ]
+        for (method, route, status), count in statuses:
+            lines.append(f'lifelogger_http_requests_total'
+                         f'{_labels([("method", method), ("route", route), ("status", status)])} {count}')
+
+        histograms = (
+            ('lifelogger_http_request_duration_seconds', 'duration', 'Request latency, including streamed bodies.'),
+            ('lifelogger_db_pool_wait_seconds', 'pool_wait', 'Time spent checking out a database connection.'),
+            ('lifelogger_db_query_duration_seconds', 'query_duration', 'Time spent executing each SQL statement.'),
+            ('lifelogger_db_queries_per_request', 'queries_per_request', 'SQL statements run by each request.'),
+        )
+        for name, attribute, description in histograms:
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+            for (method, route), totals in routes:
+                histogram = getattr(totals, attribute)
+                if histogram.count:
+                    lines += histogram.lines(name, [('method', method), ('route', route)])
+
+        counters = (
+            ('lifelogger_db_fetch_seconds_total', 'fetch_seconds', 'Time spent fetching result rows.'),
+            ('lifelogger_db_rows_fetched_total', 'rows', 'Result rows fetched.'),
+            ('lifelogger_db_slow_queries_total', 'slow_queries', 'Statements slower than the slow-query threshold.'),
+        )
+        for name, attribute, description in counters:
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+            for (method, route), totals in routes:
+                value = getattr(totals, attribute)
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                lines.append(f'{name}{_labels([("method", method), ("route", route)])} {value}')
+
+        for name, kind, description, value in extra:
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
@@ -8,6 +8,7 @@ const state = {
     tasks: [],
     dailyStats: [],
     weeklyStats: null,
+    averageStats: null,
     taskToDelete: null,
     taskToEdit: null,
     taskToFootnote: null,
@@ -58,19 +59,49 @@ const elements = {
 };
 
 // ============== API Functions ==============
+
+// Last body and ETag of each GET URL. The ETag is sent back as If-None-Match,
+// so data that has not changed costs an empty 304 instead of a full payload.
+const MAX_CACHED_RESPONSES = 100;
+const responseCache = new Map();
+
+async function fetchJSON(url, errorMessage) {
+    const cached = responseCache.get(url);
+    const response = await fetch(url, {
+        headers: cached ? { 'If-None-Match': cached.etag } : {},
+        cache: 'no-store',
+    });
+    if (response.status === 304 && cached) {
+        return JSON.parse(cached.body);
+    }
+    if (!response.ok) throw new Error(errorMessage);
+
+    const body = await response.text();
+    const etag = response.headers.get('ETag');
+    responseCache.delete(url);
+    if (etag) {
+        responseCache.set(url, { etag, body });
+        if (responseCache.size > MAX_CACHED_RESPONSES) {
+            responseCache.delete(responseCache.keys().next().value);
+        }
+    }
+    return JSON.parse(body);
+}
+
+// Writes ask for the refreshed aggregates (see applyStats) instead of refetching them
+const INCLUDE_STATS = 'include=stats';
+
 const api = {
     async fetchTasks(date) {
         let url = '/api/tasks';
         if (date) {
             url += `?date=${date}`;
         }
-        const response = await fetch(url);
-        if (!response.ok) throw new Error('Failed to fetch tasks');
-        return response.json();
+        return fetchJSON(url, 'Failed to fetch tasks');
     },
 
-    async addTask(name) {
-        const response = await fetch('/api/tasks', {
+    async addTask(name, date) {
+        const response = await fetch(`/api/tasks?${INCLUDE_STATS}&date=${date}`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ name }),
@@ -82,8 +113,8 @@ const api = {
         return response.json();
     },
 
-    async deleteTask(taskId) {
-        const response = await fetch(`/api/tasks/${taskId}`, {
+    async deleteTask(taskId, date) {
+        const response = await fetch(`/api/tasks/${taskId}?${INCLUDE_STATS}&date=${date}`, {
             method: 'DELETE',
         });
         if (!response.ok) throw new Error('Failed to delete task');
@@ -104,7 +135,7 @@ const api = {
     },
 
     async completeTask(taskId, date) {
-        const response = await fetch(`/api/tasks/${taskId}/complete`, {
+        const response = await fetch(`/api/tasks/${taskId}/complete?${INCLUDE_STATS}`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ date }),
@@ -114,7 +145,7 @@ const api = {
     },
 
     async saveFootnote(taskId, date, footnote) {
-        const response = await fetch(`/api/tasks/${taskId}/footnote`, {
+        const response = await fetch(`/api/tasks/${taskId}/footnote?${INCLUDE_STATS}`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ date, footnote }),
@@ -124,9 +155,9 @@ const api = {
     },
 
     async uncompleteTask(taskId, date) {
-        let url = `/api/tasks/${taskId}/complete`;
+        let url = `/api/tasks/${taskId}/complete?${INCLUDE_STATS}`;
         if (date) {
-            url += `?date=${date}`;
+            url += `&date=${date}`;
         }
         const response = await fetch(url, {
             method: 'DELETE',
@@ -136,8 +167,18 @@ const api = {
     },
 
     async fetchDailyStats(days = 30) {
-        const response = await fetch(`/api/stats/daily?days=${days}`);
-        if (!response.ok) throw new Error('Failed to fetch daily stats');
+        return fetchJSON(`/api/stats/daily?days=${days}`, 'Failed to fetch daily stats');
+    },
+
+    async fetchDailyRange(start, end) {
+        return fetchJSON(`/api/stats/daily?start=${start}&end=${end}&granularity=day`, 'Failed to fetch daily stats');
+    },
+
+    // What changed since a change log version; without one the answer only carries the current version
+    async fetchChanges(since) {
+        const query = since === null ? '' : `?since=${since}`;
+        const response = await fetch(`/api/changes${query}`, { cache: 'no-store' });
+        if (!response.ok) throw new Error('Failed to sync changes');
         return response.json();
     },
 
@@ -146,15 +187,11 @@ const api = {
         if (date) {
             url += `?date=${date}`;
         }
-        const response = await fetch(url);
-        if (!response.ok) throw new Error('Failed to fetch weekly stats');
-        return response.json();
+        return fetchJSON(url, 'Failed to fetch weekly stats');
     },
 
     async fetchTodayStats() {
-        const response = await fetch('/api/stats/today');
-        if (!response.ok) throw new Error('Failed to fetch today stats');
-        return response.json();
+        return fetchJSON('/api/stats/today', 'Failed to fetch today stats');
     },
 
     async reorderTasks(taskIds) {
@@ -167,17 +204,222 @@ const api = {
         return response.json();
     },
 
+    async fetchDashboard(date, days = 30) {
+        let url = `/api/dashboard?days=${days}`;
+        if (date) {
+            url += `&date=${date}`;
+        }
+        return fetchJSON(url, 'Failed to fetch dashboard');
+    },
+
+    async moveTask(taskId, afterId, beforeId) {
+        const response = await fetch(`/api/tasks/${taskId}/move`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ after_id: afterId, before_id: beforeId }),
+        });
+        if (!response.ok) throw new Error('Failed to move task');
+        return response.json();
+    },
+
     async fetchAverageStats(date, days = 7) {
         let url = `/api/stats/average?days=${days}`;
         if (date) {
             url += `&date=${date}`;
         }
-        const response = await fetch(url);
-        if (!response.ok) throw new Error('Failed to fetch average stats');
-        return response.json();
+        return fetchJSON(url, 'Failed to fetch average stats');
     },
 };
 
+// ============== Local Cache & Sync ==============
+
+// Dashboards already shown are kept in IndexedDB, keyed by date and chart range,
+// with the change log version they are up to date with. Showing one again, after
+// navigating, reloading the page or at midnight, only asks /api/changes what
+// changed since (usually nothing) and patches the cached copy.
+const MAX_CACHED_DASHBOARDS = 30;
+const CACHE_DB_NAME = 'lifelogger';
+const CACHE_STORE = 'cache';
+
+const localCache = {
+    version: null,          // Change log version of the cached dashboards (null: not synced yet)
+    dashboards: new Map(),  // `${date}|${days}` -> { fetchedOn, dashboard }, least recently shown first
+};
+
+// Resolves to null where IndexedDB is unavailable (e.g. private browsing): the cache then lives in memory
+const cacheDb = new Promise((resolve) => {
+    if (!window.indexedDB) {
+        resolve(null);
+        return;
+    }
+    const request = indexedDB.open(CACHE_DB_NAME, 1);
+    request.onupgradeneeded = () => request.result.createObjectStore(CACHE_STORE);
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => resolve(null);
+});
+
+async function loadLocalCache() {
+    const db = await cacheDb;
+    if (!db) return;
+    const saved = await new Promise((resolve) => {
+        const request = db.transaction(CACHE_STORE).objectStore(CACHE_STORE).get('state');
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => resolve(null);
+    });
+    if (saved) {
+        localCache.version = saved.version;
+        localCache.dashboards = new Map(saved.dashboards);
+    }
+}
+
+async function saveLocalCache() {
+    const db = await cacheDb;
+    if (!db) return;
+    try {
+        db.transaction(CACHE_STORE, 'readwrite').objectStore(CACHE_STORE).put({
+            version: localCache.version,
+            dashboards: [...localCache.dashboards],
+        }, 'state');
+    } catch (error) {
+        console.error('Error saving local cache:', error);
+    }
+}
+
+function dashboardKey(date, days) {
+    return `${date}|${days}`;
+}
+
+function localToday() {
+    return new Date().toLocaleDateString('en-CA');
+}
+
+// Shift a YYYY-MM-DD date by a number of days
+function addDays(isoDate, days) {
+    const day = new Date(`${isoDate}T00:00:00Z`);
+    day.setUTCDate(day.getUTCDate() + days);
+    return day.toISOString().slice(0, 10);
+}
+
+function cacheDashboard(key, entry) {
+    localCache.dashboards.delete(key);
+    localCache.dashboards.set(key, entry);
+    while (localCache.dashboards.size > MAX_CACHED_DASHBOARDS) {
+        localCache.dashboards.delete(localCache.dashboards.keys().next().value);
+    }
+}
+
+// Patch the cached dashboards with a /api/changes response. Returns the keys of the
+// dashboards it changed; those it cannot patch are dropped, to be refetched when shown.
+function applyChanges(changes) {
+    const patched = new Set();
+    if (changes.reset || changes.tasks.length) {
+        // Task names and order appear in every dashboard's task list and weekly recap
+        localCache.dashboards.clear();
+        return patched;
+    }
+
+    const completions = new Map(changes.completions.map(c => [`${c.task_id}|${c.date}`, c]));
+    for (const [key, { dashboard }] of localCache.dashboards) {
+        let changed = false;
+        let stale = false;
+
+        // The task list shows the completions of the dashboard's own date
+        dashboard.tasks.forEach(task => {
+            const change = completions.get(`${task.id}|${dashboard.date}`);
+            if (change && (task.completed_today !== change.is_completed || (task.footnote || '') !== (change.footnote || ''))) {
+                task.completed_today = change.is_completed;
+                task.footnote = change.footnote;
+                changed = true;
+            }
+        });
+
+        changes.days.forEach(day => {
+            // The average and weekly recap cover the days before the dashboard's date
+            if ((dashboard.average.start_date <= day.date && day.date <= dashboard.average.end_date) ||
+                (dashboard.weekly.week_start <= day.date && day.date <= dashboard.weekly.week_end)) {
+                stale = true;
+            }
+            // Daily points take the new count; a week, month or year point would need the old one
+            const point = dashboard.daily.find(p => p.date <= day.date && day.date <= (p.end_date || p.date));
+            if (point && point.end_date) {
+                stale = true;
+            } else if (point && point.star_count !== day.star_count) {
+                point.star_count = day.star_count;
+                changed = true;
+            }
+            if (dashboard.today.date === day.date) {
+                dashboard.today.completed_tasks = day.star_count;
+                dashboard.today.stars_today = day.star_count;
+            }
+        });
+
+        if (stale) {
+            localCache.dashboards.delete(key);
+        } else if (changed) {
+            patched.add(key);
+        }
+    }
+    return patched;
+}
+
+let pendingSync = null;
+
+// Bring the cached dashboards up to date with the change log; concurrent callers
+// share one request. Resolves to the keys of the dashboards it patched.
+function syncChanges() {
+    if (!pendingSync) {
+        pendingSync = api.fetchChanges(localCache.version)
+            .then((changes) => {
+                const patched = applyChanges(changes);
+                if (changes.version !== localCache.version) {
+                    localCache.version = changes.version;
+                    saveLocalCache();
+                }
+                return patched;
+            })
+            .finally(() => {
+                pendingSync = null;
+            });
+    }
+    return pendingSync;
+}
+
+// Move a cached dashboard's chart on to today by fetching only the points of the
+// days since it was cached. Returns false when it must be refetched instead.
+async function rollDashboard(entry, days, today) {
+    const points = entry.dashboard.daily;
+    // The whole history starts at the first star, and coarser points cannot be shifted
+    if (days === 'all' || !points.length || points.some(p => p.end_date)) return false;
+
+    const start = addDays(points[points.length - 1].date, 1);
+    const newDays = Math.round((Date.parse(today) - Date.parse(start)) / 86400000) + 1;
+    if (newDays >= points.length) return false;
+    if (newDays > 0) {
+        const added = await api.fetchDailyRange(start, today);
+        const last = added[added.length - 1];
+        entry.dashboard.daily = points.slice(added.length).concat(added);
+        entry.dashboard.today = { ...entry.dashboard.today, date: last.date, completed_tasks: last.star_count, stars_today: last.star_count };
+    }
+    entry.fetchedOn = today;
+    return true;
+}
+
+// Show changes made on other devices when the page comes back into view
+async function refreshFromChanges() {
+    const key = dashboardKey(state.viewDate, elements.daysSelect.value);
+    try {
+        const patched = await syncChanges();
+        const entry = localCache.dashboards.get(key);
+        if (!entry || entry.fetchedOn !== localToday()) {
+            loadDashboard();
+        } else if (patched.has(key)) {
+            showDashboard(entry.dashboard);
+        }
+    } catch (error) {
+        console.error('Error syncing changes:', error);
+    }
+}
+
 // ============== UI Rendering Functions ==============
 
 function formatDate(date) {
@@ -226,16 +468,23 @@ function changeDate(offset) {
     state.viewDate = newDateStr;
     elements.datePicker.value = newDateStr; // Sync picker
 
-    loadTasks();
+    // Tasks, stats and charts all come from one dashboard request
+    loadDashboard();
     updateCurrentDateDisplay();
-    // Charts will update via loadTasks -> updateStatsDisplay -> loadDailyStats/loadWeeklyStats calls if integrated
-    // Actually loadTasks calls updateStatsDisplay.
-    // We should also trigger chart reload
-    loadDailyStats();
-    loadWeeklyStats();
 }
 
 async function updateStatsDisplay() {
+    // Fetch the 7-day average, then render
+    try {
+        state.averageStats = await api.fetchAverageStats(state.viewDate);
+    } catch (error) {
+        console.error('Failed to update average stats:', error);
+        state.averageStats = null;
+    }
+    renderStatsDisplay();
+}
+
+function renderStatsDisplay() {
     let completedCount = 0;
     state.tasks.forEach(t => {
         if (t.name === 'No BIG MISTAKE or LESSION') {
@@ -255,15 +504,9 @@ async function updateStatsDisplay() {
 
     // elements.starsToday.textContent = completedCount; // Old logic
 
-    // Fetch and display 7-day average
-    try {
-        const avgStats = await api.fetchAverageStats(state.viewDate);
-        elements.starsToday.textContent = avgStats.average;
-    } catch (error) {
-        console.error('Failed to update average stats:', error);
-        elements.starsToday.textContent = '-';
-    }
-    
+    // Display 7-day average
+    elements.starsToday.textContent = state.averageStats ? state.averageStats.average : '-';
+
     elements.tasksCompleted.textContent = completedCount;
     elements.tasksTotal.textContent = totalCount;
 
@@ -272,6 +515,28 @@ async function updateStatsDisplay() {
     elements.taskProgress.style.width = `${progressPercent}%`;
 }
 
+// Patch the stats, charts and counters from the aggregates returned by a write.
+// Returns false when they are missing or for another date, so the caller can refetch.
+function applyStats(stats) {
+    if (!stats || stats.date !== state.viewDate) return false;
+
+    state.averageStats = stats.average;
+    state.weeklyStats = stats.weekly;
+
+    // Daily points cover one day, or a week/month/year when they carry end_date
+    if (stats.day && stats.day.change) {
+        const point = state.dailyStats.find(p => p.date <= stats.day.date && stats.day.date <= (p.end_date || p.date));
+        if (point) {
+            point.star_count = point.end_date ? point.star_count + stats.day.change : stats.day.star_count;
+            renderDailyChart(state.dailyStats);
+        }
+    }
+
+    renderStatsDisplay();
+    renderWeeklyChart(state.weeklyStats);
+    return true;
+}
+
 function escapeHtml(text) {
     if (text === null || text === undefined) return '';
     return String(text)
@@ -402,8 +667,11 @@ function renderDailyChart(stats) {
                     displayColors: false,
                     callbacks: {
                         title: function (context) {
-                            const index = context[0].dataIndex;
-                            return stats[index].date;
+                            const point = stats[context[0].dataIndex];
+                            // Week, month and year buckets span several days
+                            return point.end_date && point.end_date !== point.date
+                                ? `${point.date} – ${point.end_date}`
+                                : point.date;
                         },
                         label: function (context) {
                             return `${context.raw} star${context.raw !== 1 ? 's' : ''}`;
@@ -646,7 +914,7 @@ async function saveTaskFootnote() {
     // Allow empty to clear it
 
     try {
-        await api.saveFootnote(state.taskToFootnote, state.viewDate, footnote);
+        const result = await api.saveFootnote(state.taskToFootnote, state.viewDate, footnote);
 
         // Update local state
         const taskIndex = state.tasks.findIndex(t => t.id === state.taskToFootnote);
@@ -656,7 +924,7 @@ async function saveTaskFootnote() {
 
         hideFootnoteModal();
         renderTasks();
-        updateStatsDisplay();
+        if (!applyStats(result.stats)) updateStatsDisplay();
         showToast('Footnote saved successfully');
     } catch (error) {
         console.error('Error saving footnote:', error);
@@ -685,11 +953,12 @@ async function addTask() {
     }
 
     try {
-        const newTask = await api.addTask(name);
-        state.tasks.push(newTask);
+        const newTask = await api.addTask(name, state.viewDate);
+        const { stats, ...task } = newTask;
+        state.tasks.push(task);
         elements.newTaskInput.value = '';
         renderTasks();
-        updateStatsDisplay();
+        if (!applyStats(stats)) updateStatsDisplay();
         showToast('Task added successfully!');
     } catch (error) {
         console.error('Error adding task:', error);
@@ -702,21 +971,21 @@ async function toggleTask(taskId) {
     if (!task) return;
 
     try {
+        let result;
         if (task.completed_today) {
-            await api.uncompleteTask(taskId, state.viewDate);
+            result = await api.uncompleteTask(taskId, state.viewDate);
             task.completed_today = false;
             showToast('Star removed');
         } else {
-            await api.completeTask(taskId, state.viewDate);
+            result = await api.completeTask(taskId, state.viewDate);
             task.completed_today = true;
             showToast('⭐ Star earned!');
         }
         renderTasks();
-        updateStatsDisplay();
+        renderStatsDisplay();
 
-        // Refresh charts
-        loadDailyStats();
-        loadWeeklyStats();
+        // Patch stats and charts from the response; refetch only if it has none
+        if (!applyStats(result.stats)) loadDashboard();
     } catch (error) {
         console.error('Error toggling task:', error);
         showToast('Failed to update task', 'error');
@@ -731,11 +1000,11 @@ async function deleteTask() {
     if (!state.taskToDelete) return;
 
     try {
-        await api.deleteTask(state.taskToDelete);
+        const result = await api.deleteTask(state.taskToDelete, state.viewDate);
         state.tasks = state.tasks.filter(t => t.id !== state.taskToDelete);
         hideDeleteModal();
         renderTasks();
-        updateStatsDisplay();
+        if (!applyStats(result.stats)) updateStatsDisplay();
         showToast('Task deleted (stars preserved)');
     } catch (error) {
         console.error('Error deleting task:', error);
@@ -745,9 +1014,53 @@ async function deleteTask() {
 
 // ============== Stats Loading ==============
 
+// Show a dashboard payload; its task list and chart points stay shared with the local cache
+function showDashboard(dashboard) {
+    state.tasks = dashboard.tasks;
+    state.averageStats = dashboard.average;
+    state.dailyStats = dashboard.daily;
+    state.weeklyStats = dashboard.weekly;
+
+    renderTasks();
+    renderStatsDisplay();
+    renderDailyChart(state.dailyStats);
+    renderWeeklyChart(state.weeklyStats);
+}
+
+async function loadDashboard() {
+    // A number of days or 'all'; long ranges come back bucketed by week or month
+    const days = elements.daysSelect.value;
+    const date = state.viewDate;
+    const key = dashboardKey(date, days);
+    const today = localToday();
+    try {
+        // Cached dashboards are only trusted once the changes since they were cached are applied
+        const synced = await syncChanges().then(() => true, (error) => {
+            console.error('Error syncing changes:', error);
+            return false;
+        });
+        let entry = synced ? localCache.dashboards.get(key) : null;
+        if (entry && entry.fetchedOn !== today && !(await rollDashboard(entry, days, today))) {
+            entry = null;
+        }
+        if (!entry) {
+            entry = { fetchedOn: today, dashboard: await api.fetchDashboard(date, days) };
+        }
+        cacheDashboard(key, entry);
+        saveLocalCache();
+
+        // Ignore responses for a date or range the user has already navigated away from
+        if (date !== state.viewDate || days !== elements.daysSelect.value) return;
+        showDashboard(entry.dashboard);
+    } catch (error) {
+        console.error('Error loading dashboard:', error);
+        showToast('Failed to load tasks', 'error');
+    }
+}
+
 async function loadDailyStats() {
     try {
-        const days = parseInt(elements.daysSelect.value);
+        const days = elements.daysSelect.value;
         state.dailyStats = await api.fetchDailyStats(days);
         renderDailyChart(state.dailyStats);
     } catch (error) {
@@ -773,8 +1086,13 @@ function setupEventListeners() {
         if (e.key === 'Enter') addTask();
     });
 
-    // Days selector
-    elements.daysSelect.addEventListener('change', loadDailyStats);
+    // Days selector (each range is cached as its own dashboard)
+    elements.daysSelect.addEventListener('change', loadDashboard);
+
+    // Changes made on other devices show up when the page comes back into view
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'visible') refreshFromChanges();
+    });
 
     // Delete modal
     elements.cancelDelete.addEventListener('click', hideDeleteModal);
@@ -816,7 +1134,7 @@ function setupEventListeners() {
     elements.datePicker.addEventListener('change', (e) => {
         if (e.target.value) {
             state.viewDate = e.target.value;
-            loadTasks();
+            loadDashboard();
             updateCurrentDateDisplay();
         }
     });
@@ -871,19 +1189,21 @@ function initSortable() {
         delay: 200, // Ms delay to prevent accidental drags on touch
         delayOnTouchOnly: true,
         onEnd: async function (evt) {
-            // Get new order
-            const taskItems = Array.from(elements.taskList.children);
-            const taskIds = taskItems
-                .map(item => item.getAttribute('data-task-id'))
-                .filter(id => id); // Filter out empty states or non-task elements
+            if (evt.oldIndex === evt.newIndex) return;
 
-            // Allow empty state to be ignored
-            if (taskIds.length === 0) return;
+            // Send only the moved task and its new neighbours
+            const taskId = evt.item.getAttribute('data-task-id');
+            if (!taskId) return; // Ignore empty states or non-task elements
+            const prev = evt.item.previousElementSibling;
+            const next = evt.item.nextElementSibling;
+            const afterId = prev ? prev.getAttribute('data-task-id') : null;
+            const beforeId = next ? next.getAttribute('data-task-id') : null;
+            if (!afterId && !beforeId) return;
 
             // Optimistic update (UI is already updated by Sortable)
 
             try {
-                await api.reorderTasks(taskIds);
+                await api.moveTask(taskId, afterId, afterId ? null : beforeId);
                 // No need for toast here as it's a frequent action
             } catch (error) {
                 console.error('Error reordering tasks:', error);
@@ -906,10 +1226,9 @@ async function init() {
     updateCurrentDateDisplay();
     setupEventListeners();
 
-    // Load initial data
-    await loadTasks();
-    await loadDailyStats();
-    await loadWeeklyStats();
+    // Load initial data, from the local cache when the change log says it is current
+    await loadLocalCache();
+    await loadDashboard();
 
     // Initialize Sortable
     initSortable();
@@ -922,9 +1241,7 @@ async function init() {
             const today = new Date().toLocaleDateString('en-CA');
             if (state.viewDate === today) {
                 updateCurrentDateDisplay();
-                loadTasks();
-                loadDailyStats();
-                loadWeeklyStats();
+                loadDashboard();
             }
         }
     }, 60000); // Check every minute
@@ -0,0 +1,22 @@
+"""
+Storage layer for LifeLogger.
+
+create_storage() builds the engine selected by Config.DB_ENGINE:
+'mysql' (a pooled MySQL server, the default) or 'sqlite' (an embedded
+database file). Engine modules are imported on demand, so the SQLite
+engine runs without mysql-connector installed.
+"""
+from storage.base import Repository, Storage, StorageError
+
+ENGINES = ('mysql', 'sqlite')
+
+
+def create_storage(config):
+    """Return the Storage engine configured by config (the Config class)."""
+    if config.DB_ENGINE == 'sqlite':
+        from storage.sqlite import SQLiteStorage
+        return SQLiteStorage(config.SQLITE_PATH)
+    if config.DB_ENGINE == 'mysql':
+        from storage.mysql import MySQLStorage
+        return MySQLStorage(config.get_db_config())
+    raise StorageError(f"Unknown DB_ENGINE '{config.DB_ENGINE}' (expected one of: {', '.join(ENGINES)})")
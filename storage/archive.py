@@ -0,0 +1,153 @@
+"""
+Archival of old completion history for LifeLogger.
+
+daily_task_completions keeps the recent years and
+daily_task_completions_archive the older ones, with the same columns, ids
+and indexes. `flask --app app archive run` moves whole calendar years
+into the archive, so the hot table and its indexes stay the size of the
+years people actually look at, however long the history grows.
+
+Reads that can reach old dates go through completions_from(), a UNION
+ALL of both tables with the date range pushed into each branch. Reads
+that start within HOT_DAYS of today use the hot table alone. Writes to
+an archived date first move that date's rows back (restore_dates()), so
+each (task, day) lives in exactly one table and the rollup of a written
+date only needs the hot table.
+"""
+from datetime import date, timedelta
+
+HOT_TABLE = 'daily_task_completions'
+ARCHIVE_TABLE = 'daily_task_completions_archive'
+TABLES = (HOT_TABLE, ARCHIVE_TABLE)
+
+COLUMNS = "id, task_id, task_name, completed_date, earned_at, footnote, is_completed"
+
+# cutoff() never archives the last 365 days; reads starting within HOT_DAYS
+# of today skip the archive (the margin covers clock and time zone skew)
+HOT_DAYS = 400
+
+
+def hot_since(today=None):
+    """Return the ISO date from which reads can ignore the archive."""
+    return ((today or date.today()) - timedelta(days=HOT_DAYS)).isoformat()
+
+
+def cutoff(keep_years, today=None):
+    """Return the first date kept hot: January 1st of keep_years years before this one.
+
+    With keep_years >= 1 the current and previous year always stay hot.
+    """
+    if keep_years < 1:
+        raise ValueError("keep_years must be at least 1")
+    today = today or date.today()
+    return date(today.year - keep_years, 1, 1)
+
+
+def _iso(day):
+    return day if day is None or isinstance(day, str) else day.isoformat()
+
+
+def completions_from(start=None, end=None, task_id=None, tables=TABLES):
+    """Return (sql, params) for a FROM item with the rows of daily_task_completions.
+
+    start and end (ISO dates or dates) and task_id limit the rows; callers
+    still filter on them in their own WHERE/ON clauses. When start is
+    recent enough (or tables is only the hot table) the hot table is
+    returned as is; otherwise it is a UNION ALL subquery over both tables
+    with the limits applied in each branch.
+    """
+    start, end = _iso(start), _iso(end)
+    if tables == (HOT_TABLE,) or (start is not None and start >= hot_since()):
+        return HOT_TABLE, []
+
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append("completed_date >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("completed_date <= %s")
+        params.append(end)
+    if task_id is not None:
+        conditions.append("task_id = %s")
+        params.append(task_id)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    branches = " UNION ALL ".join(f"SELECT {COLUMNS} FROM {table}{where}" for table in tables)
+    return f"({branches})", params * len(tables)
+
+
+def tables_for(start=None):
+    """Return the tables that can hold rows dated start (ISO) or later."""
+    start = _iso(start)
+    return (HOT_TABLE,) if start is not None and start >= hot_since() else TABLES
+
+
+# ============== Moving Rows ==============
+
+def _move(cursor, source, target, condition, params):
+    cursor.execute(
+        f"INSERT INTO {target} ({COLUMNS}) SELECT {COLUMNS} FROM {source} WHERE {condition}", params
+    )
+    moved = cursor.rowcount
+    cursor.execute(f"DELETE FROM {source} WHERE {condition}", params)
+    return moved
+
+
+def archive_year(cursor, year):
+    """Move the completions dated in year to the archive. Returns the number of rows moved.
+
+    Must not be called for a year at or after cutoff(); the caller commits.
+    """
+    return _move(cursor, HOT_TABLE, ARCHIVE_TABLE, "completed_date BETWEEN %s AND %s",
+                 (date(year, 1, 1).isoformat(), date(year, 12, 31).isoformat()))
+
+
+def restore_dates(cursor, dates):
+    """Move the archived completions of the given dates (ISO or date) back to daily_task_completions.
+
+    Runs in the caller's transaction, before writing to those dates. Dates
+    within HOT_DAYS of today are never archived and are skipped without a
+    query. Returns the number of rows restored.
+    """
+    since = hot_since()
+    dates = sorted({_iso(day) for day in dates if _iso(day) < since})
+    if not dates:
+        return 0
+    placeholders = ", ".join(["%s"] * len(dates))
+    return _move(cursor, ARCHIVE_TABLE, HOT_TABLE, f"completed_date IN ({placeholders})", dates)
+
+
+# ============== Status ==============
+
+def _date_bound(cursor, table, order):
+    # ORDER BY/LIMIT rather than MIN()/MAX(): SQLite only converts plain DATE columns
+    cursor.execute(f"SELECT completed_date FROM {table} ORDER BY completed_date {order} LIMIT 1")
+    row = cursor.fetchone()
+    return row['completed_date'] if row else None
+
+
+def first_hot_date(cursor):
+    """Return the oldest completed_date in daily_task_completions, or None."""
+    return _date_bound(cursor, HOT_TABLE, 'ASC')
+
+
+def year_counts(cursor):
+    """Return [(year, hot_rows, archived_rows)] for every year with completions, oldest first.
+
+    Expects a dictionary cursor.
+    """
+    bounds = [_date_bound(cursor, table, order) for table in TABLES for order in ('ASC', 'DESC')]
+    bounds = [day for day in bounds if day]
+    if not bounds:
+        return []
+    counts = []
+    for year in range(min(bounds).year, max(bounds).year + 1):
+        row = [year]
+        for table in TABLES:
+            cursor.execute(
+                f"SELECT COUNT(*) AS total FROM {table} WHERE completed_date BETWEEN %s AND %s",
+                (date(year, 1, 1).isoformat(), date(year, 12, 31).isoformat())
+            )
+            row.append(cursor.fetchone()['total'])
+        counts.append(tuple(row))
+    return counts
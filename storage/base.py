@@ -0,0 +1,740 @@
+"""
+Storage interface for LifeLogger.
+
+A Storage engine hands out sessions; each session is a Repository bound to
+one connection and transaction. Repository holds the SQL for tasks,
+completions and stats, written once with %s placeholders. Engines
+override only the statements their dialect spells differently.
+"""
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from storage import archive, changes, migrations, rollup, streaks, task_order
+from storage.instrument import InstrumentedConnection
+
+
+class StorageError(Exception):
+    """A database operation failed (wraps the engine driver's error)."""
+
+
+class Repository:
+    """Data access for one session. Call commit() to keep writes."""
+
+    # INSERT ... upsert statements for daily_task_completions keyed by
+    # (sets_completed, sets_footnote). New rows start uncompleted with no
+    # footnote; existing rows only change the given columns.
+    COMPLETION_UPSERTS = {}
+
+    # SQL expression for the first day of the week (Monday), month or year
+    # containing summary_date, keyed by granularity
+    BUCKET_STARTS = {'day': "summary_date"}
+
+    # Full-text search over footnotes (see search_footnotes()): the FROM
+    # clause joining the index to a completions {table} aliased dtc, the
+    # condition matching a search expression and its relevance score (higher
+    # is better). Each %s in SEARCH_MATCH and SEARCH_SCORE takes the
+    # expression; {index} is SEARCH_INDEXES[table].
+    SEARCH_FROM = None
+    SEARCH_MATCH = None
+    SEARCH_SCORE = None
+    SEARCH_INDEXES = {}
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor(dictionary=True)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.cursor.close()
+
+    def _key_condition(self, count):
+        """SQL condition matching count (task_id, completed_date) pairs, taking 2 * count parameters."""
+        return f"(task_id, completed_date) IN ({', '.join(['(%s, %s)'] * count)})"
+
+    # ============== Tasks ==============
+
+    def tasks_for_date(self, target_date):
+        """Return all active tasks with their completion status and footnote for target_date."""
+        source, params = archive.completions_from(target_date, target_date)
+        query = f"""
+            SELECT
+                t.id,
+                t.name,
+                t.created_at,
+                CASE WHEN dtc.id IS NOT NULL AND dtc.is_completed = TRUE THEN TRUE ELSE FALSE END as completed_today,
+                dtc.footnote
+            FROM tasks t
+            LEFT JOIN {source} dtc
+                ON t.id = dtc.task_id AND dtc.completed_date = %s
+            WHERE t.is_active = TRUE
+            ORDER BY t.position ASC, t.created_at ASC
+        """
+        self.cursor.execute(query, params + [target_date])
+        tasks = self.cursor.fetchall()
+
+        # Convert datetime objects to strings for JSON serialization
+        for task in tasks:
+            if task['created_at']:
+                task['created_at'] = task['created_at'].isoformat()
+            task['completed_today'] = bool(task['completed_today'])
+
+        return tasks
+
+    def count_active_tasks(self):
+        self.cursor.execute("SELECT COUNT(*) as total FROM tasks WHERE is_active = TRUE")
+        return self.cursor.fetchone()['total']
+
+    def task_exists(self, task_id):
+        """Return True if task_id is an active task."""
+        self.cursor.execute("SELECT id FROM tasks WHERE id = %s AND is_active = TRUE", (task_id,))
+        return self.cursor.fetchone() is not None
+
+    def add_task(self, name):
+        """Insert a task at the end of the list and return its id."""
+        self.cursor.execute(
+            "INSERT INTO tasks (name, position) VALUES (%s, %s)",
+            (name, task_order.next_position(self.cursor))
+        )
+        return self.cursor.lastrowid
+
+    def rename_task(self, task_id, name):
+        """Rename an active task. Returns False if it does not exist."""
+        if not self.task_exists(task_id):
+            return False
+        self.cursor.execute("UPDATE tasks SET name = %s WHERE id = %s", (name, task_id))
+        return True
+
+    def deactivate_task(self, task_id):
+        """Soft-delete an active task. Returns False if it does not exist."""
+        if not self.task_exists(task_id):
+            return False
+        self.cursor.execute("UPDATE tasks SET is_active = FALSE WHERE id = %s", (task_id,))
+        return True
+
+    def set_task_order(self, task_ids):
+        task_order.set_positions(self.cursor, task_ids)
+
+    def move_task(self, task_id, after_id=None, before_id=None):
+        """Move task_id next to a neighbour (see task_order.move_task). Returns the ids of the tasks rewritten."""
+        updated = task_order.move_task(self.cursor, task_id, after_id=after_id, before_id=before_id)
+        if updated > 1:
+            # The list was renumbered
+            return [tid for tid, _ in task_order.fetch_ordered_tasks(self.cursor)]
+        return [task_id] if updated else []
+
+    # ============== Completions ==============
+
+    def apply_completion_ops(self, ops):
+        """Apply completion/footnote operations in this session's transaction.
+
+        Each op is a dict with task_id, date (ISO string), completed (True,
+        False or None to leave unchanged) and footnote (string, or None to
+        leave unchanged). Ops for the same task and date are merged in order.
+
+        Setting completed/footnote is one multi-row upsert against
+        unique_task_day per statement shape. Clearing a star with no footnote
+        change is a single UPDATE. Rows left with neither a star nor a
+        footnote are deleted. An upsert leaves unchanged rows out of its
+        rowcount (see COMPLETION_UPSERTS), so the (task, date) keys of every
+        statement that changed a row are returned in 'changed'; only those are
+        refreshed in the daily rollup and the streaks, and the caller logs
+        them (see record_changes()). An idempotent replay changes nothing.
+
+        Nothing is written if an op that may insert a row refers to a missing
+        or deleted task; those ids are returned in 'missing_task_ids'.
+        """
+        cursor = self.cursor
+        merged = OrderedDict()
+        for op in ops:
+            key = (op['task_id'], op['date'])
+            current = merged.setdefault(key, {'completed': None, 'footnote': None})
+            if op.get('completed') is not None:
+                current['completed'] = op['completed']
+            if op.get('footnote') is not None:
+                current['footnote'] = op['footnote']
+
+        upserts = {}
+        uncompletes = []
+        prune_keys = []
+        for (task_id, day), op in merged.items():
+            if op['completed'] is False and op['footnote'] is None:
+                uncompletes.append((task_id, day))
+            elif op['completed'] is not None or op['footnote'] is not None:
+                upserts.setdefault((op['completed'] is not None, op['footnote'] is not None), []).append((task_id, day, op))
+            if op['completed'] is False or op['footnote'] == '':
+                prune_keys.append((task_id, day))
+
+        result = {
+            'missing_task_ids': [],
+            'upserted': 0,
+            'uncompleted': 0,
+            'deleted': 0,
+            'changed': [],
+            'dates': sorted({day for _, day in merged})
+        }
+
+        # Rows inserted by an upsert need the task's current name
+        task_ids = sorted({task_id for rows in upserts.values() for task_id, _, _ in rows})
+        if task_ids:
+            placeholders = ", ".join(["%s"] * len(task_ids))
+            cursor.execute(
+                f"SELECT id, name FROM tasks WHERE id IN ({placeholders}) AND is_active = TRUE", task_ids
+            )
+            names = {row['id']: row['name'] for row in cursor.fetchall()}
+            result['missing_task_ids'] = [task_id for task_id in task_ids if task_id not in names]
+            if result['missing_task_ids']:
+                return result
+
+        # Rows of archived dates come back before they are written
+        archive.restore_dates(cursor, result['dates'])
+
+        changed = set()
+        star_changes = []
+        for (sets_completed, sets_footnote), rows in upserts.items():
+            params = []
+            for task_id, day, op in rows:
+                values = [task_id, names[task_id], day]
+                if sets_completed:
+                    values.append(op['completed'])
+                if sets_footnote:
+                    values.append(op['footnote'])
+                params.append(tuple(values))
+            cursor.executemany(self.COMPLETION_UPSERTS[(sets_completed, sets_footnote)], params)
+            result['upserted'] += cursor.rowcount
+            if cursor.rowcount:
+                keys = [(task_id, day) for task_id, day, _ in rows]
+                changed.update(keys)
+                if sets_completed:
+                    star_changes += keys
+
+        if uncompletes:
+            cursor.execute(
+                f"UPDATE daily_task_completions SET is_completed = FALSE "
+                f"WHERE {self._key_condition(len(uncompletes))} AND is_completed = TRUE",
+                [value for key in uncompletes for value in key]
+            )
+            result['uncompleted'] = cursor.rowcount
+            if result['uncompleted']:
+                changed.update(uncompletes)
+                star_changes += uncompletes
+
+        if prune_keys:
+            cursor.execute(
+                f"DELETE FROM daily_task_completions "
+                f"WHERE {self._key_condition(len(prune_keys))} "
+                f"AND is_completed = FALSE AND (footnote IS NULL OR footnote = '')",
+                [value for key in prune_keys for value in key]
+            )
+            result['deleted'] = cursor.rowcount
+            if result['deleted']:
+                changed.update(prune_keys)
+
+        result['changed'] = [key for key in merged if key in changed]
+        rollup.refresh_daily_summary(cursor, [day for _, day in result['changed']])
+        streaks.refresh_streaks(cursor, [(task_id, date.fromisoformat(day)) for task_id, day in star_changes])
+        return result
+
+    def completion_exists(self, task_id, day):
+        """Return True if task_id has a completion record (a star or a footnote) on the ISO date day."""
+        self.cursor.execute(
+            "SELECT id FROM daily_task_completions WHERE task_id = %s AND completed_date = %s", (task_id, day)
+        )
+        return self.cursor.fetchone() is not None
+
+    # ============== Stats ==============
+
+    def daily_counts(self, ranges):
+        """Return {iso_date: star_count} for the days covered by the given (start, end) date ranges.
+
+        Reads the daily rollup, so each day costs at most one row; overlapping
+        or disjoint ranges are answered by a single query. Callers look days
+        up by date, so the rows are not sorted.
+        """
+        conditions = " OR ".join("summary_date BETWEEN %s AND %s" for _ in ranges)
+        query = f"""
+            SELECT summary_date, star_count
+            FROM daily_star_summary
+            WHERE ({conditions}) AND star_count > 0
+        """
+        params = []
+        for start_date, end_date in ranges:
+            params += [start_date.isoformat(), end_date.isoformat()]
+        self.cursor.execute(query, params)
+        return {row['summary_date'].isoformat(): row['star_count'] for row in self.cursor.fetchall()}
+
+    def bucketed_counts(self, start_date, end_date, granularity):
+        """Return {iso_bucket_start: star_count} for days between start_date and end_date.
+
+        Days are summed per day, week, month or year by GROUP BY on the
+        daily rollup, so only non-empty buckets cross the wire.
+        """
+        self.cursor.execute(f"""
+            SELECT {self.BUCKET_STARTS[granularity]} AS bucket, SUM(star_count) AS star_count
+            FROM daily_star_summary
+            WHERE summary_date BETWEEN %s AND %s AND star_count > 0
+            GROUP BY bucket
+        """, (start_date.isoformat(), end_date.isoformat()))
+        # Computed columns come back as strings from SQLite
+        return {
+            row['bucket'] if isinstance(row['bucket'], str) else row['bucket'].isoformat(): int(row['star_count'])
+            for row in self.cursor.fetchall()
+        }
+
+    def first_star_date(self):
+        """Return the ISO date of the first day with a star, or None."""
+        self.cursor.execute(
+            "SELECT summary_date FROM daily_star_summary WHERE star_count > 0 ORDER BY summary_date ASC LIMIT 1"
+        )
+        row = self.cursor.fetchone()
+        return row['summary_date'].isoformat() if row else None
+
+    def star_count_on(self, day):
+        """Return the number of stars earned on day (an ISO date)."""
+        self.cursor.execute("SELECT star_count FROM daily_star_summary WHERE summary_date = %s", (day,))
+        row = self.cursor.fetchone()
+        return row['star_count'] if row else 0
+
+    def task_recap(self, ref_date, windows):
+        """Count stars per active task for one or more rolling windows ending the day before ref_date.
+
+        All windows are computed by a single grouped query, so the cost does not
+        depend on the number of tasks. Returns one recap dict per window, in the
+        order the windows were given.
+        """
+        end_date = ref_date - timedelta(days=1)
+        starts = [ref_date - timedelta(days=days) for days in windows]
+        source, source_params = archive.completions_from(min(starts), end_date)
+
+        window_columns = ",\n".join(
+            f"COALESCE(SUM(dtc.completed_date >= %s), 0) AS window_{i}"
+            for i in range(len(windows))
+        )
+        query = f"""
+            SELECT
+                t.id,
+                t.name,
+                {window_columns}
+            FROM tasks t
+            LEFT JOIN {source} dtc
+                ON dtc.task_id = t.id
+                AND dtc.completed_date BETWEEN %s AND %s
+                AND dtc.is_completed = TRUE
+            WHERE t.is_active = TRUE
+            GROUP BY t.position, t.created_at, t.id
+            ORDER BY t.position ASC, t.created_at ASC, t.id ASC
+        """
+        params = [start.isoformat() for start in starts] + source_params
+        params += [min(starts).isoformat(), end_date.isoformat()]
+        self.cursor.execute(query, params)
+        rows = self.cursor.fetchall()
+
+        recaps = []
+        for i, (days, start_date) in enumerate(zip(windows, starts)):
+            task_stats = []
+            for row in rows:
+                count = int(row[f'window_{i}'])
+                task_stats.append({
+                    'task_id': row['id'],
+                    'task_name': row['name'],
+                    'star_count': count,
+                    'max_possible': days,
+                    'percentage': round((count / days) * 100, 1)
+                })
+            recaps.append({
+                'week_start': start_date.isoformat(),
+                'week_end': end_date.isoformat(),
+                'days_in_period': days,
+                'tasks': task_stats
+            })
+        return recaps
+
+    def active_tasks(self):
+        """Return [{'id', 'name'}] for active tasks in display order."""
+        self.cursor.execute("""
+            SELECT id, name FROM tasks WHERE is_active = TRUE ORDER BY position ASC, created_at ASC
+        """)
+        return self.cursor.fetchall()
+
+    def completed_days(self, start, end):
+        """Return [{'task_id', 'task_name', 'completed_date'}] for every star earned between start and end.
+
+        One range scan of daily_task_completions (and of the archive for old
+        ranges); task_name is the task's current name, or the recorded one for
+        tasks that no longer exist.
+        """
+        source, params = archive.completions_from(start, end)
+        self.cursor.execute(f"""
+            SELECT dtc.task_id, COALESCE(t.name, dtc.task_name) AS task_name, dtc.completed_date
+            FROM {source} dtc
+            LEFT JOIN tasks t ON t.id = dtc.task_id
+            WHERE dtc.completed_date BETWEEN %s AND %s AND dtc.is_completed = TRUE
+        """, params + [start, end])
+        return self.cursor.fetchall()
+
+    def task_streaks(self):
+        """Return the latest and longest starred runs of every active task, in display order."""
+        self.cursor.execute("""
+            SELECT t.id, t.name, s.last_start, s.last_end, s.longest_start, s.longest_end
+            FROM tasks t
+            LEFT JOIN task_streaks s ON s.task_id = t.id
+            WHERE t.is_active = TRUE
+            ORDER BY t.position ASC, t.created_at ASC
+        """)
+        return self.cursor.fetchall()
+
+    # ============== History ==============
+
+    # Columns of the rows yielded by iter_completions()
+    EXPORT_COLUMNS = (
+        'completed_date', 'task_id', 'task_name', 'is_completed', 'footnote', 'earned_at',
+        'current_task_name', 'task_active'
+    )
+
+    def _stream_cursor(self):
+        """Tuple cursor that fetches rows from the database as they are read."""
+        return self.conn.cursor()
+
+    def _close_stream(self, cursor):
+        cursor.close()
+
+    def iter_completions(self, start=None, end=None, batch_size=1000):
+        """Yield every completion (archived ones included) with its task, oldest date first.
+
+        Rows are tuples in EXPORT_COLUMNS order, optionally limited to
+        completed dates between start and end (ISO dates). They are fetched
+        batch_size at a time from a dedicated cursor, so memory use does not
+        grow with the history. The session's connection stays busy until the
+        generator is exhausted or closed.
+        """
+        source, params = archive.completions_from(start or None, end or None)
+        conditions = []
+        if start:
+            conditions.append("dtc.completed_date >= %s")
+            params.append(start)
+        if end:
+            conditions.append("dtc.completed_date <= %s")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT
+                dtc.completed_date,
+                dtc.task_id,
+                dtc.task_name,
+                dtc.is_completed,
+                dtc.footnote,
+                dtc.earned_at,
+                t.name,
+                t.is_active
+            FROM {source} dtc
+            LEFT JOIN tasks t ON t.id = dtc.task_id
+            {where}
+            ORDER BY dtc.completed_date ASC, dtc.task_id ASC
+        """
+        cursor = self._stream_cursor()
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            self._close_stream(cursor)
+
+    def completion_page(self, before=None, task_id=None, limit=50):
+        """Return up to limit completions (archived ones included), newest first, optionally for one task.
+
+        Rows are ordered by (completed_date, id) descending; before is the
+        (completed_date, id) of the last row of the previous page. Each page
+        is an index seek per table (idx_completed_date, or unique_task_day
+        for one task, both ending in id), however far back it starts. Ids
+        are kept when rows move to the archive, so they stay unique.
+        """
+        conditions = []
+        params = []
+        if before is not None:
+            # Spelled out rather than as a row comparison, which MySQL
+            # does not always turn into a range scan; the leading bound lets
+            # SQLite seek to the cursor instead of scanning down to it
+            conditions.append(
+                "dtc.completed_date <= %s AND (dtc.completed_date < %s OR (dtc.completed_date = %s AND dtc.id < %s))"
+            )
+            params += [before[0], before[0], before[0], before[1]]
+        if task_id is not None:
+            conditions.append("dtc.task_id = %s")
+            params.append(task_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # Each table is paged on its own index, then the pages are merged
+        branches = [f"""
+            SELECT * FROM (
+                SELECT dtc.id, dtc.task_id, dtc.task_name, dtc.completed_date, dtc.is_completed,
+                    dtc.footnote, dtc.earned_at
+                FROM {table} dtc
+                {where}
+                ORDER BY dtc.completed_date DESC, dtc.id DESC
+                LIMIT %s
+            ) page_{i}
+        """ for i, table in enumerate(archive.TABLES)]
+        self.cursor.execute(
+            " UNION ALL ".join(branches) + " ORDER BY completed_date DESC, id DESC LIMIT %s",
+            (params + [limit]) * len(branches) + [limit]
+        )
+        return self.cursor.fetchall()
+
+    # ============== Search ==============
+
+    def _search_expression(self, terms):
+        """Return the engine's search expression requiring every term as a word prefix."""
+        raise NotImplementedError
+
+    def search_footnotes(self, terms, start=None, end=None, task_id=None, limit=20, offset=0):
+        """Return completions whose footnote contains every term, best match first.
+
+        terms are lowercase words; each matches words it is a prefix of.
+        Optionally limited to completed dates between start and end (ISO
+        dates) and to one task. Rows carry task_id, task_name,
+        completed_date, is_completed, footnote and score. The archive has
+        its own index, searched unless start is recent; scores use each
+        index's statistics, so they compare only roughly across the two.
+        """
+        expression = self._search_expression(terms)
+        conditions = []
+        params = []
+        if start:
+            conditions.append("dtc.completed_date >= %s")
+            params.append(start)
+        if end:
+            conditions.append("dtc.completed_date <= %s")
+            params.append(end)
+        if task_id is not None:
+            conditions.append("dtc.task_id = %s")
+            params.append(task_id)
+
+        branches = []
+        branch_params = []
+        for i, table in enumerate(archive.tables_for(start)):
+            names = {'table': table, 'index': self.SEARCH_INDEXES.get(table)}
+            match = self.SEARCH_MATCH.format(**names)
+            score = self.SEARCH_SCORE.format(**names)
+            branches.append(f"""
+                SELECT * FROM (
+                    SELECT dtc.task_id, dtc.task_name, dtc.completed_date, dtc.is_completed, dtc.footnote,
+                        {score} AS score
+                    FROM {self.SEARCH_FROM.format(**names)}
+                    WHERE {' AND '.join([match] + conditions)}
+                    ORDER BY score DESC, dtc.completed_date DESC, dtc.task_id ASC
+                    LIMIT %s
+                ) matches_{i}
+            """)
+            branch_params += ([expression] * score.count('%s') + [expression] * match.count('%s')
+                              + params + [limit + offset])
+        self.cursor.execute(
+            " UNION ALL ".join(branches) + " ORDER BY score DESC, completed_date DESC, task_id ASC LIMIT %s OFFSET %s",
+            branch_params + [limit, offset]
+        )
+        return self.cursor.fetchall()
+
+    # ============== Bulk Import ==============
+
+    # Statements used by importer.import_records(); see the engine subclasses.
+    # TASK_IMPORT inserts (id, name, created_at, is_active, position) unless
+    # the id exists. COMPLETION_IMPORT upserts (task_id, task_name,
+    # completed_date, is_completed, footnote, earned_at) on unique_task_day.
+    TASK_IMPORT = None
+    COMPLETION_IMPORT = None
+
+    def import_tasks(self, rows):
+        """Insert task rows whose id does not exist yet. Returns the number inserted."""
+        self.cursor.executemany(self.TASK_IMPORT, rows)
+        return self.cursor.rowcount
+
+    def import_completions(self, rows):
+        """Upsert completion rows, restoring the archived rows of their dates first."""
+        archive.restore_dates(self.cursor, [row[2] for row in rows])
+        self.cursor.executemany(self.COMPLETION_IMPORT, rows)
+
+    def next_task_position(self):
+        return task_order.next_position(self.cursor)
+
+    def respace_tasks(self):
+        """Space the positions of all active tasks POSITION_GAP apart, keeping their order."""
+        task_order.set_positions(self.cursor, [task_id for task_id, _ in task_order.fetch_ordered_tasks(self.cursor)])
+
+    # ============== Change Log ==============
+
+    def record_changes(self, task_ids=(), completions=(), everything=False):
+        """Log a write's changed tasks and (task_id, date) pairs, or a bulk change (see storage/changes.py).
+
+        Writes do not log themselves: call this after the transaction's last
+        read, right before commit(), so the change_version row is locked only
+        for the commit.
+        """
+        return changes.record(self.cursor, self._next_change_version, task_ids, completions, everything)
+
+    def _next_change_version(self):
+        """Increment change_version.version and return the new value, in one statement."""
+        raise NotImplementedError
+
+    def changes_since(self, since, limit):
+        """Return what changed after version since of the change log, for /api/changes.
+
+        Returns a dict with the current 'version'; 'tasks', the changed
+        tasks (deleted ones too, with is_active FALSE); 'completions', the
+        current (task_id, completed_date, is_completed, footnote) of every
+        changed pair (uncompleted with no footnote once its row is gone);
+        and 'days', {date: star_count} for the changed dates. 'reset' is True
+        and nothing is listed when the changes cannot be listed (see
+        changes.read_since()).
+        """
+        version, logged = changes.read_since(self.cursor, since, limit)
+        result = {'version': version, 'reset': logged is None, 'tasks': [], 'completions': [], 'days': {}}
+        if logged is None:
+            return result
+        task_ids, keys = logged
+
+        if task_ids:
+            placeholders = ", ".join(["%s"] * len(task_ids))
+            self.cursor.execute(
+                f"SELECT id, name, created_at, is_active, position FROM tasks WHERE id IN ({placeholders})",
+                task_ids
+            )
+            result['tasks'] = sorted(self.cursor.fetchall(), key=lambda row: row['id'])
+
+        if keys:
+            dates = sorted({day for _, day in keys})
+            source, params = archive.completions_from(dates[0], dates[-1])
+            self.cursor.execute(f"""
+                SELECT task_id, completed_date, is_completed, footnote
+                FROM {source} dtc
+                WHERE {self._key_condition(len(keys))}
+            """, params + [value for key in keys for value in key])
+            rows = {(row['task_id'], row['completed_date']): row for row in self.cursor.fetchall()}
+            for task_id, day in keys:
+                row = rows.get((task_id, day))
+                result['completions'].append(
+                    (task_id, day, row['is_completed'], row['footnote']) if row else (task_id, day, False, None)
+                )
+            counts = self.daily_counts([(day, day) for day in dates])
+            result['days'] = {day: counts.get(day.isoformat(), 0) for day in dates}
+        return result
+
+    def data_version(self, ranges, tasks=False):
+        """Return (version, changed_at) of the data behind a payload (see changes.data_version())."""
+        return changes.data_version(self.cursor, ranges, tasks)
+
+    def prune_changes(self, before):
+        return changes.prune(self.cursor, before)
+
+    # ============== Rollup ==============
+
+    def refresh_daily_summary(self, dates):
+        rollup.refresh_daily_summary(self.cursor, dates)
+
+    def rebuild_daily_summary(self):
+        return rollup.rebuild_daily_summary(self.cursor)
+
+    def verify_daily_summary(self):
+        return rollup.verify_daily_summary(self.cursor)
+
+    def rebuild_streaks(self):
+        return streaks.rebuild_streaks(self.cursor)
+
+    # ============== Archive ==============
+
+    def archive_year(self, year):
+        return archive.archive_year(self.cursor, year)
+
+    def first_hot_date(self):
+        return archive.first_hot_date(self.cursor)
+
+    def archive_year_counts(self):
+        return archive.year_counts(self.cursor)
+
+
+class Storage:
+    """A database engine: creates connections and runs schema migrations."""
+
+    engine = None
+    repository_class = Repository
+    # Driver exception classes translated into StorageError
+    driver_errors = ()
+    # Receives connection checkout times and per-statement timings (see storage/instrument.py)
+    observer = None
+
+    def connect(self):
+        """Return a connection object with cursor(dictionary=...), commit(), rollback() and close()."""
+        raise NotImplementedError
+
+    @contextmanager
+    def session(self):
+        """Yield a Repository on its own connection; roll back and raise StorageError on driver errors."""
+        conn = None
+        repo = None
+        try:
+            observer = self.observer
+            if observer is None:
+                conn = self.connect()
+            else:
+                started = time.perf_counter()
+                conn = self.connect()
+                observer.connection_acquired(time.perf_counter() - started)
+                conn = InstrumentedConnection(conn, observer)
+            repo = self.repository_class(conn)
+            yield repo
+        except self.driver_errors as err:
+            if conn:
+                try:
+                    conn.rollback()
+                except self.driver_errors:
+                    pass
+            raise StorageError(str(err)) from err
+        finally:
+            if repo:
+                repo.close()
+            if conn:
+                conn.close()
+
+    def read_schema_version(self, conn):
+        """Return the version recorded in schema_version, or None if the table does not exist."""
+        raise NotImplementedError
+
+    def apply_migrations(self, conn):
+        """Create schema_version if needed and apply pending migrations under the engine's lock."""
+        raise NotImplementedError
+
+    def schema_version(self):
+        """Return the applied schema version, or None if it is not tracked yet."""
+        with self.session() as repo:
+            return self.read_schema_version(repo.conn)
+
+    def migrate(self, apply=True):
+        """Bring the schema up to date, or only warn about pending migrations if apply is False.
+
+        Returns the schema version afterwards.
+        """
+        with self.session() as repo:
+            current = self.read_schema_version(repo.conn)
+            latest = migrations.latest_version(self.engine)
+            if current == latest:
+                return current
+
+            if not apply:
+                print(f"[WARN] Database schema is at version {current or 0}, latest is {latest}. "
+                      "Run: flask --app app db upgrade")
+                return current
+
+            return self.apply_migrations(repo.conn)
+
+    def pool_stats(self):
+        """Return connection pool counters (see BlockingConnectionPool.stats()), or {} without a pool."""
+        return {}
+
+    def close(self):
+        """Release the connections held by the engine."""
@@ -0,0 +1,116 @@
+"""
+Change log behind LifeLogger's delta sync (/api/changes).
+
+Every write to tasks or completions records the task ids and (task,
+date) pairs it touched in change_log, in its own transaction, under a new
+version taken from the one-row change_version counter. Bumping the
+counter locks its row until the write commits, so versions become visible
+in the order they were taken: a client that has seen version N has seen
+every change up to N, and only needs the changes after it.
+
+A row with neither task nor date stands for a bulk change (an import)
+that is not itemized. Pruning deletes old rows and raises
+change_version.pruned_version. Clients asking for changes from before
+either must reload everything.
+
+The same rows give every process one data version per set of dates
+(data_version()), which the stats cache and ETags of app.py are keyed on.
+"""
+from datetime import datetime
+
+
+def record(cursor, next_version, task_ids=(), completions=(), everything=False):
+    """Log changed task ids and (task_id, date) pairs under a new version, and return it.
+
+    Runs last in the transaction of the write it records (dictionary
+    cursor), so the counter row stays locked only until the commit.
+    next_version() takes the next version in one statement (see
+    Repository._next_change_version()); the rows are inserted by one
+    more. Does nothing and returns None when there is nothing to log.
+    """
+    keys = [(task_id, None) for task_id in sorted(set(task_ids))]
+    keys += sorted(set(completions))
+    if everything:
+        keys.append((None, None))
+    if not keys:
+        return None
+
+    version = next_version()
+    cursor.executemany(
+        "INSERT INTO change_log (version, task_id, change_date) VALUES (%s, %s, %s)",
+        [(version, task_id, day) for task_id, day in keys]
+    )
+    return version
+
+
+def read_since(cursor, since, limit):
+    """Return (version, changes): the current version and what was logged after since.
+
+    changes is (task_ids, completions), the changed task ids and (task_id,
+    date) pairs, or None when they cannot be listed: since is None, older
+    than the pruned rows or newer than the current version (a client of
+    another database), or a bulk change or more than limit rows were
+    logged after it.
+    """
+    cursor.execute("SELECT version, pruned_version FROM change_version WHERE id = 1")
+    row = cursor.fetchone()
+    version = row['version']
+    if since is None or since < row['pruned_version'] or since > version:
+        return version, None
+
+    # Bounded by version so the rows match it on engines without snapshot reads
+    cursor.execute(
+        "SELECT task_id, change_date FROM change_log WHERE version > %s AND version <= %s LIMIT %s",
+        (since, version, limit + 1)
+    )
+    rows = cursor.fetchall()
+    if len(rows) > limit or any(row['task_id'] is None for row in rows):
+        return version, None
+    task_ids = sorted({row['task_id'] for row in rows if row['change_date'] is None})
+    completions = sorted({(row['task_id'], row['change_date']) for row in rows if row['change_date'] is not None})
+    return version, (task_ids, completions)
+
+
+def data_version(cursor, ranges, tasks=False):
+    """Return (version, changed_at) of the newest change to the dates in ranges.
+
+    ranges are (start, end) dates; with tasks, changes to tasks count too,
+    and bulk changes always do. version never goes back when rows are
+    pruned: it is at least the pruned version. changed_at is None when no
+    such change is logged any more.
+    """
+    conditions = ["change_date BETWEEN %s AND %s"] * len(ranges)
+    conditions.append("change_date IS NULL" if tasks else "(change_date IS NULL AND task_id IS NULL)")
+    cursor.execute(f"""
+        SELECT (SELECT pruned_version FROM change_version WHERE id = 1) AS pruned_version,
+               MAX(version) AS version, MAX(changed_at) AS changed_at
+        FROM change_log
+        WHERE {' OR '.join(conditions)}
+    """, [day.isoformat() for start, end in ranges for day in (start, end)])
+    row = cursor.fetchone()
+    changed_at = row['changed_at']
+    if isinstance(changed_at, str):
+        # SQLite leaves aggregates of DATETIME columns as text
+        changed_at = datetime.fromisoformat(changed_at)
+    return max(row['version'] or 0, row['pruned_version']), changed_at
+
+
+def prune(cursor, before):
+    """Delete the versions logged before the datetime before. Returns the number of rows deleted.
+
+    Clients that last synced before the newest deleted version get a reset.
+    """
+    cursor.execute(
+        "SELECT version FROM change_log WHERE changed_at < %s ORDER BY version DESC LIMIT 1",
+        (before.replace(microsecond=0),)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return 0
+    cursor.execute("DELETE FROM change_log WHERE version <= %s", (row['version'],))
+    deleted = cursor.rowcount
+    cursor.execute(
+        "UPDATE change_version SET pruned_version = %s WHERE id = 1 AND pruned_version < %s",
+        (row['version'], row['version'])
+    )
+    return deleted
@@ -0,0 +1,78 @@
+"""
+Query instrumentation for LifeLogger storage engines.
+
+When a Storage has an observer (see metrics.py), session() times the
+connection checkout and wraps the connection so that every statement
+is reported with its SQL, parameters and duration, and every fetch with
+the number of rows it returned and how long it took. The observer
+interface is:
+
+    connection_acquired(seconds)
+    query_executed(query, params, seconds, many)
+    rows_fetched(count, seconds)
+"""
+import time
+
+
+class InstrumentedConnection:
+    """Connection whose cursors report to observer; everything else is passed through."""
+
+    def __init__(self, conn, observer):
+        self._conn = conn
+        self._observer = observer
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._observer)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, observer):
+        self._cursor = cursor
+        self._observer = observer
+
+    def execute(self, query, params=()):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            self._observer.query_executed(query, params, time.perf_counter() - started, many=False)
+
+    def executemany(self, query, seq_params):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_params)
+        finally:
+            self._observer.query_executed(query, seq_params, time.perf_counter() - started, many=True)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._observer.rows_fetched(0 if row is None else 1, time.perf_counter() - started)
+        return row
+
+    def fetchmany(self, size=1):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._observer.rows_fetched(len(rows), time.perf_counter() - started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._observer.rows_fetched(len(rows), time.perf_counter() - started)
+        return rows
+
+    def __iter__(self):
+        count = 0
+        try:
+            for row in self._cursor:
+                count += 1
+                yield row
+        finally:
+            self._observer.rows_fetched(count, 0.0)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
@@ -0,0 +1,394 @@
+"""
+Versioned schema migrations for LifeLogger.
+
+Each storage engine has its own ordered registry, filled with
+@migration(version, description, engine=...), and records applied
+versions in its schema_version table. At startup only the current version
+is read; the registry runs when the database is behind, or is not tracked
+yet. Locking and transactions are up to the engine (see storage.mysql and
+storage.sqlite).
+
+MySQL migrations 1-4 predate schema_version, so they check for their
+changes before applying them and can run safely against any existing
+database. SQLite databases start from the full schema in migration 1.
+"""
+from storage.archive import HOT_TABLE
+from storage.rollup import rebuild_daily_summary
+from storage.streaks import rebuild_streaks
+from storage.task_order import fetch_ordered_tasks, set_positions
+
+MIGRATIONS = {'mysql': [], 'sqlite': []}
+
+
+def migration(version, description, engine='mysql'):
+    """Register a migration function taking a dictionary cursor."""
+    def register(f):
+        registry = MIGRATIONS[engine]
+        if registry and version <= registry[-1][0]:
+            raise ValueError(f"Migration {engine}/{version} registered out of order")
+        registry.append((version, description, f))
+        return f
+    return register
+
+
+def latest_version(engine):
+    registry = MIGRATIONS[engine]
+    return registry[-1][0] if registry else 0
+
+
+def pending(engine, current):
+    """Return (version, description) for every migration of engine newer than current."""
+    current = current or 0
+    return [(version, description) for version, description, _ in MIGRATIONS[engine] if version > current]
+
+
+def apply_pending(engine, cursor, current, commit=None):
+    """Apply the migrations of engine newer than current and record them in schema_version.
+
+    cursor must be a dictionary cursor. Calls commit() after each migration
+    when given. Returns the version afterwards.
+    """
+    current = current or 0
+    for version, description, apply_migration in MIGRATIONS[engine]:
+        if version <= current:
+            continue
+        print(f"[INFO] Applying migration {version}: {description}...")
+        apply_migration(cursor)
+        cursor.execute(
+            "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+            (version, description)
+        )
+        if commit:
+            commit()
+        current = version
+        print(f"[OK] Migration {version} applied")
+    return current
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute("""
+        SELECT COUNT(*) AS matches
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        AND table_name = %s
+        AND column_name = %s
+    """, (table, column))
+    return cursor.fetchone()['matches'] > 0
+
+
+def _table_exists(cursor, table):
+    cursor.execute("""
+        SELECT COUNT(*) AS matches
+        FROM information_schema.tables
+        WHERE table_schema = DATABASE()
+        AND table_name = %s
+    """, (table,))
+    return cursor.fetchone()['matches'] > 0
+
+
+def _index_exists(cursor, table, index):
+    cursor.execute("""
+        SELECT COUNT(*) AS matches
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+        AND table_name = %s
+        AND index_name = %s
+    """, (table, index))
+    return cursor.fetchone()['matches'] > 0
+
+
+# ============== MySQL Migrations ==============
+
+@migration(1, "Add 'position' column to 'tasks'")
+def add_task_position(cursor):
+    if not _column_exists(cursor, 'tasks', 'position'):
+        cursor.execute("ALTER TABLE tasks ADD COLUMN position INT DEFAULT 0")
+        cursor.execute("CREATE INDEX idx_position ON tasks(position)")
+
+
+@migration(2, "Add 'footnote' column to 'daily_task_completions'")
+def add_completion_footnote(cursor):
+    if not _column_exists(cursor, 'daily_task_completions', 'footnote'):
+        cursor.execute("ALTER TABLE daily_task_completions ADD COLUMN footnote TEXT DEFAULT NULL")
+
+
+@migration(3, "Add 'is_completed' column to 'daily_task_completions'")
+def add_completion_is_completed(cursor):
+    if not _column_exists(cursor, 'daily_task_completions', 'is_completed'):
+        cursor.execute("ALTER TABLE daily_task_completions ADD COLUMN is_completed BOOLEAN DEFAULT TRUE")
+
+
+@migration(4, "Create and populate 'daily_star_summary' rollup table")
+def create_daily_star_summary(cursor):
+    if not _table_exists(cursor, 'daily_star_summary'):
+        cursor.execute("""
+            CREATE TABLE daily_star_summary (
+                summary_date DATE PRIMARY KEY,
+                star_count INT NOT NULL DEFAULT 0,
+                footnote_count INT NOT NULL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        # The archive table comes later (migration 8)
+        rebuild_daily_summary(cursor, tables=(HOT_TABLE,))
+
+
+@migration(5, "Space task positions apart for single-row moves")
+def space_task_positions(cursor):
+    set_positions(cursor, [task_id for task_id, _ in fetch_ordered_tasks(cursor)])
+
+
+@migration(6, "Create and populate 'task_streaks' table")
+def create_task_streaks(cursor):
+    if not _table_exists(cursor, 'task_streaks'):
+        cursor.execute("""
+            CREATE TABLE task_streaks (
+                task_id INT PRIMARY KEY,
+                last_start DATE NOT NULL,
+                last_end DATE NOT NULL,
+                longest_start DATE NOT NULL,
+                longest_end DATE NOT NULL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        rebuild_streaks(cursor, tables=(HOT_TABLE,))
+
+
+@migration(7, "Add a FULLTEXT index on 'daily_task_completions.footnote'")
+def add_footnote_fulltext_index(cursor):
+    if not _index_exists(cursor, 'daily_task_completions', 'ft_footnote'):
+        cursor.execute("ALTER TABLE daily_task_completions ADD FULLTEXT INDEX ft_footnote (footnote)")
+
+
+@migration(8, "Create the 'daily_task_completions_archive' table")
+def create_completion_archive(cursor):
+    # LIKE copies the columns and every index, FULLTEXT included. Native
+    # partitioning is not an option: InnoDB partitioned tables support
+    # neither FULLTEXT indexes nor unique keys without the partition column.
+    if not _table_exists(cursor, 'daily_task_completions_archive'):
+        cursor.execute("CREATE TABLE daily_task_completions_archive LIKE daily_task_completions")
+
+
+# (table, index, columns) of the composite indexes behind the hot reads:
+# the task list in display order, per-task star windows (weekly recap,
+# streaks) and per-day stars (heatmap), each answered from the index alone.
+# idx_active_position replaces idx_is_active, its prefix. The archive gets
+# the completion indexes too (see _covering_indexes()).
+COVERING_INDEXES = [
+    ('tasks', 'idx_active_position', 'is_active, position, created_at'),
+    ('daily_task_completions', 'idx_task_day_completed', 'task_id, completed_date, is_completed'),
+    ('daily_task_completions', 'idx_day_completed_task', 'completed_date, is_completed, task_id, task_name'),
+]
+
+
+def _covering_indexes(engine):
+    """Yield (table, index, columns) for COVERING_INDEXES and their copies on the archive.
+
+    SQLite index names are global, so the archive's are named idx_archive_*.
+    MySQL keeps the original names, which CREATE TABLE ... LIKE copies.
+    """
+    for table, index, columns in COVERING_INDEXES:
+        yield table, index, columns
+        if table == 'daily_task_completions':
+            archive_index = index.replace('idx_', 'idx_archive_', 1) if engine == 'sqlite' else index
+            yield 'daily_task_completions_archive', archive_index, columns
+
+
+@migration(9, "Add covering indexes for the task list and stats reads")
+def add_covering_indexes(cursor):
+    for table, index, columns in _covering_indexes('mysql'):
+        if not _index_exists(cursor, table, index):
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns})")
+    if _index_exists(cursor, 'tasks', 'idx_is_active'):
+        cursor.execute("ALTER TABLE tasks DROP INDEX idx_is_active")
+
+
+# Covers changes.data_version(): date ranges, then task-or-bulk rows with no date
+CHANGE_DATE_INDEX = "change_date, task_id, version, changed_at"
+
+
+@migration(10, "Create the 'change_log' and 'change_version' tables for delta sync")
+def create_change_log(cursor):
+    if not _table_exists(cursor, 'change_log'):
+        cursor.execute("""
+            CREATE TABLE change_log (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                version BIGINT NOT NULL,
+                task_id INT DEFAULT NULL,
+                change_date DATE DEFAULT NULL,
+                changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_version (version)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+    if not _table_exists(cursor, 'change_version'):
+        cursor.execute("""
+            CREATE TABLE change_version (
+                id INT PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                pruned_version BIGINT NOT NULL DEFAULT 0
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+        cursor.execute("INSERT INTO change_version (id, version, pruned_version) VALUES (1, 0, 0)")
+
+
+@migration(11, "Index 'change_log' by date for data versions")
+def index_change_log_dates(cursor):
+    if not _index_exists(cursor, 'change_log', 'idx_change_date'):
+        cursor.execute(f"ALTER TABLE change_log ADD INDEX idx_change_date ({CHANGE_DATE_INDEX})")
+
+
+# ============== SQLite Migrations ==============
+
+@migration(1, "Create the LifeLogger schema", engine='sqlite')
+def create_sqlite_schema(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(255) NOT NULL,
+            created_at DATETIME DEFAULT (datetime('now', 'localtime')),
+            is_active BOOLEAN DEFAULT TRUE,
+            position INT DEFAULT 0
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_is_active ON tasks(is_active)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_position ON tasks(position)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_task_completions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INT NOT NULL,
+            task_name VARCHAR(255) NOT NULL,
+            completed_date DATE NOT NULL,
+            earned_at DATETIME DEFAULT (datetime('now', 'localtime')),
+            footnote TEXT DEFAULT NULL,
+            is_completed BOOLEAN DEFAULT TRUE,
+            CONSTRAINT unique_task_day UNIQUE (task_id, completed_date)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_completed_date ON daily_task_completions(completed_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_task_id ON daily_task_completions(task_id)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_star_summary (
+            summary_date DATE PRIMARY KEY,
+            star_count INT NOT NULL DEFAULT 0,
+            footnote_count INT NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+
+
+@migration(2, "Create and populate 'task_streaks' table", engine='sqlite')
+def create_sqlite_task_streaks(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS task_streaks (
+            task_id INT PRIMARY KEY,
+            last_start DATE NOT NULL,
+            last_end DATE NOT NULL,
+            longest_start DATE NOT NULL,
+            longest_end DATE NOT NULL,
+            updated_at DATETIME DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    # The archive table comes later (migration 4)
+    rebuild_streaks(cursor, tables=(HOT_TABLE,))
+
+
+def _create_sqlite_search_index(cursor, index, table):
+    """Create and populate the FTS5 index of table's footnotes, with triggers keeping it in step."""
+    # External-content index: stores only the index, rows are read from table
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+            footnote,
+            content='{table}',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table}
+        WHEN new.footnote <> ''
+        BEGIN
+            INSERT INTO {index} (rowid, footnote) VALUES (new.id, new.footnote);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table}
+        WHEN old.footnote <> ''
+        BEGIN
+            INSERT INTO {index} ({index}, rowid, footnote) VALUES ('delete', old.id, old.footnote);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF footnote ON {table}
+        WHEN old.footnote IS NOT new.footnote
+        BEGIN
+            INSERT INTO {index} ({index}, rowid, footnote)
+            SELECT 'delete', old.id, old.footnote WHERE old.footnote <> '';
+            INSERT INTO {index} (rowid, footnote)
+            SELECT new.id, new.footnote WHERE new.footnote <> '';
+        END
+    """)
+    cursor.execute(f"INSERT INTO {index} ({index}) VALUES ('delete-all')")
+    cursor.execute(f"""
+        INSERT INTO {index} (rowid, footnote)
+        SELECT id, footnote FROM {table} WHERE footnote <> ''
+    """)
+
+
+@migration(3, "Create the 'completion_search' FTS5 index of footnotes", engine='sqlite')
+def create_sqlite_completion_search(cursor):
+    _create_sqlite_search_index(cursor, 'completion_search', 'daily_task_completions')
+
+
+@migration(4, "Create the 'daily_task_completions_archive' table and its FTS5 index", engine='sqlite')
+def create_sqlite_completion_archive(cursor):
+    # Same columns and indexes as daily_task_completions; rows keep their ids
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_task_completions_archive (
+            id INTEGER PRIMARY KEY,
+            task_id INT NOT NULL,
+            task_name VARCHAR(255) NOT NULL,
+            completed_date DATE NOT NULL,
+            earned_at DATETIME,
+            footnote TEXT DEFAULT NULL,
+            is_completed BOOLEAN DEFAULT TRUE,
+            CONSTRAINT unique_archive_task_day UNIQUE (task_id, completed_date)
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_archive_completed_date ON daily_task_completions_archive(completed_date)"
+    )
+    _create_sqlite_search_index(cursor, 'completion_archive_search', 'daily_task_completions_archive')
+
+
+@migration(5, "Add covering indexes for the task list and stats reads", engine='sqlite')
+def add_sqlite_covering_indexes(cursor):
+    for table, index, columns in _covering_indexes('sqlite'):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table}({columns})")
+    cursor.execute("DROP INDEX IF EXISTS idx_is_active")
+
+
+@migration(6, "Create the 'change_log' and 'change_version' tables for delta sync", engine='sqlite')
+def create_sqlite_change_log(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            version BIGINT NOT NULL,
+            task_id INT DEFAULT NULL,
+            change_date DATE DEFAULT NULL,
+            changed_at DATETIME DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_version ON change_log(version)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_version (
+            id INT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            pruned_version BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO change_version (id, version, pruned_version) VALUES (1, 0, 0)")
+
+
+@migration(7, "Index 'change_log' by date for data versions", engine='sqlite')
+def index_sqlite_change_log_dates(cursor):
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_change_date ON change_log({CHANGE_DATE_INDEX})")
@@ -0,0 +1,163 @@
+"""
+MySQL storage engine for LifeLogger.
+Connections come from a blocking, self-healing pool (see storage/pool.py).
+"""
+import mysql.connector
+from mysql.connector import errorcode
+
+from storage import migrations
+from storage.base import Repository, Storage, StorageError
+from storage.pool import BlockingConnectionPool
+
+# Named lock so concurrent cold starts don't apply the same migration twice
+MIGRATION_LOCK = 'lifelogger_schema_migration'
+MIGRATION_LOCK_TIMEOUT = 30
+
+
+class MySQLRepository(Repository):
+    COMPLETION_UPSERTS = {
+        (True, False): """
+            INSERT INTO daily_task_completions (task_id, task_name, completed_date, is_completed, footnote)
+            VALUES (%s, %s, %s, %s, NULL)
+            ON DUPLICATE KEY UPDATE is_completed = VALUES(is_completed)
+        """,
+        (False, True): """
+            INSERT INTO daily_task_completions (task_id, task_name, completed_date, is_completed, footnote)
+            VALUES (%s, %s, %s, FALSE, %s)
+            ON DUPLICATE KEY UPDATE footnote = VALUES(footnote)
+        """,
+        (True, True): """
+            INSERT INTO daily_task_completions (task_id, task_name, completed_date, is_completed, footnote)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE is_completed = VALUES(is_completed), footnote = VALUES(footnote)
+        """,
+    }
+
+    BUCKET_STARTS = {
+        'day': "summary_date",
+        'week': "DATE_SUB(summary_date, INTERVAL WEEKDAY(summary_date) DAY)",
+        'month': "DATE_SUB(summary_date, INTERVAL DAYOFMONTH(summary_date) - 1 DAY)",
+        'year': "MAKEDATE(YEAR(summary_date), 1)",
+    }
+
+    # FULLTEXT index ft_footnote (on both tables). Words shorter than
+    # innodb_ft_min_token_size (3 by default) and stopwords are not indexed.
+    SEARCH_FROM = "{table} dtc"
+    SEARCH_MATCH = "MATCH (dtc.footnote) AGAINST (%s IN BOOLEAN MODE)"
+    SEARCH_SCORE = SEARCH_MATCH
+
+    TASK_IMPORT = """
+        INSERT INTO tasks (id, name, created_at, is_active, position)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = id
+    """
+
+    COMPLETION_IMPORT = """
+        INSERT INTO daily_task_completions (task_id, task_name, completed_date, is_completed, footnote, earned_at)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE task_name = VALUES(task_name), is_completed = VALUES(is_completed),
+            footnote = VALUES(footnote), earned_at = VALUES(earned_at)
+    """
+
+    def _next_change_version(self):
+        # LAST_INSERT_ID(expr) hands the new value back in the UPDATE's OK packet
+        self.cursor.execute("UPDATE change_version SET version = LAST_INSERT_ID(version + 1) WHERE id = 1")
+        return self.cursor.lastrowid
+
+    def _search_expression(self, terms):
+        return ' '.join(f'+{term}*' for term in terms)
+
+    def _stream_cursor(self):
+        # Unbuffered: rows stay on the server until fetched
+        return self.conn.cursor(buffered=False)
+
+    def _close_stream(self, cursor):
+        # A stream closed early leaves rows on the wire; drain them so the
+        # connection can go back to the pool
+        try:
+            self.conn.consume_results()
+        finally:
+            cursor.close()
+
+
+class MySQLStorage(Storage):
+    """MySQL (or Aiven MySQL) behind a BlockingConnectionPool."""
+
+    engine = 'mysql'
+    repository_class = MySQLRepository
+    driver_errors = (mysql.connector.Error,)
+
+    def __init__(self, db_config):
+        pool_config = {
+            'min_size': db_config['pool_min_size'],
+            'max_size': db_config['pool_size'],
+            'timeout': db_config['pool_timeout'],
+            'recycle': db_config['pool_recycle'],
+            'ping_interval': db_config['pool_ping_interval'],
+            'idle_timeout': db_config['pool_idle_timeout'],
+            'host': db_config['host'],
+            'port': db_config['port'],
+            'user': db_config['user'],
+            'password': db_config['password'],
+            'database': db_config['database']
+        }
+
+        # Add SSL configuration if available (for Aiven)
+        if db_config.get('ssl_ca'):
+            pool_config['ssl_ca'] = db_config['ssl_ca']
+            pool_config['ssl_verify_cert'] = db_config.get('ssl_verify_cert', True)
+            print(f"[OK] SSL configured for database connection")
+
+        try:
+            self.pool = BlockingConnectionPool(**pool_config)
+        except mysql.connector.Error as err:
+            raise StorageError(str(err)) from err
+
+    def connect(self):
+        return self.pool.get_connection()
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        self.pool.close()
+
+    def read_schema_version(self, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT MAX(version) FROM schema_version")
+            return cursor.fetchone()[0] or 0
+        except mysql.connector.Error as err:
+            if err.errno == errorcode.ER_NO_SUCH_TABLE:
+                return None
+            raise
+        finally:
+            cursor.close()
+
+    def apply_migrations(self, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+            if not cursor.fetchone()[0]:
+                print("[WARN] Another process is migrating the database; skipping")
+                return self.read_schema_version(conn)
+            try:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INT PRIMARY KEY,
+                        description VARCHAR(255) NOT NULL,
+                        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """)
+                # Re-read under the lock: another process may have finished first
+                current = self.read_schema_version(conn)
+                migration_cursor = conn.cursor(dictionary=True)
+                try:
+                    return migrations.apply_pending(self.engine, migration_cursor, current, commit=conn.commit)
+                finally:
+                    migration_cursor.close()
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+                cursor.fetchone()
+        finally:
+            cursor.close()
@@ -0,0 +1,223 @@
+"""
+Connection pool for LifeLogger.
+
+BlockingConnectionPool hands out mysql.connector connections and keeps
+between min_size and max_size of them open:
+
+- Connections are opened on demand up to max_size. When all of them are
+  checked out, get_connection() waits up to timeout seconds for one to
+  come back before raising PoolTimeout, so a burst of requests queues
+  briefly instead of failing.
+- Connections older than recycle seconds (0 disables) are closed instead
+  of reused, so they are replaced before the server or a proxy drops them.
+- A connection idle for more than ping_interval seconds is pinged before
+  it is handed out; a dead one is replaced by a new connection.
+- Idle connections above min_size are closed after idle_timeout seconds.
+
+Slow work (connecting, pinging, closing) happens outside the pool lock.
+"""
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import errors
+
+
+class PoolTimeout(errors.PoolError):
+    """No connection was returned to the pool within its timeout."""
+
+
+class _Slot:
+    """An open connection with its age and last use (time.monotonic())."""
+
+    __slots__ = ('cnx', 'created', 'last_used')
+
+    def __init__(self, cnx):
+        self.cnx = cnx
+        self.created = self.last_used = time.monotonic()
+
+
+class PooledConnection:
+    """A checked-out connection; close() returns it to the pool instead of closing it."""
+
+    def __init__(self, pool, slot):
+        self._pool = pool
+        self._slot = slot
+
+    def close(self):
+        if self._slot is not None:
+            slot, self._slot = self._slot, None
+            self._pool._release(slot)
+
+    def __getattr__(self, name):
+        if self._slot is None:
+            raise errors.OperationalError("Connection was returned to the pool")
+        return getattr(self._slot.cnx, name)
+
+
+class BlockingConnectionPool:
+    def __init__(self, min_size=1, max_size=5, timeout=10, recycle=3600, ping_interval=30, idle_timeout=300,
+                 **connect_args):
+        self.max_size = max(max_size, 1)
+        self.min_size = min(max(min_size, 0), self.max_size)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self._connect_args = connect_args
+
+        self._cond = threading.Condition()
+        # Most recently returned connection last; it is reused first
+        self._idle = deque()
+        # Open connections plus the ones being opened
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._counters = {'opened': 0, 'closed': 0, 'recycled': 0, 'ping_failures': 0, 'waits': 0, 'timeouts': 0}
+
+        for _ in range(self.min_size):
+            self._size += 1
+            self._idle.append(self._open())
+
+    # ============== Checkout ==============
+
+    def get_connection(self):
+        """Check out a connection, waiting up to timeout seconds if all max_size are in use."""
+        deadline = time.monotonic() + self.timeout
+        expired = []
+        with self._cond:
+            while True:
+                expired += self._take_expired()
+                if self._idle:
+                    slot = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve the slot now, connect outside the lock
+                    self._size += 1
+                    slot = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"No database connection available within {self.timeout}s "
+                        f"(all {self.max_size} in use)"
+                    )
+                self._counters['waits'] += 1
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        for stale in expired:
+            self._close(stale)
+        slot = self._reopen() if slot is None else self._validate(slot)
+        return PooledConnection(self, slot)
+
+    def _validate(self, slot):
+        """Return slot if its connection is usable, or a slot with a new connection."""
+        now = time.monotonic()
+        if self._expired(slot, now):
+            self._count('recycled')
+        elif now - slot.last_used >= self.ping_interval:
+            try:
+                slot.cnx.ping(reconnect=False)
+                return slot
+            except errors.Error:
+                self._count('ping_failures')
+        else:
+            return slot
+        self._close(slot)
+        return self._reopen()
+
+    def _reopen(self):
+        """Open a connection for a slot already counted in _size."""
+        try:
+            return self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _open(self):
+        slot = _Slot(mysql.connector.connect(**self._connect_args))
+        self._count('opened')
+        return slot
+
+    # ============== Return ==============
+
+    def _release(self, slot):
+        """Take back a connection: roll back what the caller left open, or drop it if broken or old."""
+        healthy = True
+        try:
+            if slot.cnx.in_transaction:
+                slot.cnx.rollback()
+        except errors.Error:
+            healthy = False
+
+        now = time.monotonic()
+        if healthy and not self._closed and not self._expired(slot, now):
+            slot.last_used = now
+            with self._cond:
+                self._idle.append(slot)
+                self._cond.notify()
+            return
+
+        if healthy and not self._closed:
+            self._count('recycled')
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        self._close(slot)
+
+    def _expired(self, slot, now):
+        return self.recycle > 0 and now - slot.created >= self.recycle
+
+    # ============== Shrinking ==============
+
+    def _take_expired(self):
+        """Remove connections idle for longer than idle_timeout beyond min_size (lock held)."""
+        expired = []
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0].last_used >= self.idle_timeout:
+            expired.append(self._idle.popleft())
+            self._size -= 1
+        return expired
+
+    def _close(self, slot):
+        try:
+            slot.cnx.close()
+        except errors.Error:
+            pass
+        self._count('closed')
+
+    def _count(self, name):
+        with self._cond:
+            self._counters[name] += 1
+
+    # ============== Status ==============
+
+    def stats(self):
+        """Return the pool's current size, usage and lifetime counters."""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self._waiting,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                **self._counters
+            }
+
+    def close(self):
+        """Close the idle connections; checked-out ones are closed when returned."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._closed = True
+        for slot in idle:
+            self._close(slot)
@@ -0,0 +1,79 @@
+"""
+Daily rollup maintenance for LifeLogger.
+
+daily_star_summary holds one row per day with the number of stars earned
+and footnotes written, so stats reads touch one row per day instead of
+one row per completion. Every write to daily_task_completions refreshes
+the rows of the dates it touched inside the same transaction. Archived
+completions count too (see storage/archive.py).
+"""
+from storage.archive import TABLES, completions_from
+
+ROLLUP_AGGREGATE = """
+    SELECT
+        completed_date,
+        COALESCE(SUM(is_completed = TRUE), 0) as star_count,
+        COALESCE(SUM(footnote IS NOT NULL AND footnote <> ''), 0) as footnote_count
+    FROM {source} dtc
+"""
+
+
+def refresh_daily_summary(cursor, dates):
+    """Recompute the rollup rows for the given ISO dates from daily_task_completions.
+
+    Must run in the same transaction as the write that touched those dates.
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return
+    placeholders = ", ".join(["%s"] * len(dates))
+    cursor.execute(f"DELETE FROM daily_star_summary WHERE summary_date IN ({placeholders})", dates)
+    source, params = completions_from(dates[0], dates[-1])
+    cursor.execute(f"""
+        INSERT INTO daily_star_summary (summary_date, star_count, footnote_count)
+        {ROLLUP_AGGREGATE.format(source=source)}
+        WHERE completed_date IN ({placeholders})
+        GROUP BY completed_date
+    """, params + dates)
+
+
+def rebuild_daily_summary(cursor, tables=TABLES):
+    """Rebuild the whole rollup table from daily_task_completions. Returns the number of days written.
+
+    tables are the completion tables to read (migrations that predate the
+    archive read only the hot table).
+    """
+    cursor.execute("DELETE FROM daily_star_summary")
+    source, params = completions_from(tables=tables)
+    cursor.execute(f"""
+        INSERT INTO daily_star_summary (summary_date, star_count, footnote_count)
+        {ROLLUP_AGGREGATE.format(source=source)}
+        GROUP BY completed_date
+    """, params)
+    return cursor.rowcount
+
+
+def verify_daily_summary(cursor):
+    """Compare the rollup table with daily_task_completions.
+
+    Expects a dictionary cursor. Returns a list of (date, expected, actual)
+    tuples for every day that differs, where expected/actual are
+    (star_count, footnote_count) pairs.
+    """
+    source, params = completions_from()
+    cursor.execute(f"{ROLLUP_AGGREGATE.format(source=source)} GROUP BY completed_date", params)
+    expected = {
+        row['completed_date'].isoformat(): (int(row['star_count']), int(row['footnote_count']))
+        for row in cursor.fetchall()
+    }
+    cursor.execute("SELECT summary_date, star_count, footnote_count FROM daily_star_summary")
+    actual = {
+        row['summary_date'].isoformat(): (row['star_count'], row['footnote_count'])
+        for row in cursor.fetchall()
+    }
+
+    mismatches = []
+    for day in sorted(set(expected) | set(actual)):
+        if expected.get(day, (0, 0)) != actual.get(day, (0, 0)):
+            mismatches.append((day, expected.get(day, (0, 0)), actual.get(day, (0, 0))))
+    return mismatches
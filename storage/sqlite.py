@@ -0,0 +1,265 @@
+"""
+Embedded SQLite storage engine for LifeLogger.
+
+Runs the same SQL as the MySQL engine against a local database file, so
+single-user and edge deployments need no database server. Each thread
+keeps one connection open for the life of the process, configured with
+WAL journaling and the pragmas below; its statement cache keeps the
+parsed statements of the app's queries prepared between requests.
+"""
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from functools import lru_cache
+
+from storage import migrations
+from storage.base import Repository, Storage, StorageError
+
+PRAGMAS = (
+    # Readers never block the writer and vice versa
+    "PRAGMA journal_mode = WAL",
+    # Durable at checkpoints; a power loss can only drop the last commits
+    "PRAGMA synchronous = NORMAL",
+    # Wait for the write lock instead of failing with "database is locked"
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    # 16 MB page cache and 64 MB memory-mapped reads per connection
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 67108864",
+)
+
+# Prepared statements kept per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Return DATE/DATETIME columns as date/datetime objects, like mysql.connector
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+_PARAM_STYLE = re.compile(r'%[s%]')
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def translate(query):
+    """Rewrite a %s-style (mysql.connector) query for sqlite3's ? placeholders."""
+    return _PARAM_STYLE.sub(lambda match: '?' if match.group() == '%s' else '%', query)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that accepts %s placeholders and returns dict rows on request."""
+
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def execute(self, query, params=()):
+        self._cursor.execute(translate(query), params)
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(translate(query), seq_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """A thread's long-lived connection; close() only ends its transaction."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self._conn, dictionary=dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+
+class SQLiteRepository(Repository):
+    # An unchanged row is not counted in rowcount, as with MySQL
+    COMPLETION_UPSERTS = {
+        (True, False): """
+            INSERT INTO daily_task_completions (task_id, task_name, completed_date, is_completed, footnote)
+            VALUES (%s, %s, %s, %s, NULL)
+            ON CONFLICT (task_id, completed_date) DO UPDATE SET is_completed = excluded.is_completed
+            WHERE is_completed IS NOT excluded.is_completed
+        """,
+        (False, True): """
+            INSERT INTO daily_task_completions (task_id, task_name, completed_date, is_completed, footnote)
+            VALUES (%s, %s, %s, FALSE, %s)
+            ON CONFLICT (task_id, completed_date) DO UPDATE SET footnote = excluded.footnote
+            WHERE footnote IS NOT excluded.footnote
+        """,
+        (True, True): """
+            INSERT INTO daily_task_completions (task_id, task_name, completed_date, is_completed, footnote)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (task_id, completed_date) DO UPDATE
+            SET is_completed = excluded.is_completed, footnote = excluded.footnote
+            WHERE is_completed IS NOT excluded.is_completed OR footnote IS NOT excluded.footnote
+        """,
+    }
+
+    BUCKET_STARTS = {
+        'day': "summary_date",
+        # The Sunday ending the week, less six days
+        'week': "date(summary_date, 'weekday 0', '-6 days')",
+        'month': "date(summary_date, 'start of month')",
+        'year': "date(summary_date, 'start of year')",
+    }
+
+    # FTS5 tables completion_search and completion_archive_search
+    # (storage/migrations.py); bm25() is lower for better matches
+    SEARCH_FROM = "{index} JOIN {table} dtc ON dtc.id = {index}.rowid"
+    SEARCH_MATCH = "{index} MATCH %s"
+    SEARCH_SCORE = "-bm25({index})"
+    SEARCH_INDEXES = {
+        'daily_task_completions': 'completion_search',
+        'daily_task_completions_archive': 'completion_archive_search',
+    }
+
+    TASK_IMPORT = """
+        INSERT INTO tasks (id, name, created_at, is_active, position)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (id) DO NOTHING
+    """
+
+    COMPLETION_IMPORT = """
+        INSERT INTO daily_task_completions (task_id, task_name, completed_date, is_completed, footnote, earned_at)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (task_id, completed_date) DO UPDATE SET task_name = excluded.task_name,
+            is_completed = excluded.is_completed, footnote = excluded.footnote, earned_at = excluded.earned_at
+    """
+
+    def _key_condition(self, count):
+        # Spelled out: SQLite scans the whole table for a multi-row (a, b) IN
+        # (...), but looks each pair up in unique_task_day for an OR
+        return "(" + " OR ".join(["(task_id = %s AND completed_date = %s)"] * count) + ")"
+
+    def _next_change_version(self):
+        self.cursor.execute("UPDATE change_version SET version = version + 1 WHERE id = 1 RETURNING version")
+        return self.cursor.fetchone()['version']
+
+    def _search_expression(self, terms):
+        # Quoted, so words like AND or NEAR are not read as operators
+        return ' '.join(f'"{term}"*' for term in terms)
+
+
+class SQLiteStorage(Storage):
+    """SQLite database file with one connection per thread.
+
+    path must be a file: every thread opens its own connection, so an
+    in-memory database would not be shared between them.
+    """
+
+    engine = 'sqlite'
+    repository_class = SQLiteRepository
+    driver_errors = (sqlite3.Error,)
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        # Open the calling thread's connection now so a bad path fails at startup
+        self.connect()
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                raw = sqlite3.connect(
+                    self.path,
+                    detect_types=sqlite3.PARSE_DECLTYPES,
+                    cached_statements=STATEMENT_CACHE_SIZE,
+                    check_same_thread=False
+                )
+                for pragma in PRAGMAS:
+                    raw.execute(pragma)
+            except sqlite3.Error as err:
+                raise StorageError(f"Cannot open SQLite database {self.path}: {err}") from err
+            conn = SQLiteConnection(raw)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(raw)
+        return conn
+
+    def read_schema_version(self, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute("SELECT MAX(version) FROM schema_version")
+            return cursor.fetchone()[0] or 0
+        finally:
+            cursor.close()
+
+    def apply_migrations(self, conn):
+        # One write transaction for all pending migrations: SQLite DDL is
+        # transactional, and BEGIN IMMEDIATE serializes concurrent processes
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(255) NOT NULL,
+                    applied_at DATETIME DEFAULT (datetime('now', 'localtime'))
+                )
+            """)
+            # Re-read under the lock: another process may have finished first
+            current = self.read_schema_version(conn)
+            migration_cursor = conn.cursor(dictionary=True)
+            try:
+                current = migrations.apply_pending(self.engine, migration_cursor, current)
+            finally:
+                migration_cursor.close()
+            conn.commit()
+            return current
+        finally:
+            cursor.close()
+
+    def close(self):
+        with self._lock:
+            for raw in self._connections:
+                raw.close()
+            self._connections = []
+        self._local = threading.local()
@@ -0,0 +1,297 @@
+"""
+Per-task streaks for LifeLogger.
+
+task_streaks keeps, for every task with stars, its latest run of
+consecutive starred days and its longest run. Whether the latest run is
+still "current" depends on today's date, so that is decided at read time.
+
+Runs are computed on bitmaps: a Python int per task with bit i set when
+a star was earned on origin + i days. Finding the longest run is a loop of
+whole-bitmap shift/AND operations, one per day of the longest run. No
+Python code runs per completion.
+
+Writes keep the table up to date incrementally. Starring or clearing
+days reloads only a window of dates around them, which widens while a
+run reaches its edges; the windows of every task a write touched come
+from one query. A task's whole history is rescanned only when a day that
+changed broke its longest run.
+"""
+from datetime import timedelta
+
+from storage.archive import TABLES, completions_from, tables_for
+
+# Days loaded on each side of a changed day before widening the window
+RUN_WINDOW = 64
+
+# With more changed (task, day) pairs than this, rebuild the affected tasks instead
+INCREMENTAL_LIMIT = 24
+
+# Returned by _apply_changes() when a task's whole history must be rescanned
+_REBUILD = object()
+
+
+# ============== Bitmaps ==============
+
+def bitmap(days, origin):
+    """Return an int with bit (day - origin).days set for every date in days."""
+    bits = 0
+    for day in days:
+        bits |= 1 << (day - origin).days
+    return bits
+
+
+def run_at(bits, index):
+    """Return (start, length) of the run of set bits containing index, or None."""
+    if not (bits >> index) & 1:
+        return None
+    above = bits >> index
+    ones = (~above & (above + 1)).bit_length() - 1
+    gaps_below = ~bits & ((1 << index) - 1)
+    start = gaps_below.bit_length()
+    return start, index + ones - start
+
+
+def last_run(bits):
+    """Return (start, length) of the highest run of set bits, or None if bits is 0."""
+    if not bits:
+        return None
+    return run_at(bits, bits.bit_length() - 1)
+
+
+def longest_run(bits):
+    """Return (start, length) of the longest run of set bits (the latest one on ties), or None."""
+    if not bits:
+        return None
+    # After k steps, bit i is set iff bits i..i+k are all set
+    length = 1
+    runs = bits
+    while True:
+        longer = runs & (runs >> 1)
+        if not longer:
+            break
+        runs = longer
+        length += 1
+    return runs.bit_length() - 1, length
+
+
+# ============== Queries ==============
+
+def _read_states(cursor, task_ids):
+    """Return {task_id: (last, longest)} for the given tasks that have a task_streaks row."""
+    placeholders = ", ".join(["%s"] * len(task_ids))
+    cursor.execute(f"""
+        SELECT task_id, last_start, last_end, longest_start, longest_end
+        FROM task_streaks WHERE task_id IN ({placeholders})
+    """, task_ids)
+    return {
+        row['task_id']: ((row['last_start'], row['last_end']), (row['longest_start'], row['longest_end']))
+        for row in cursor.fetchall()
+    }
+
+
+def _load_windows(cursor, spans):
+    """Return {task_id: bitmap} of the starred days in each task's window of spans.
+
+    spans is {task_id: (start, end)}; bit i is set for start + i days. One
+    query for every task: an index range per task in each table that can
+    hold the dates.
+    """
+    task_ids = sorted(spans)
+    condition = " OR ".join(["(task_id = %s AND completed_date BETWEEN %s AND %s)"] * len(task_ids))
+    params = [
+        value for task_id in task_ids
+        for value in (task_id, spans[task_id][0].isoformat(), spans[task_id][1].isoformat())
+    ]
+    tables = tables_for(min(start for start, _ in spans.values()))
+    cursor.execute(" UNION ALL ".join(
+        f"SELECT task_id, completed_date FROM {table} WHERE ({condition}) AND is_completed = TRUE"
+        for table in tables
+    ), params * len(tables))
+
+    bits = dict.fromkeys(task_ids, 0)
+    for row in cursor.fetchall():
+        bits[row['task_id']] |= 1 << (row['completed_date'] - spans[row['task_id']][0]).days
+    return bits
+
+
+def _write_states(cursor, states):
+    """Replace the task_streaks rows of the given {task_id: (last, longest)} (None deletes)."""
+    task_ids = list(states)
+    if not task_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(task_ids))
+    cursor.execute(f"DELETE FROM task_streaks WHERE task_id IN ({placeholders})", task_ids)
+    rows = [
+        (task_id, last[0], last[1], longest[0], longest[1])
+        for task_id, state in states.items() if state
+        for last, longest in [state]
+    ]
+    if rows:
+        cursor.executemany("""
+            INSERT INTO task_streaks (task_id, last_start, last_end, longest_start, longest_end)
+            VALUES (%s, %s, %s, %s, %s)
+        """, rows)
+
+
+def _length(run):
+    return (run[1] - run[0]).days + 1
+
+
+# ============== Maintenance ==============
+
+def _states_from_dates(dates_by_task):
+    """Compute {task_id: (last, longest)} from {task_id: [completed dates]} with bitmaps."""
+    states = {}
+    for task_id, dates in dates_by_task.items():
+        if not dates:
+            states[task_id] = None
+            continue
+        origin = min(dates)
+        bits = bitmap(dates, origin)
+        runs = []
+        for start, length in (last_run(bits), longest_run(bits)):
+            runs.append((origin + timedelta(days=start), origin + timedelta(days=start + length - 1)))
+        states[task_id] = tuple(runs)
+    return states
+
+
+def _scan_states(cursor, task_ids=None, tables=TABLES):
+    """Compute {task_id: (last, longest)} from the whole history of all tasks or only task_ids."""
+    # A single task (the usual incremental fallback) is also filtered in each archive branch
+    source, params = completions_from(task_id=task_ids[0] if task_ids and len(task_ids) == 1 else None,
+                                      tables=tables)
+    query = f"SELECT task_id, completed_date FROM {source} dtc WHERE is_completed = TRUE"
+    if task_ids is not None:
+        query += f" AND task_id IN ({', '.join(['%s'] * len(task_ids))})"
+        params += task_ids
+    cursor.execute(query, params)
+
+    dates_by_task = {task_id: [] for task_id in task_ids or []}
+    for row in cursor.fetchall():
+        dates_by_task.setdefault(row['task_id'], []).append(row['completed_date'])
+    return _states_from_dates(dates_by_task)
+
+
+def rebuild_streaks(cursor, task_ids=None, tables=TABLES):
+    """Recompute task_streaks from daily_task_completions, for all tasks or only task_ids.
+
+    tables are the completion tables to read (see rollup.rebuild_daily_summary()).
+    Returns the number of tasks with a streak.
+    """
+    if task_ids is not None:
+        task_ids = sorted(set(task_ids))
+        if not task_ids:
+            return 0
+    else:
+        cursor.execute("DELETE FROM task_streaks")
+    states = _scan_states(cursor, task_ids, tables)
+    _write_states(cursor, states)
+    return sum(1 for state in states.values() if state)
+
+
+class _WindowTooSmall(Exception):
+    """A run reaches the edge of the loaded window."""
+
+
+def _apply_changes(state, days, bits, start, end):
+    """Return the (last, longest) state of a task after the stars of days (sorted) were set or cleared.
+
+    Runs are read from bits, the starred days of start..end. Returns
+    _REBUILD when only a scan of the task's whole history can tell, and
+    raises _WindowTooSmall when a run reaches the edge of the window.
+    """
+    size = (end - start).days + 1
+
+    def run(index):
+        found = run_at(bits, index)
+        if found is None:
+            return None
+        first, length = found
+        if first == 0 or first + length >= size:
+            raise _WindowTooSmall
+        return start + timedelta(days=first), start + timedelta(days=first + length - 1)
+
+    for day in days:
+        index = (day - start).days
+        current = run(index)
+
+        if current is not None:
+            # The star is set: its run can only have grown
+            if state is None:
+                state = (current, current)
+            else:
+                last, longest = state
+                if current[1] >= last[1]:
+                    last = current
+                if (_length(current) > _length(longest)
+                        or (_length(current) == _length(longest) and current[1] >= longest[1])):
+                    longest = current
+                state = (last, longest)
+        elif state is not None:
+            last, longest = state
+            if longest[0] <= day <= longest[1]:
+                # The longest run was broken; only a full scan can find the next one
+                return _REBUILD
+            if last[0] <= day <= last[1]:
+                # The latest run now ends on the highest star left up to its old end
+                if last[1] > end:
+                    raise _WindowTooSmall
+                before = bits & ((1 << ((last[1] - start).days + 1)) - 1)
+                if not before:
+                    # Nothing starred in the window before the old end
+                    return _REBUILD
+                last = run(before.bit_length() - 1)
+                state = (last, longest)
+    return state
+
+
+def refresh_streaks(cursor, changes):
+    """Update task_streaks after the star on each (task_id, date) in changes was set or cleared.
+
+    Must run in the same transaction as the write (expects a dictionary
+    cursor). Reads the states and the windows of every changed task in one
+    query each (plus one per widening), and writes the states that changed
+    with one DELETE and INSERT. Large change sets rebuild the affected
+    tasks instead.
+    """
+    changes = sorted(set(changes))
+    if not changes:
+        return
+    if len(changes) > INCREMENTAL_LIMIT:
+        rebuild_streaks(cursor, [task_id for task_id, _ in changes])
+        return
+
+    days_by_task = {}
+    for task_id, day in changes:
+        days_by_task.setdefault(task_id, []).append(day)
+    old_states = _read_states(cursor, list(days_by_task))
+
+    states = {}
+    rebuild = []
+    windows = dict.fromkeys(days_by_task, RUN_WINDOW)
+    pending = list(days_by_task)
+    while pending:
+        spans = {
+            task_id: (days_by_task[task_id][0] - timedelta(days=windows[task_id]),
+                      days_by_task[task_id][-1] + timedelta(days=windows[task_id]))
+            for task_id in pending
+        }
+        bits = _load_windows(cursor, spans)
+        widen = []
+        for task_id in pending:
+            try:
+                state = _apply_changes(old_states.get(task_id), days_by_task[task_id], bits[task_id],
+                                       *spans[task_id])
+            except _WindowTooSmall:
+                windows[task_id] *= 2
+                widen.append(task_id)
+                continue
+            if state is _REBUILD:
+                rebuild.append(task_id)
+            elif state != old_states.get(task_id):
+                states[task_id] = state
+        pending = widen
+
+    if rebuild:
+        states.update(_scan_states(cursor, rebuild))
+    _write_states(cursor, states)
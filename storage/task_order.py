@@ -0,0 +1,82 @@
+"""
+Sparse task positions for LifeLogger.
+
+Active tasks are ordered by tasks.position, spaced POSITION_GAP apart so a
+drag-and-drop move only rewrites the moved task: it takes the midpoint of
+its new neighbours. The list is renumbered (one bulk UPDATE) only when two
+neighbours have no integer left between them.
+"""
+
+POSITION_GAP = 1024
+
+
+def set_positions(cursor, ordered_ids):
+    """Space the given task ids POSITION_GAP apart, in order, with a single UPDATE."""
+    if not ordered_ids:
+        return
+    cases = " ".join(["WHEN %s THEN %s"] * len(ordered_ids))
+    placeholders = ", ".join(["%s"] * len(ordered_ids))
+    params = []
+    for index, task_id in enumerate(ordered_ids):
+        params += [task_id, (index + 1) * POSITION_GAP]
+    params += list(ordered_ids)
+    cursor.execute(
+        f"UPDATE tasks SET position = CASE id {cases} END WHERE id IN ({placeholders})",
+        params
+    )
+
+
+ORDERED_TASKS_QUERY = """
+    SELECT id, position FROM tasks WHERE is_active = TRUE ORDER BY position ASC, created_at ASC, id ASC
+"""
+
+
+def fetch_ordered_tasks(cursor):
+    """Return [(id, position)] for active tasks in display order (dictionary cursor)."""
+    cursor.execute(ORDERED_TASKS_QUERY)
+    return [(row['id'], row['position']) for row in cursor.fetchall()]
+
+
+def next_position(cursor):
+    """Position that places a new task after every existing one (dictionary cursor)."""
+    cursor.execute("SELECT COALESCE(MAX(position), 0) AS max_position FROM tasks WHERE is_active = TRUE")
+    return cursor.fetchone()['max_position'] + POSITION_GAP
+
+
+def move_task(cursor, task_id, after_id=None, before_id=None):
+    """Move task_id right after after_id (or right before before_id).
+
+    Returns the number of tasks whose position was rewritten: 1 normally,
+    all of them when the gap was exhausted and the list was renumbered.
+    Raises KeyError if task_id or the neighbour is not an active task.
+    """
+    tasks = fetch_ordered_tasks(cursor)
+    ids = [tid for tid, _ in tasks]
+    if task_id not in ids:
+        raise KeyError(task_id)
+    tasks = [(tid, position) for tid, position in tasks if tid != task_id]
+    ids = [tid for tid, _ in tasks]
+
+    anchor = after_id if after_id is not None else before_id
+    if anchor not in ids:
+        raise KeyError(anchor)
+    index = ids.index(anchor) + 1 if after_id is not None else ids.index(anchor)
+
+    preceding = tasks[index - 1][1] if index > 0 else None
+    following = tasks[index][1] if index < len(tasks) else None
+
+    if preceding is None and following is None:
+        return 0
+    if preceding is None:
+        new_position = following - POSITION_GAP
+    elif following is None:
+        new_position = preceding + POSITION_GAP
+    elif following - preceding >= 2:
+        new_position = (preceding + following) // 2
+    else:
+        ids.insert(index, task_id)
+        set_positions(cursor, ids)
+        return len(ids)
+
+    cursor.execute("UPDATE tasks SET position = %s WHERE id = %s", (new_position, task_id))
+    return 1